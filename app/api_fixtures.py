@@ -0,0 +1,97 @@
+"""
+API Fixtures - Recorded Odds API responses for replay by the mock server
+
+A fixture is one JSON file per request:
+
+    {"path": "/v4/sports/soccer_epl/odds",
+     "params": {"regions": "uk", "markets": "h2h", "oddsFormat": "decimal"},
+     "status": 200,
+     "headers": {"x-requests-remaining": "480", ...},
+     "recorded_at": "2026-10-17T12:00:00+00:00",
+     "body": [...]}
+
+The collector writes fixtures when ODDS_RECORD_DIR is set; mock_odds_api.py
+replays them.
+"""
+import os
+import json
+import hashlib
+import logging
+from datetime import datetime, timezone
+from pathlib import Path
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# When set, the collector saves every API response it receives here
+RECORD_DIR = os.getenv('ODDS_RECORD_DIR')
+
+RECORDED_HEADERS = ('x-requests-remaining', 'x-requests-used', 'x-requests-last', 'content-type')
+MATCH_PARAMS = ('regions', 'markets')
+
+def fixture_key(path, params):
+    """Lookup key for a request: path plus the params that change the body"""
+    params = params or {}
+    return (path,) + tuple(str(params.get(name, '')) for name in MATCH_PARAMS)
+
+def fixture_filename(path, params):
+    """Stable file name for a recorded request"""
+    slug = path.strip('/').replace('/', '_')[-80:]
+    digest = hashlib.md5(json.dumps(fixture_key(path, params)).encode()).hexdigest()[:10]
+    return f"{slug}_{digest}.json"
+
+def save_fixture(url, params, status, headers, body, record_dir=None):
+    """Write one response to the fixture directory (body is raw bytes or decoded JSON)"""
+    record_dir = Path(record_dir or RECORD_DIR)
+    try:
+        if isinstance(body, (bytes, bytearray)):
+            body = json.loads(body.decode('utf-8')) if body else None
+        path = urlparse(url).path
+        params = {key: value for key, value in (params or {}).items() if key != 'apiKey'}
+        record_dir.mkdir(parents=True, exist_ok=True)
+        fixture_file = record_dir / fixture_filename(path, params)
+        with open(fixture_file, 'w', encoding='utf-8') as f:
+            json.dump({
+                'path': path,
+                'params': params,
+                'status': status,
+                'headers': {name: headers[name] for name in RECORDED_HEADERS if name in headers},
+                'recorded_at': datetime.now(timezone.utc).isoformat(),
+                'body': body
+            }, f)
+        logger.debug(f"Recorded fixture {fixture_file}")
+    except Exception as e:
+        logger.error(f"Error recording fixture for {url}: {e}")
+
+def record_chunks(chunks, url, params, status, headers):
+    """Pass response chunks through, saving the full body once consumed"""
+    body = bytearray()
+    for chunk in chunks:
+        body.extend(chunk)
+        yield chunk
+    save_fixture(url, params, status, headers, bytes(body))
+
+async def record_chunks_async(chunks, url, params, status, headers):
+    """Async variant of record_chunks"""
+    body = bytearray()
+    async for chunk in chunks:
+        body.extend(chunk)
+        yield chunk
+    save_fixture(url, params, status, headers, bytes(body))
+
+def load_fixtures(fixture_dir):
+    """Load all fixtures in a directory keyed by fixture_key"""
+    fixtures = {}
+    fixture_dir = Path(fixture_dir)
+    if not fixture_dir.exists():
+        return fixtures
+    for fixture_file in sorted(fixture_dir.glob('*.json')):
+        try:
+            with open(fixture_file, 'r', encoding='utf-8') as f:
+                fixture = json.load(f)
+            fixtures[fixture_key(fixture['path'], fixture.get('params'))] = fixture
+            # Also serve it for any region/market combination on the same path
+            fixtures.setdefault(fixture_key(fixture['path'], {}), fixture)
+        except Exception as e:
+            logger.error(f"Error loading fixture {fixture_file}: {e}")
+    return fixtures
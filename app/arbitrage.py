@@ -0,0 +1,215 @@
+"""
+Arbitrage - Cross-bookmaker surebet detection over a best-price index
+
+For every (event, market) the index keeps each bookmaker's latest price per
+outcome and the best price per outcome with the bookmaker offering it. The
+collector feeds it the rows it just stored (bookmakers with a new
+last_update), so an ingest only re-derives the best prices and the inverse
+price sum of the events it changed. An event whose best prices sum to less
+than 1 in implied probability (`sum(1 / best) < 1`) can be backed on every
+outcome for a guaranteed return; each new opportunity is stored as an `ARB`
+signal and the open ones are served at `/api/arbitrage`.
+"""
+import os
+import time
+import logging
+import threading
+from datetime import datetime, timezone
+from app.db import get_db
+from app.schema import now_ms
+from app.signal_store import store_signals
+from app.performance_tracker import register_runtime_metrics
+
+logger = logging.getLogger(__name__)
+
+ARB_MARKETS = [m.strip() for m in os.getenv('ARB_MARKETS', 'h2h').split(',') if m.strip()]
+ARB_MIN_MARGIN = float(os.getenv('ARB_MIN_MARGIN', 0.0))   # required 1 - sum(1/best)
+ARB_MAX_AGE = int(os.getenv('ARB_MAX_AGE', 900))           # seconds a bookmaker's prices count as live
+
+def _iso_now():
+    """Current UTC time in the API's commence_time format"""
+    return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+class ArbitrageIndex:
+    """Best price per outcome for each (event, market), updated per changed book"""
+
+    def __init__(self, max_age=ARB_MAX_AGE, min_margin=ARB_MIN_MARGIN):
+        self.max_age_ms = max_age * 1000
+        self.min_margin = min_margin
+        self.prices = {}         # (home, away, commence, market) -> {outcome: {bookmaker: price}}
+        self.seen = {}           # (home, away, commence, market) -> {bookmaker: ts}
+        self.best = {}           # (home, away, commence, market) -> {outcome: (price, bookmaker)}
+        self.opportunities = {}  # (home, away, commence, market) -> opportunity dict
+        self.warmed = False
+        self.fed = False         # a collector in this process updates the index
+        self.lock = threading.Lock()
+        self.stats = {'updates': 0, 'rows_applied': 0, 'events_evaluated': 0,
+                      'opportunities_found': 0, 'last_duration': None}
+
+    def warm(self):
+        """(Re)load live prices from the current_odds snapshot"""
+        placeholders = ', '.join('?' for _ in ARB_MARKETS)
+        with get_db().read() as conn:
+            rows = conn.execute(f'''
+                SELECT home_team, away_team, commence_time, market, bookmaker, outcome_name, price, seen_ts
+                FROM current_odds
+                WHERE market IN ({placeholders}) AND seen_ts >= ? AND commence_time > ?
+            ''', (*ARB_MARKETS, now_ms() - self.max_age_ms, _iso_now())).fetchall()
+        with self.lock:
+            self.prices, self.seen, self.best, self.opportunities = {}, {}, {}, {}
+            touched = set()
+            for home_team, away_team, commence_time, market, bookmaker, outcome, price, seen_ts in rows:
+                key = (home_team, away_team, commence_time, market)
+                self._set_price(key, outcome, bookmaker, price)
+                seen = self.seen.setdefault(key, {})
+                seen[bookmaker] = max(seen_ts, seen.get(bookmaker, 0))
+                touched.add(key)
+            self._evaluate(touched, now_ms())
+            self.warmed = True
+        logger.info(f"Arbitrage index warmed with {len(self.prices)} markets from current_odds")
+
+    def _set_price(self, key, outcome, bookmaker, price):
+        """Record one bookmaker price"""
+        self.prices.setdefault(key, {}).setdefault(outcome, {})[bookmaker] = price
+
+    def update(self, batch, changed, unchanged_books, ts):
+        """Apply a stored batch: rows of changed books, plus seen times of unchanged books
+
+        Returns the opportunities that opened with this batch.
+        """
+        start_time = time.time()
+        if not self.warmed:
+            self.warm()
+        self.fed = True
+        columns = [batch.column(name)[changed] for name in
+                   ('home_team', 'away_team', 'commence_time', 'market', 'bookmaker', 'outcome_name')]
+        prices = batch.price[changed].tolist()
+
+        with self.lock:
+            touched = set()
+            for home_team, away_team, commence_time, market, bookmaker, outcome, price in zip(*columns, prices):
+                if market not in ARB_MARKETS:
+                    continue
+                key = (home_team, away_team, commence_time, market)
+                self._set_price(key, outcome, bookmaker, price)
+                self.seen.setdefault(key, {})[bookmaker] = ts
+                touched.add(key)
+            for home_team, away_team, commence_time, bookmaker, market in unchanged_books:
+                key = (home_team, away_team, commence_time, market)
+                if key in self.seen:
+                    self.seen[key][bookmaker] = ts
+            opened = self._evaluate(touched, ts)
+            self.stats['updates'] += 1
+            self.stats['rows_applied'] += len(prices)
+            self.stats['last_duration'] = time.time() - start_time
+        return opened
+
+    def _evaluate(self, keys, ts):
+        """Recompute best prices and inverse sums for the given markets; returns newly opened arbs"""
+        opened = []
+        cutoff = ts - self.max_age_ms
+        started = _iso_now()
+        for key in keys:
+            if key[2] <= started:
+                # Kicked off: in-play prices are out of scope, forget the event
+                for index in (self.prices, self.seen, self.best, self.opportunities):
+                    index.pop(key, None)
+                continue
+
+            seen = self.seen.get(key, {})
+            best = {}
+            for outcome, books in self.prices.get(key, {}).items():
+                live = [(price, bookmaker) for bookmaker, price in books.items()
+                        if price and price > 1 and seen.get(bookmaker, 0) >= cutoff]
+                if live:
+                    best[outcome] = max(live)
+            self.best[key] = best
+            self.stats['events_evaluated'] += 1
+
+            # Every outcome the market is known to have needs a live price, or a
+            # stale draw would leave home and away looking like a surebet
+            outcomes = len(self.prices.get(key, {}))
+            inverse_sum = sum(1 / price for price, _ in best.values())
+            if outcomes >= 2 and len(best) == outcomes and inverse_sum < 1 - self.min_margin:
+                opportunity = self._opportunity(key, best, inverse_sum, ts)
+                previous = self.opportunities.get(key)
+                self.opportunities[key] = opportunity
+                if previous is None or previous['legs'] != opportunity['legs']:
+                    opened.append(opportunity)
+            else:
+                self.opportunities.pop(key, None)
+        self.stats['opportunities_found'] += len(opened)
+        return opened
+
+    @staticmethod
+    def _opportunity(key, best, inverse_sum, ts):
+        """Describe an arbitrage: legs, margin and stake split per unit staked"""
+        home_team, away_team, commence_time, market = key
+        legs = {outcome: {'price': price, 'bookmaker': bookmaker, 'stake': (1 / price) / inverse_sum}
+                for outcome, (price, bookmaker) in sorted(best.items())}
+        return {
+            'home_team': home_team,
+            'away_team': away_team,
+            'commence_time': commence_time,
+            'market': market,
+            'inverse_sum': inverse_sum,
+            'margin': 1 / inverse_sum - 1,  # guaranteed return per unit staked
+            'legs': legs,
+            'ts': ts
+        }
+
+    def open_opportunities(self):
+        """Open arbitrage opportunities, best margin first
+
+        Open markets are re-checked so prices that went stale since the last
+        ingest drop out. In a process without a collector feeding the index it
+        is reloaded from current_odds on every call.
+        """
+        if not self.fed:
+            self.warm()
+        with self.lock:
+            self._evaluate(list(self.opportunities), now_ms())
+            opportunities = list(self.opportunities.values())
+        return sorted(opportunities, key=lambda o: o['margin'], reverse=True)
+
+    def get_stats(self):
+        """Index size and work done"""
+        with self.lock:
+            return dict(self.stats, markets=len(self.prices), open=len(self.opportunities))
+
+def opportunity_signals(opportunities):
+    """Signal dicts (see signal_store.store_signals) for arbitrage opportunities"""
+    signals = []
+    for o in opportunities:
+        legs = ', '.join(f"{outcome} {leg['price']:.2f} @ {leg['bookmaker']}" for outcome, leg in o['legs'].items())
+        signals.append({
+            'home_team': o['home_team'],
+            'away_team': o['away_team'],
+            'commence_time': o['commence_time'],
+            'strategy': 'arbitrage',
+            'signal': 'ARB',
+            'reason': f"Arbitrage {o['margin']:.2%} ({o['market']}): {legs}",
+            'max_odds': max(leg['price'] for leg in o['legs'].values()),
+            'min_odds': min(leg['price'] for leg in o['legs'].values()),
+            'timestamp': datetime.now()
+        })
+    return signals
+
+def record_arbitrage(batch, changed, unchanged_books, ts):
+    """Feed a stored batch to the index and store newly opened opportunities as ARB signals"""
+    try:
+        opened = arbitrage_index.update(batch, changed, unchanged_books, ts)
+        if opened:
+            store_signals(opportunity_signals(opened))
+            for o in opened:
+                logger.info(f"Arbitrage: {o['home_team']} vs {o['away_team']} ({o['market']}) "
+                            f"margin {o['margin']:.2%}")
+        return opened
+    except Exception as e:
+        logger.error(f"Error updating arbitrage index: {e}")
+        return []
+
+# Global instance
+arbitrage_index = ArbitrageIndex()
+
+register_runtime_metrics('arbitrage', arbitrage_index.get_stats)
@@ -0,0 +1,186 @@
+"""
+Archive - Columnar, memory-mapped cold storage for odds that left the hot DB
+
+When retention compacts raw rows out of SQLite they are first written here:
+one directory per UTC day holding segments of NumPy `.npy` column files.
+Prices and timestamps are stored as float64/int64 and every string column as
+int32 codes into the segment's `strings.json` dictionary. `manifest.json`
+lists the segments and how far the archive reaches (`archived_until`).
+
+Readers `np.load(..., mmap_mode='r')` only the columns and days they ask for,
+so scanning months of history never materializes the whole table.
+"""
+import os
+import json
+import shutil
+import logging
+from datetime import datetime, timezone
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from app.performance_tracker import register_runtime_metrics
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_ENABLED = os.getenv('ODDS_ARCHIVE', 'true').lower() == 'true'
+ARCHIVE_DIR = Path(os.getenv('ODDS_ARCHIVE_DIR', 'data/archive'))
+MANIFEST_VERSION = 1
+
+STRING_COLUMNS = ['sport_key', 'sport_title', 'home_team', 'away_team', 'commence_time',
+                  'bookmaker', 'market', 'outcome_name']
+NUMERIC_COLUMNS = {'price': np.float64, 'ts': np.int64}
+COLUMNS = STRING_COLUMNS + list(NUMERIC_COLUMNS)
+
+def _day(ts):
+    """UTC date string of an epoch-ms value"""
+    return datetime.fromtimestamp(ts / 1000, tz=timezone.utc).strftime('%Y-%m-%d')
+
+def load_manifest(archive_dir=None):
+    """Read the manifest (empty if the archive does not exist yet)"""
+    manifest_file = Path(archive_dir or ARCHIVE_DIR) / 'manifest.json'
+    try:
+        with open(manifest_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'version': MANIFEST_VERSION, 'archived_until': 0, 'partitions': []}
+
+def _save_manifest(manifest, archive_dir):
+    """Atomically replace the manifest"""
+    manifest_file = archive_dir / 'manifest.json'
+    tmp_file = manifest_file.with_suffix('.json.tmp')
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file, manifest_file)
+
+def _write_segment(segment_dir, rows):
+    """Write one segment's column files (rows are tuples in COLUMNS order)"""
+    tmp_dir = segment_dir.with_name(segment_dir.name + '.tmp')
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+
+    strings = []
+    index = {}
+    for i, name in enumerate(STRING_COLUMNS):
+        codes = np.empty(len(rows), dtype=np.int32)
+        for j, row in enumerate(rows):
+            value = row[i] if row[i] is not None else ''
+            code = index.get(value)
+            if code is None:
+                code = index[value] = len(strings)
+                strings.append(value)
+            codes[j] = code
+        np.save(tmp_dir / f'{name}.npy', codes)
+    offset = len(STRING_COLUMNS)
+    for i, (name, dtype) in enumerate(NUMERIC_COLUMNS.items()):
+        values = [row[offset + i] for row in rows]
+        if dtype == np.float64:
+            values = [np.nan if value is None else value for value in values]
+        np.save(tmp_dir / f'{name}.npy', np.array(values, dtype=dtype))
+    with open(tmp_dir / 'strings.json', 'w', encoding='utf-8') as f:
+        json.dump(strings, f)
+
+    shutil.rmtree(segment_dir, ignore_errors=True)
+    os.replace(tmp_dir, segment_dir)
+    return sum(f.stat().st_size for f in segment_dir.iterdir())
+
+def archive_window(cursor, start, end, archive_dir=None):
+    """Archive raw odds with start <= ts < end before they are deleted
+
+    Called inside the retention write transaction; raising here rolls the
+    compaction back, so rows are never deleted without being archived. The
+    segment path is derived from the window, so a retried window overwrites
+    its own segment instead of duplicating it.
+    """
+    archive_dir = Path(archive_dir or ARCHIVE_DIR)
+    cursor.execute(f'''
+        SELECT {', '.join(COLUMNS)} FROM odds
+        WHERE ts >= ? AND ts < ?
+        ORDER BY ts, id
+    ''', (start, end))
+    rows = cursor.fetchall()
+
+    manifest = load_manifest(archive_dir)
+    if rows:
+        by_day = {}
+        for row in rows:
+            by_day.setdefault(_day(row[-1]), []).append(row)
+
+        for day, day_rows in by_day.items():
+            segment = f"{day}/{start}"
+            size = _write_segment(archive_dir / segment, day_rows)
+            manifest['partitions'] = [p for p in manifest['partitions'] if p['path'] != segment]
+            manifest['partitions'].append({
+                'date': day,
+                'path': segment,
+                'rows': len(day_rows),
+                'min_ts': day_rows[0][-1],
+                'max_ts': day_rows[-1][-1],
+                'bytes': size,
+                'columns': COLUMNS
+            })
+        manifest['partitions'].sort(key=lambda p: (p['min_ts'], p['path']))
+
+    manifest['archived_until'] = max(manifest.get('archived_until', 0), end)
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    _save_manifest(manifest, archive_dir)
+    return len(rows)
+
+def list_partitions(start_ms=None, end_ms=None, archive_dir=None):
+    """Manifest entries overlapping [start_ms, end_ms)"""
+    partitions = load_manifest(archive_dir)['partitions']
+    return [p for p in partitions
+            if (start_ms is None or p['max_ts'] >= start_ms) and (end_ms is None or p['min_ts'] < end_ms)]
+
+def load_partition(partition, columns=None, archive_dir=None):
+    """Memory-map the requested columns of a segment
+
+    Returns (arrays, strings): numeric columns are float64/int64 memmaps,
+    string columns int32 code memmaps into `strings`.
+    """
+    segment_dir = Path(archive_dir or ARCHIVE_DIR) / partition['path']
+    arrays = {name: np.load(segment_dir / f'{name}.npy', mmap_mode='r') for name in (columns or COLUMNS)}
+    strings = None
+    if any(name in STRING_COLUMNS for name in arrays):
+        with open(segment_dir / 'strings.json', 'r', encoding='utf-8') as f:
+            strings = json.load(f)
+    return arrays, strings
+
+def partition_frame(partition, columns, start_ms=None, end_ms=None, archive_dir=None):
+    """DataFrame of one segment with categorical string columns, optionally ts-filtered"""
+    needed = list(dict.fromkeys(list(columns) + (['ts'] if start_ms is not None or end_ms is not None else [])))
+    arrays, strings = load_partition(partition, needed, archive_dir)
+
+    mask = None
+    if start_ms is not None or end_ms is not None:
+        ts = arrays['ts']
+        mask = np.ones(len(ts), dtype=bool)
+        if start_ms is not None:
+            mask &= ts >= start_ms
+        if end_ms is not None:
+            mask &= ts < end_ms
+
+    categories = pd.Index(strings, dtype=object) if strings is not None else None
+    data = {}
+    for name in columns:
+        values = arrays[name] if mask is None else arrays[name][mask]
+        if name in STRING_COLUMNS:
+            data[name] = pd.Categorical.from_codes(np.asarray(values), categories=categories)
+        else:
+            data[name] = np.asarray(values)
+    return pd.DataFrame(data)
+
+def get_archive_stats(archive_dir=None):
+    """Partition count, rows and size on disk"""
+    manifest = load_manifest(archive_dir)
+    return {
+        'enabled': ARCHIVE_ENABLED,
+        'partitions': len(manifest['partitions']),
+        'days': len({p['date'] for p in manifest['partitions']}),
+        'rows': sum(p['rows'] for p in manifest['partitions']),
+        'bytes': sum(p.get('bytes', 0) for p in manifest['partitions']),
+        'archived_until': manifest.get('archived_until', 0)
+    }
+
+register_runtime_metrics('archive', get_archive_stats)
@@ -1,59 +1,96 @@
 """
 Backtester - Runs backtests on stored odds data (Optimized with multiprocessing)
+
+Signal totals per strategy come from `calculate_metrics`; profit and loss of
+the strategies' bets settled against match results from app/pnl_backtester.py,
+stored under `pnl` in the same metrics entry.
 """
-import sqlite3
+import os
+import numpy as np
 import pandas as pd
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime
 import json
 from multiprocessing import Pool, cpu_count
 from functools import partial
 from app.performance_tracker import track_performance
+from app.schema import cutoff_ms, now_ms
+from app.db import get_db
+from app.archive import load_manifest, list_partitions, partition_frame
+from app.strategies import EVENT_KEY, OUTCOME_KEY, evaluate, historical_strategies
 
 logger = logging.getLogger(__name__)
 
+BACKTEST_COLUMNS = EVENT_KEY + ['outcome_name', 'price']
+DAY_MS = 86400 * 1000
+BACKTEST_STRATEGY = os.getenv('BACKTEST_STRATEGY', 'high_mean')
+
 def get_historical_odds(days=7):
-    """Get historical odds from database"""
-    conn = sqlite3.connect('data/odds.db')
-    
+    """Get historical odds from database (raw rows and compacted bars)"""
     try:
-        cutoff_time = datetime.now() - timedelta(days=days)
-        
         query = '''
-            SELECT * FROM odds 
-            WHERE timestamp >= ?
-            ORDER BY timestamp DESC
+            SELECT * FROM odds_history 
+            WHERE ts >= ?
+            ORDER BY ts DESC
         '''
         
-        df = pd.read_sql_query(query, conn, params=(cutoff_time,))
+        with get_db().read() as conn:
+            df = pd.read_sql_query(query, conn, params=(cutoff_ms(days=days),))
         return df
     
     except Exception as e:
         logger.error(f"Error fetching historical odds: {e}")
         return pd.DataFrame()
-    
-    finally:
-        conn.close()
 
-def process_event_group_data(group_data_dict):
-    """Process a single event group for backtesting (for multiprocessing)"""
-    try:
-        # Convert dict back to DataFrame for processing
-        import pandas as pd
-        group_df = pd.DataFrame(group_data_dict)
-        outcome_odds = group_df.groupby('outcome_name')['price'].mean()
-        max_odds = outcome_odds.max()
-        
-        signal = 'buy' if max_odds > 2.0 else 'ignore'
-        return signal
-    except Exception as e:
-        logger.error(f"Error processing event group: {e}")
-        return 'ignore'
+def iter_history_partitions(days=7, columns=BACKTEST_COLUMNS):
+    """Yield odds one day partition at a time: the memory-mapped archive for
+    days that left the database, then `odds_history` for the rest"""
+    start = cutoff_ms(days=days)
+    archived_until = load_manifest().get('archived_until', 0)
+    
+    for partition in list_partitions(start, archived_until):
+        df = partition_frame(partition, columns, start_ms=start, end_ms=archived_until)
+        if not df.empty:
+            yield df
+    
+    query = f'''
+        SELECT {', '.join(columns)} FROM odds_history
+        WHERE ts >= ? AND ts < ?
+    '''
+    day_start = max(start, archived_until)
+    end = now_ms() + 1
+    while day_start < end:
+        day_end = min(day_start + DAY_MS, end)
+        try:
+            with get_db().read() as conn:
+                df = pd.read_sql_query(query, conn, params=(day_start, day_end))
+        except Exception as e:
+            logger.error(f"Error fetching odds partition: {e}")
+            df = pd.DataFrame()
+        if not df.empty:
+            yield df
+        day_start = day_end
+
+def _merge_totals(totals):
+    """Combine partial per-(event, outcome) moments"""
+    grouped = pd.concat(totals).groupby(level=list(range(len(OUTCOME_KEY))))
+    return grouped.agg({'sum': 'sum', 'sq': 'sum', 'count': 'sum', 'min': 'min', 'max': 'max'})
 
-def calculate_metrics(df):
-    """Calculate backtest performance metrics with multiprocessing"""
-    if df.empty:
-        return None
+def calculate_metrics(partitions):
+    """Calculate backtest performance metrics from a DataFrame or an iterable of partitions
+
+    Partitions are reduced one at a time to per-(event, outcome) price moments
+    (count, sum, sum of squares, min, max), so only one partition is ever held
+    in memory. Every registered strategy is then evaluated in one pass;
+    BACKTEST_STRATEGY decides the BUY/IGNORE totals.
+
+    History stores a row when a book's price changes, not on every poll
+    (ODDS_SKIP_UNCHANGED skips books whose last_update did not move), so
+    counts and standard deviations are per price change; compare them only
+    across data collected with the same setting.
+    """
+    if isinstance(partitions, pd.DataFrame):
+        partitions = [partitions]
     
     metrics = {
         'total_events': 0,
@@ -67,40 +104,58 @@ def calculate_metrics(df):
     }
     
     try:
-        # Calculate odds statistics (fast, no multiprocessing needed)
-        if 'price' in df.columns:
-            metrics['avg_odds'] = float(df['price'].mean())
-            metrics['max_odds'] = float(df['price'].max())
-            metrics['min_odds'] = float(df['price'].min())
+        price_sum = 0.0
+        price_count = 0
+        price_max = None
+        price_min = None
+        outcome_totals = []
+        partition_count = 0
         
-        # Group by event
-        grouped = df.groupby(['home_team', 'away_team', 'commence_time'])
-        metrics['total_events'] = len(grouped)
+        for df in partitions:
+            if df.empty:
+                continue
+            partition_count += 1
+            
+            # Odds statistics (running, vectorized per partition)
+            prices = df['price']
+            price_sum += float(prices.sum())
+            price_count += int(prices.count())
+            price_max = float(prices.max()) if price_max is None else max(price_max, float(prices.max()))
+            price_min = float(prices.min()) if price_min is None else min(price_min, float(prices.min()))
+            
+            outcome_totals.append(
+                df.assign(sq=prices * prices).groupby(OUTCOME_KEY, observed=True).agg(
+                    sum=('price', 'sum'), sq=('sq', 'sum'), count=('price', 'count'),
+                    min=('price', 'min'), max=('price', 'max'))
+            )
+            # Fold partial aggregates together so they stay small
+            if len(outcome_totals) >= 8:
+                outcome_totals = [_merge_totals(outcome_totals)]
         
-        # Use multiprocessing for large datasets (simplified approach)
-        # For better performance with pandas, we'll use vectorized operations
-        # Multiprocessing overhead is only beneficial for very large datasets
+        if not partition_count:
+            return None
         
-        buy_count = 0
-        ignore_count = 0
+        metrics['avg_odds'] = price_sum / price_count if price_count else 0.0
+        metrics['max_odds'] = price_max
+        metrics['min_odds'] = price_min
         
-        # Optimized sequential processing with vectorized operations
-        for (home_team, away_team, commence_time), group in grouped:
-            try:
-                outcome_odds = group.groupby('outcome_name')['price'].mean()
-                max_odds = outcome_odds.max()
-                
-                if max_odds > 2.0:
-                    buy_count += 1
-                else:
-                    ignore_count += 1
-            except Exception as e:
-                logger.warning(f"Error processing event {home_team} vs {away_team}: {e}")
-                ignore_count += 1
+        # Per-outcome mean / std from the merged moments, then every historical strategy at once
+        totals = _merge_totals(outcome_totals)
+        count = totals['count']
+        mean = totals['sum'] / count
+        variance = ((totals['sq'] - totals['sum'] * mean) / (count - 1)).clip(lower=0)
+        stats = pd.DataFrame({'mean': mean, 'std': np.sqrt(variance.where(count > 1)),
+                              'count': count, 'min': totals['min'], 'max': totals['max']})
+        events, decisions = evaluate(stats=stats, names=historical_strategies())
         
+        buy_count = int(decisions[BACKTEST_STRATEGY].sum())
+        metrics['total_events'] = len(events)
         metrics['buy_signals'] = buy_count
-        metrics['ignore_signals'] = ignore_count
-        metrics['total_signals'] = buy_count + ignore_count
+        metrics['ignore_signals'] = len(events) - buy_count
+        metrics['total_signals'] = len(events)
+        metrics['strategy'] = BACKTEST_STRATEGY
+        metrics['strategies'] = {name: int(buy.sum()) for name, buy in decisions.items()}
+        logger.info(f"Backtest scanned {partition_count} partitions ({price_count} prices)")
         
     except Exception as e:
         logger.error(f"Error calculating metrics: {e}")
@@ -139,17 +194,17 @@ def run_backtest():
     """Main function to run backtest"""
     logger.info("Starting backtest...")
     
-    # Get historical odds (last 7 days)
-    df = get_historical_odds(days=7)
+    # Stream historical odds (last 7 days) partition by partition
+    metrics = calculate_metrics(iter_history_partitions(days=7))
     
-    if df.empty:
+    if metrics is None:
         logger.warning("No historical odds data available for backtesting")
         return
     
-    # Calculate metrics
-    metrics = calculate_metrics(df)
-    
     if metrics:
+        # Replay with simulated stakes settled against match results
+        from app.pnl_backtester import run_pnl_backtest
+        metrics['pnl'] = run_pnl_backtest()
         save_metrics(metrics)
         logger.info(f"Backtest completed: {metrics['total_events']} events, "
                    f"{metrics['buy_signals']} BUY signals, "
@@ -1,42 +1,243 @@
 """
-Caching module for odds data to reduce API calls
+Caching module for API responses to reduce API calls
+
+Responses are kept in a small SQLite file (data/cache.db) shared by every
+process on the host - the scheduler, gunicorn workers and restarts all see
+the same entries, so none of them spend quota on data another one just
+fetched. Each endpoint has its own TTL. Within STALE_SECONDS after expiry a
+stale entry is still served while exactly one caller (holding a short lease)
+refreshes it.
+
+Usage:
+    key = cache_key(url, params)
+    data, status = response_cache.get(key)   # 'fresh', 'stale', 'refresh' or 'miss'
+    if status in ('refresh', 'miss'):
+        data = fetch(...)
+        response_cache.put(key, data, endpoint='odds')
 """
-import json
+import os
 import time
-from datetime import datetime, timedelta
-from pathlib import Path
-from cachetools import TTLCache
-import hashlib
-
-# Cache for odds data (TTL: 30 seconds)
-odds_cache = TTLCache(maxsize=100, ttl=30)
-
-def get_cache_key(url, params):
-    """Generate cache key from URL and parameters"""
-    key_data = f"{url}_{json.dumps(params, sort_keys=True)}"
-    return hashlib.md5(key_data.encode()).hexdigest()
-
-def get_cached_odds(url, params):
-    """Get cached odds if available and not expired"""
-    cache_key = get_cache_key(url, params)
-    return odds_cache.get(cache_key)
-
-def cache_odds(url, params, data):
-    """Cache odds data"""
-    cache_key = get_cache_key(url, params)
-    odds_cache[cache_key] = {
-        'data': data,
-        'timestamp': datetime.now().isoformat()
-    }
-
-def is_cache_valid(url, params, max_age_seconds=30):
-    """Check if cached data is still valid"""
-    cache_key = get_cache_key(url, params)
-    cached = odds_cache.get(cache_key)
-    if not cached:
-        return False
-    
-    cached_time = datetime.fromisoformat(cached['timestamp'])
-    age = (datetime.now() - cached_time).total_seconds()
-    return age < max_age_seconds
+import pickle
+import sqlite3
+import logging
+import threading
+from urllib.parse import urlparse
+from app.performance_tracker import register_runtime_metrics
+
+logger = logging.getLogger(__name__)
+
+CACHE_DB_PATH = os.getenv('CACHE_DB_PATH', 'data/cache.db')
+STALE_SECONDS = int(os.getenv('CACHE_STALE_SECONDS', 60))
+LEASE_SECONDS = int(os.getenv('CACHE_LEASE_SECONDS', 15))
+MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', 500))
+EVICT_INTERVAL = 60  # seconds between eviction sweeps
+
+# Seconds a response stays fresh, per endpoint
+ENDPOINT_TTLS = {
+    'odds': 30,
+    'event_odds': 30,
+    'events': 300,
+    'scores': 60,
+    'sports': 3600,
+}
+DEFAULT_TTL = 30
+
+def cache_key(url, params):
+    """Cache key for a request (the API key is never part of it)"""
+    query = '&'.join(f"{name}={value}" for name, value in sorted((params or {}).items()) if name != 'apiKey')
+    return f"{url}?{query}"
+
+def endpoint_for(url):
+    """Classify an Odds API URL into an ENDPOINT_TTLS name"""
+    parts = urlparse(url).path.rstrip('/').split('/')
+    if parts[-1] == 'odds':
+        return 'event_odds' if 'events' in parts else 'odds'
+    return parts[-1] if parts[-1] in ENDPOINT_TTLS else 'other'
+
+class ResponseCache:
+    """Cross-process response cache in SQLite with stale-while-revalidate"""
+
+    def __init__(self, path=CACHE_DB_PATH):
+        self.path = path
+        self.local = threading.local()
+        self.owner = f"{os.getpid()}-{id(self)}"
+        self.stats_lock = threading.Lock()
+        self.last_evict = 0.0
+        self.stats = {'hits': 0, 'stale_hits': 0, 'refreshes': 0, 'misses': 0,
+                      'writes': 0, 'evictions': 0, 'errors': 0}
+
+    def _conn(self):
+        """Per-thread connection (recreated after fork)"""
+        conn = getattr(self.local, 'conn', None)
+        if conn is None or self.local.pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA busy_timeout = 5000')
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = NORMAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS response_cache (
+                    key TEXT PRIMARY KEY,
+                    endpoint TEXT,
+                    value BLOB,
+                    created REAL,
+                    expires REAL,
+                    stale_until REAL,
+                    lease_owner TEXT,
+                    lease_until REAL,
+                    hits INTEGER DEFAULT 0
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_response_cache_stale ON response_cache (stale_until)')
+            self.local.conn = conn
+            self.local.pid = os.getpid()
+            self.owner = f"{os.getpid()}-{id(self)}"
+        return conn
+
+    def _count(self, name, value=1):
+        with self.stats_lock:
+            self.stats[name] += value
+
+    def get(self, key):
+        """Look up a key, returning (value, status)
+
+        fresh   - within TTL, use it
+        stale   - past TTL, another process is refreshing it; use it
+        refresh - past TTL and this caller holds the refresh lease; refetch,
+                  falling back to the returned stale value on failure
+        miss    - nothing usable cached
+        """
+        try:
+            conn = self._conn()
+            row = conn.execute('SELECT value, expires, stale_until FROM response_cache WHERE key = ?',
+                               (key,)).fetchone()
+            now = time.time()
+            if row is None or row[2] < now:
+                self._count('misses')
+                return None, 'miss'
+
+            value = pickle.loads(row[0])
+            if row[1] >= now:
+                conn.execute('UPDATE response_cache SET hits = hits + 1 WHERE key = ?', (key,))
+                self._count('hits')
+                return value, 'fresh'
+
+            # Stale: exactly one caller wins the lease and refreshes
+            acquired = conn.execute('''
+                UPDATE response_cache SET lease_owner = ?, lease_until = ?
+                WHERE key = ? AND (lease_until IS NULL OR lease_until < ?)
+            ''', (self.owner, now + LEASE_SECONDS, key, now)).rowcount
+            if acquired:
+                self._count('refreshes')
+                return value, 'refresh'
+            self._count('stale_hits')
+            return value, 'stale'
+
+        except Exception as e:
+            self._count('errors')
+            logger.error(f"Error reading response cache: {e}")
+            return None, 'miss'
+
+    def put(self, key, value, endpoint=None, ttl=None):
+        """Store a value and release any refresh lease on it"""
+        try:
+            endpoint = endpoint or endpoint_for(key)
+            ttl = ttl if ttl is not None else ENDPOINT_TTLS.get(endpoint, DEFAULT_TTL)
+            now = time.time()
+            self._conn().execute('''
+                INSERT OR REPLACE INTO response_cache
+                (key, endpoint, value, created, expires, stale_until, lease_owner, lease_until, hits)
+                VALUES (?, ?, ?, ?, ?, ?, NULL, NULL, 0)
+            ''', (key, endpoint, sqlite3.Binary(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)),
+                  now, now + ttl, now + ttl + STALE_SECONDS))
+            self._count('writes')
+            if now - self.last_evict >= EVICT_INTERVAL:
+                self.evict()
+        except Exception as e:
+            self._count('errors')
+            logger.error(f"Error writing response cache: {e}")
+
+    def delete(self, key):
+        """Drop a key"""
+        try:
+            self._conn().execute('DELETE FROM response_cache WHERE key = ?', (key,))
+        except Exception as e:
+            self._count('errors')
+            logger.error(f"Error deleting from response cache: {e}")
+
+    def evict(self):
+        """Remove entries past their stale window and trim to MAX_ENTRIES (oldest first)"""
+        self.last_evict = time.time()
+        try:
+            conn = self._conn()
+            evicted = conn.execute('DELETE FROM response_cache WHERE stale_until < ?', (time.time(),)).rowcount
+            evicted += conn.execute('''
+                DELETE FROM response_cache WHERE key IN (
+                    SELECT key FROM response_cache ORDER BY created DESC LIMIT -1 OFFSET ?
+                )
+            ''', (MAX_ENTRIES,)).rowcount
+            if evicted:
+                self._count('evictions', evicted)
+                logger.debug(f"Evicted {evicted} response cache entries")
+            return evicted
+        except Exception as e:
+            self._count('errors')
+            logger.error(f"Error evicting response cache: {e}")
+            return 0
+
+    def namespace(self, prefix, ttl=DEFAULT_TTL):
+        """Dict-like view over the shared cache for app-level values"""
+        return CacheNamespace(self, prefix, ttl)
+
+    def get_stats(self):
+        """Hit/miss/eviction counters for this process plus shared totals"""
+        with self.stats_lock:
+            stats = dict(self.stats)
+        lookups = stats['hits'] + stats['stale_hits'] + stats['refreshes'] + stats['misses']
+        stats['hit_rate'] = (stats['hits'] + stats['stale_hits']) / lookups if lookups else None
+        try:
+            entries, stored_hits, size = self._conn().execute(
+                'SELECT COUNT(*), COALESCE(SUM(hits), 0), COALESCE(SUM(LENGTH(value)), 0) FROM response_cache'
+            ).fetchone()
+            stats.update({'entries': entries, 'shared_hits': stored_hits, 'bytes': size})
+        except Exception as e:
+            logger.error(f"Error reading response cache stats: {e}")
+        return stats
+
+class CacheNamespace:
+    """Mapping-style access to a prefix of the shared cache (fresh or stale values only)
+
+    A stale value whose refresh lease this caller wins reads as missing, so
+    the caller recomputes it while other processes keep serving the stale one.
+    """
+
+    def __init__(self, cache, prefix, ttl):
+        self.cache = cache
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def get(self, key, default=None):
+        value, status = self.cache.get(f"{self.prefix}:{key}")
+        return default if status in ('miss', 'refresh') else value
+
+    def __getitem__(self, key):
+        value, status = self.cache.get(f"{self.prefix}:{key}")
+        if status in ('miss', 'refresh'):
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.cache.put(f"{self.prefix}:{key}", value, endpoint=self.prefix, ttl=self.ttl)
+
+    def __delitem__(self, key):
+        self.cache.delete(f"{self.prefix}:{key}")
+
+    def __contains__(self, key):
+        return self.cache.get(f"{self.prefix}:{key}")[1] not in ('miss', 'refresh')
+
+# Global instance
+response_cache = ResponseCache()
 
+register_runtime_metrics('response_cache', response_cache.get_stats)
@@ -2,174 +2,413 @@
 Odds Collector - Fetches live odds from The Odds API (Optimized)
 """
 import os
+import asyncio
+import aiohttp
 import requests
-import sqlite3
 import logging
 import time
 from datetime import datetime
 from dotenv import load_dotenv
 from app.performance_tracker import track_performance, record_api_latency
-from app.cache import get_cached_odds, cache_odds, is_cache_valid
+from app.cache import response_cache, cache_key
+from app import schema
+from app.db import get_db
+from app.poll_scheduler import poll_scheduler
+from app.event_tracker import event_tracker
+from app.delta_store import INGEST_MODE, delta_tracker, record_keyframe
+from app.current_odds import current_tracker, upsert_current, touch_books
+from app.arbitrage import record_arbitrage
+from app.steam import record_steam
+from app.odds_batch import OddsBatch, parse_odds_stream, parse_odds_stream_async, STREAM_CHUNK_SIZE
+from app.api_fixtures import RECORD_DIR, save_fixture, record_chunks, record_chunks_async
+from app.http_client import odds_http, CircuitOpenError
+from app.spool import odds_spool, record_progress
 
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
 ODDS_API_KEY = os.getenv('ODDS_API_KEY')
-ODDS_API_BASE_URL = 'https://api.the-odds-api.com/v4'
+# Point at mock_odds_api.py for load tests, e.g. http://127.0.0.1:8765/v4
+ODDS_API_BASE_URL = os.getenv('ODDS_API_BASE_URL', 'https://api.the-odds-api.com/v4')
+
+# Collection scope - comma separated lists, e.g. ODDS_SPORTS=soccer_epl,soccer_spain_la_liga
+ODDS_SPORTS = [s.strip() for s in os.getenv('ODDS_SPORTS', 'soccer').split(',') if s.strip()]
+ODDS_REGIONS = [r.strip() for r in os.getenv('ODDS_REGIONS', 'uk').split(',') if r.strip()]
+ODDS_MARKETS = [m.strip() for m in os.getenv('ODDS_MARKETS', 'h2h').split(',') if m.strip()]
+
+# 'sync' fetches sports one after another, 'async' fetches them concurrently
+COLLECTOR_MODE = os.getenv('COLLECTOR_MODE', 'sync').lower()
+COLLECTOR_CONCURRENCY = int(os.getenv('COLLECTOR_CONCURRENCY', 8))
+
+# Polling one sport (or one event) costs (regions x markets) requests against the monthly quota
+poll_scheduler.configure(ODDS_SPORTS, len(ODDS_REGIONS) * len(ODDS_MARKETS))
+event_tracker.configure(len(ODDS_REGIONS) * len(ODDS_MARKETS))
 
 def init_database():
-    """Initialize SQLite database with odds table"""
-    conn = sqlite3.connect('data/odds.db')
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS odds (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            sport_key TEXT,
-            sport_title TEXT,
-            home_team TEXT,
-            away_team TEXT,
-            commence_time TEXT,
-            bookmaker TEXT,
-            market TEXT,
-            outcome_name TEXT,
-            price REAL,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    conn.commit()
-    conn.close()
+    """Initialize SQLite database and apply pending schema migrations"""
+    get_db().write(schema.initialize, transaction=False)
     logger.info("Database initialized")
 
-def fetch_odds():
-    """Fetch odds from The Odds API with caching"""
+def _api_key_configured():
+    """Check that a usable API key is present"""
     if not ODDS_API_KEY or ODDS_API_KEY == 'your_api_key_here':
         logger.warning("ODDS_API_KEY not set in .env file")
+        return False
+    return True
+
+def _odds_request(sport_key, regions, markets, event_id=None):
+    """Build URL and query parameters for a sport-wide or per-event odds request"""
+    if event_id:
+        url = f"{ODDS_API_BASE_URL}/sports/{sport_key}/events/{event_id}/odds"
+    else:
+        url = f"{ODDS_API_BASE_URL}/sports/{sport_key}/odds"
+    params = {
+        'apiKey': ODDS_API_KEY,
+        'regions': regions,
+        'markets': markets,
+        'oddsFormat': 'decimal'
+    }
+    return url, params
+
+def fetch_odds(sport_key='soccer', regions='uk', markets='h2h', event_id=None):
+    """Fetch odds from The Odds API with caching (a single event if event_id is given)
+
+    The response is streamed and flattened straight into an OddsBatch.
+    """
+    if not _api_key_configured():
         return None
     
+    # Served if this process holds the refresh lease but the refresh fails
+    fallback = None
+    
     try:
-        # Fetch soccer odds (soccer is the sport key for football)
-        url = f"{ODDS_API_BASE_URL}/sports/soccer/odds"
-        params = {
-            'apiKey': ODDS_API_KEY,
-            'regions': 'uk',
-            'markets': 'h2h',
-            'oddsFormat': 'decimal'
-        }
+        # Soccer is the sport key for football
+        url, params = _odds_request(sport_key, regions, markets, event_id)
         
-        # Check cache first
-        cached_data = get_cached_odds(url, params)
-        if cached_data and is_cache_valid(url, params, max_age_seconds=30):
-            logger.info(f"Using cached odds data ({len(cached_data['data'])} events)")
-            return cached_data['data']
+        # Check the shared cache first
+        key = cache_key(url, params)
+        cached_data, status = response_cache.get(key)
+        if status in ('fresh', 'stale'):
+            logger.info(f"Using {status} cached odds data ({cached_data.n_events} events)")
+            return cached_data
+        if status == 'refresh':
+            fallback = cached_data
         
-        # Measure API latency
+        def parse(response):
+            chunks = response.iter_content(chunk_size=STREAM_CHUNK_SIZE)
+            if RECORD_DIR:
+                chunks = record_chunks(chunks, url, params, response.status_code, response.headers)
+            return parse_odds_stream(chunks)
+        
+        # Measure API latency (time to the full streamed body, retries included)
         start_time = time.time()
-        response = requests.get(url, params=params, timeout=10)
+        data = odds_http.get(url, params, parse)
         api_latency = time.time() - start_time
-        response.raise_for_status()
         
         # Record API latency
         record_api_latency('collector', api_latency)
         
-        data = response.json()
+        if not event_id:
+            poll_scheduler.record_poll(sport_key, data.event_values('commence_time'))
         
         # Cache the data
-        cache_odds(url, params, data)
+        response_cache.put(key, data, endpoint='event_odds' if event_id else 'odds')
         
-        logger.info(f"Fetched {len(data)} events from The Odds API (latency: {api_latency:.3f}s)")
+        logger.info(f"Fetched {data.n_events} {sport_key} events from The Odds API (latency: {api_latency:.3f}s)")
         return data
     
+    except CircuitOpenError as e:
+        logger.warning(f"Skipping odds request: {e}")
+        return fallback
     except requests.exceptions.Timeout:
         logger.error("Timeout while fetching odds from API")
-        return None
+        return fallback
     except requests.exceptions.ConnectionError:
         logger.error("Connection error while fetching odds - check internet connection")
-        return None
+        return fallback
     except requests.exceptions.RequestException as e:
         logger.error(f"Error fetching odds: {e}")
-        return None
+        return fallback
     except Exception as e:
         logger.error(f"Unexpected error in fetch_odds: {e}")
-        return None
+        return fallback
 
-def store_odds(odds_data):
-    """Store odds data in SQLite database with batch inserts and I/O tracking"""
-    if not odds_data:
-        return
-    
-    import time
-    from app.performance_tracker import record_metrics
-    
-    io_start = time.time()
-    conn = sqlite3.connect('data/odds.db')
-    cursor = conn.cursor()
+def fetch_events(sport_key):
+    """Fetch the upcoming and live events of a sport (does not count against the quota)"""
+    if not _api_key_configured():
+        return None
     
     try:
-        # Prepare batch data
-        batch_data = []
-        for event in odds_data:
-            sport_key = event.get('sport_key', 'soccer')
-            sport_title = event.get('sport_title', 'Soccer')
-            home_team = event.get('home_team', '')
-            away_team = event.get('away_team', '')
-            commence_time = event.get('commence_time', '')
-            
-            bookmakers = event.get('bookmakers', [])
-            
-            for bookmaker in bookmakers:
-                bookmaker_name = bookmaker.get('key', '')
-                markets = bookmaker.get('markets', [])
-                
-                for market in markets:
-                    market_key = market.get('key', '')
-                    outcomes = market.get('outcomes', [])
-                    
-                    for outcome in outcomes:
-                        outcome_name = outcome.get('name', '')
-                        price = outcome.get('price', 0.0)
-                        
-                        batch_data.append((
-                            sport_key, sport_title, home_team, away_team,
-                            commence_time, bookmaker_name, market_key,
-                            outcome_name, price
-                        ))
+        url = f"{ODDS_API_BASE_URL}/sports/{sport_key}/events"
+        key = cache_key(url, {})
+        cached_data, status = response_cache.get(key)
+        if status in ('fresh', 'stale'):
+            return cached_data
         
-        # Batch insert for better performance
-        if batch_data:
-            cursor.executemany('''
-                INSERT INTO odds 
-                (sport_key, sport_title, home_team, away_team, 
-                 commence_time, bookmaker, market, outcome_name, price)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', batch_data)
+        def parse(response):
+            data = response.json()
+            if RECORD_DIR:
+                save_fixture(url, {}, response.status_code, response.headers, data)
+            return data
         
-        conn.commit()
-        io_wait_time = time.time() - io_start
+        data = odds_http.get(url, {'apiKey': ODDS_API_KEY}, parse)
+        response_cache.put(key, data, endpoint='events')
+        logger.info(f"Discovered {len(data)} {sport_key} events")
+        return data
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Error fetching {sport_key} events: {e}")
+        return None
+    except Exception as e:
+        logger.error(f"Unexpected error in fetch_events: {e}")
+        return None
+
+def fetch_scores(sport_key, days_from=3):
+    """Fetch live and recently completed games with their scores (costs 2 quota units with daysFrom)"""
+    if not _api_key_configured():
+        return None
+    
+    try:
+        url = f"{ODDS_API_BASE_URL}/sports/{sport_key}/scores"
+        params = {'apiKey': ODDS_API_KEY, 'daysFrom': days_from, 'dateFormat': 'iso'}
+        key = cache_key(url, params)
+        cached_data, status = response_cache.get(key)
+        if status in ('fresh', 'stale'):
+            return cached_data
         
-        # Record I/O wait time
-        record_metrics(
-            module_name='collector',
-            function_name='store_odds',
-            runtime=0,
-            cpu_usage=0,
-            memory_usage=0,
-            io_wait_time=io_wait_time
-        )
+        def parse(response):
+            data = response.json()
+            if RECORD_DIR:
+                save_fixture(url, params, response.status_code, response.headers, data)
+            return data
         
-        logger.info(f"Stored {len(batch_data)} odds records for {len(odds_data)} events (batch insert, I/O: {io_wait_time:.3f}s)")
+        data = odds_http.get(url, params, parse)
+        response_cache.put(key, data, endpoint='scores')
+        logger.info(f"Fetched {len(data)} {sport_key} scores")
+        return data
+    except CircuitOpenError as e:
+        logger.warning(f"Skipping scores request: {e}")
+        return None
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Error fetching {sport_key} scores: {e}")
+        return None
+    except Exception as e:
+        logger.error(f"Unexpected error in fetch_scores: {e}")
+        return None
+
+async def _fetch_odds_request(session, semaphore, sport_key, region, market, event_id=None):
+    """Fetch a single sport (or event)/region/market combination, returns (data, latency)"""
+    url, params = _odds_request(sport_key, region, market, event_id)
+    
+    key = cache_key(url, params)
+    cached_data, status = response_cache.get(key)
+    if status in ('fresh', 'stale'):
+        return cached_data, None
+    # On a failed refresh fall back to the stale copy
+    fallback = cached_data if status == 'refresh' else None
+    
+    async def parse(response):
+        chunks = response.content.iter_chunked(STREAM_CHUNK_SIZE)
+        if RECORD_DIR:
+            chunks = record_chunks_async(chunks, url, params, response.status, response.headers)
+        return await parse_odds_stream_async(chunks)
+    
+    start_time = time.time()
+    try:
+        data = await odds_http.get_async(session, url, params, parse, semaphore=semaphore)
+    except CircuitOpenError as e:
+        logger.warning(f"Skipping {sport_key} odds ({region}/{market}): {e}")
+        return fallback, None
+    except asyncio.TimeoutError:
+        logger.error(f"Timeout while fetching {sport_key} odds ({region}/{market})")
+        return fallback, None
+    except aiohttp.ClientResponseError as e:
+        logger.error(f"HTTP {e.status} fetching {sport_key} odds ({region}/{market}): {e.message}")
+        return fallback, None
+    except aiohttp.ClientError as e:
+        logger.error(f"Error fetching {sport_key} odds ({region}/{market}): {e}")
+        return fallback, None
+    except ValueError as e:
+        logger.error(f"Invalid {sport_key} odds response ({region}/{market}): {e}")
+        return fallback, None
+    api_latency = time.time() - start_time
+    
+    if not event_id:
+        poll_scheduler.record_poll(sport_key, data.event_values('commence_time'))
+    response_cache.put(key, data, endpoint='event_odds' if event_id else 'odds')
+    logger.debug(f"Fetched {data.n_events} {sport_key} events ({region}/{market}, latency: {api_latency:.3f}s)")
+    return data, api_latency
+
+async def fetch_odds_async(sport_keys=None, regions=None, markets=None, concurrency=None, events=None):
+    """Fetch odds for many sports (or (sport_key, event_id) pairs), regions and markets
+    concurrently over one pooled session"""
+    if not _api_key_configured():
+        return None
+    
+    targets = events or [(sport_key, None) for sport_key in (sport_keys or ODDS_SPORTS)]
+    regions = regions or ODDS_REGIONS
+    markets = markets or ODDS_MARKETS
+    concurrency = concurrency or COLLECTOR_CONCURRENCY
+    
+    # One request per combination keeps quota cost identical (markets x regions)
+    # while letting every combination run in parallel
+    combinations = [(s, e, r, m) for s, e in targets for r in regions for m in markets]
+    
+    semaphore = asyncio.Semaphore(concurrency)
+    connector = aiohttp.TCPConnector(limit=concurrency, ttl_dns_cache=300)
     
+    start_time = time.time()
+    # Per-request timeouts are set by odds_http from observed latencies
+    async with aiohttp.ClientSession(connector=connector) as session:
+        results = await asyncio.gather(*[
+            _fetch_odds_request(session, semaphore, sport_key, region, market, event_id)
+            for sport_key, event_id, region, market in combinations
+        ])
+    wall_time = time.time() - start_time
+    
+    batches = []
+    failed = 0
+    for data, api_latency in results:
+        if data is None:
+            failed += 1
+            continue
+        batches.append(data)
+        if api_latency is not None:
+            record_api_latency('collector', api_latency)
+    
+    if failed == len(combinations):
+        logger.info(f"Fetched 0 events from 0/{len(combinations)} requests")
+        return None
+    
+    odds_data = OddsBatch.concat(batches)
+    logger.info(f"Fetched {odds_data.n_events} events from {len(combinations) - failed}/{len(combinations)} "
+                f"requests (concurrency: {concurrency}, wall time: {wall_time:.3f}s)")
+    return odds_data
+
+def fetch_all_odds(sport_keys=None):
+    """Fetch odds for the given (default: every configured) sport, region and market"""
+    sport_keys = sport_keys or ODDS_SPORTS
+    if COLLECTOR_MODE == 'async':
+        return asyncio.run(fetch_odds_async(sport_keys))
+    
+    batches = []
+    for sport_key in sport_keys:
+        data = fetch_odds(sport_key, ','.join(ODDS_REGIONS), ','.join(ODDS_MARKETS))
+        if data:
+            batches.append(data)
+    return OddsBatch.concat(batches) if batches else None
+
+def fetch_event_odds(events):
+    """Fetch odds for (sport_key, event_id) pairs via the per-event endpoint"""
+    if COLLECTOR_MODE == 'async':
+        return asyncio.run(fetch_odds_async(events=events))
+    
+    batches = []
+    for sport_key, event_id in events:
+        data = fetch_odds(sport_key, ','.join(ODDS_REGIONS), ','.join(ODDS_MARKETS), event_id=event_id)
+        if data:
+            batches.append(data)
+    return OddsBatch.concat(batches) if batches else None
+
+def _write_odds_batch(conn, batch, ts, spool_position=None):
+    """Writer job: insert an OddsBatch (only changed prices in delta mode)
+
+    A spooled batch also advances its spool checkpoint in the same transaction,
+    and the current_odds snapshot is upserted alongside the history rows.
+    Bookmakers whose last_update is unchanged are skipped in full mode.
+    """
+    cursor = conn.cursor()
+    if spool_position:
+        record_progress(conn, *spool_position)
+    changed, unchanged_books, updates = current_tracker.split(cursor, batch)
+    timestamp = schema.from_epoch_ms(ts).strftime('%Y-%m-%d %H:%M:%S')
+    upsert_current(cursor, batch, changed, ts, timestamp)
+    touch_books(cursor, unchanged_books, ts)
+    current = (changed, unchanged_books, updates)
+    
+    is_keyframe = False
+    if INGEST_MODE == 'delta':
+        # Keyframes need every book; unchanged books have unchanged prices, so the diff drops them anyway
+        rows_to_write, is_keyframe = delta_tracker.diff(cursor, list(batch.rows()))
+        if is_keyframe:
+            record_keyframe(cursor, ts)
+        schema.insert_odds_rows(cursor, rows_to_write, ts)
+        return rows_to_write, is_keyframe, current
+    
+    # Batch insert for better performance (wide table or normalized facts),
+    # decoding rows lazily from the columnar batch
+    rows = [row for row, keep in zip(batch.rows(), changed) if keep]
+    schema.insert_odds_rows(cursor, rows, ts)
+    return rows, is_keyframe, current
+
+def _store_batch(batch, ts, spool_position=None):
+    """Write a batch fetched at `ts` through the shared writer (raises on failure)"""
+    from app.performance_tracker import record_metrics
+    
+    io_start = time.time()
+    try:
+        # Single transaction in the shared writer thread
+        rows_to_write, is_keyframe, current = get_db().write(_write_odds_batch, batch, ts, spool_position)
+    except Exception:
+        schema.reset_dimension_cache()
+        raise
+    io_wait_time = time.time() - io_start
+    
+    current_tracker.apply(*current)
+    record_arbitrage(batch, current[0], current[1], ts)
+    record_steam(batch, current[0], ts)
+    if INGEST_MODE == 'delta':
+        delta_tracker.apply(batch, rows_to_write, is_keyframe)
+    
+    # Record I/O wait time
+    record_metrics(
+        module_name='collector',
+        function_name='store_odds',
+        runtime=0,
+        cpu_usage=0,
+        memory_usage=0,
+        io_wait_time=io_wait_time
+    )
+    
+    skipped = len(batch) - int(current[0].sum())
+    skipped_note = f", {skipped} unchanged-bookmaker rows skipped" if skipped else ""
+    if INGEST_MODE == 'delta':
+        logger.info(f"Stored {len(rows_to_write)}/{len(batch)} changed odds records for {batch.n_events} events "
+                    f"({'keyframe' if is_keyframe else 'delta'}{skipped_note}, I/O: {io_wait_time:.3f}s)")
+    else:
+        logger.info(f"Stored {len(rows_to_write)} odds records for {batch.n_events} events "
+                    f"(batch insert{skipped_note}, I/O: {io_wait_time:.3f}s)")
+
+def _store_spooled(payload, segment, offset):
+    """Spool drain handler: store one spooled batch and checkpoint it atomically"""
+    _store_batch(payload['batch'], payload['ts'], (segment, offset))
+
+def start_spool():
+    """Start the write-ahead spool (replays entries left by a previous run)"""
+    return odds_spool.start(_store_spooled)
+
+def store_odds(odds_data):
+    """Store odds (an OddsBatch or a list of API events)
+
+    With the spool running the batch is appended to disk and stored by the
+    drain thread; otherwise it is written directly.
+    """
+    if not odds_data:
+        return
+    
+    try:
+        batch = odds_data if isinstance(odds_data, OddsBatch) else OddsBatch.from_events(odds_data)
+        ts = schema.now_ms()
+        start_spool()
+        if odds_spool.append({'batch': batch, 'ts': ts}):
+            logger.debug(f"Spooled {len(batch)} odds records for {batch.n_events} events")
+            return
+        _store_batch(batch, ts)
     except Exception as e:
         logger.error(f"Error storing odds: {e}")
-        conn.rollback()
-    
-    finally:
-        conn.close()
 
 @track_performance('collector')
-def collect_odds():
+def collect_odds(sport_keys=None):
     """Main function to collect and store odds"""
     logger.info("Collector started")
     logger.info("Starting odds collection...")
@@ -178,7 +417,7 @@ def collect_odds():
     init_database()
     
     # Fetch odds from API
-    odds_data = fetch_odds()
+    odds_data = fetch_all_odds(sport_keys)
     
     # Store in database
     if odds_data:
@@ -187,7 +426,47 @@ def collect_odds():
     else:
         logger.warning("No odds data to store")
 
+def collect_due_odds():
+    """Collect odds only for sports the quota-aware scheduler says are due"""
+    due_sports = poll_scheduler.due_sports()
+    if due_sports:
+        collect_odds(due_sports)
+
+def discover_events():
+    """Refresh the event tracker's working set from each sport's event list"""
+    for sport_key in ODDS_SPORTS:
+        if event_tracker.discovery_due(sport_key):
+            api_events = fetch_events(sport_key)
+            if api_events is not None:
+                event_tracker.register_events(sport_key, api_events)
+
+@track_performance('collector')
+def collect_event_odds():
+    """Refresh only the events whose lifecycle cadence says they are due"""
+    init_database()
+    event_tracker.load()
+    discover_events()
+    
+    due_events = event_tracker.due_events()
+    if not due_events:
+        return
+    
+    logger.info("Collector started")
+    logger.info(f"Refreshing {len(due_events)} due events...")
+    try:
+        odds_data = fetch_event_odds([(event['sport_key'], event['id']) for event in due_events])
+    finally:
+        # Reschedule even on failure so a failing event backs off to its cadence
+        event_tracker.mark_polled([event['id'] for event in due_events])
+
+    if odds_data:
+        store_odds(odds_data)
+        logger.info("Odds collection completed successfully")
+    else:
+        logger.warning("No odds data to store")
+
 if __name__ == "__main__":
     # Test the collector
     collect_odds()
+    odds_spool.wait_drained(timeout=60)
 
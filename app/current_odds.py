@@ -0,0 +1,176 @@
+"""
+Current Odds - Latest price per (event, bookmaker, market, outcome), maintained on ingest
+
+The collector upserts `current_odds` in the same write transaction as the
+history insert, so readers that only need the current book query one small
+keyed table instead of scanning history for the newest row per key. Rows
+carry the API's event id and the bookmaker's `last_update`. A bookmaker
+whose `last_update` has not moved since the last fetch has not changed any
+price, so its rows skip both the history insert and the upsert; only its
+`seen_ts` is refreshed.
+"""
+import os
+import logging
+import threading
+import numpy as np
+import pandas as pd
+from app.db import get_db
+from app.event_tracker import use_active_odds
+from app.performance_tracker import register_runtime_metrics
+
+logger = logging.getLogger(__name__)
+
+SKIP_UNCHANGED = os.getenv('ODDS_SKIP_UNCHANGED', 'true').lower() == 'true'
+
+BOOK_COLUMNS = ['home_team', 'away_team', 'commence_time', 'bookmaker', 'market']
+OUTCOME_SIDES = {'draw': 'draw', 'tie': 'draw'}
+
+def current_source():
+    """Snapshot readers should query: without finished events in event polling mode"""
+    return 'active_current_odds' if use_active_odds() else 'current_odds'
+
+class CurrentOddsTracker:
+    """Remembers each bookmaker's last_update per (event, market) to skip unchanged books"""
+
+    def __init__(self):
+        self.last_updates = {}   # (home, away, commence, bookmaker, market) -> last_update
+        self.warmed = False
+        self.lock = threading.Lock()
+        self.stats = {'batches': 0, 'rows_seen': 0, 'rows_skipped': 0, 'books_skipped': 0}
+
+    def warm(self, cursor):
+        """Load the stored last_update of every book in the snapshot"""
+        cursor.execute(f'''
+            SELECT {', '.join(BOOK_COLUMNS)}, MAX(last_update) FROM current_odds
+            WHERE last_update != ''
+            GROUP BY {', '.join(BOOK_COLUMNS)}
+        ''')
+        self.last_updates = {tuple(row[:-1]): row[-1] for row in cursor.fetchall()}
+        self.warmed = True
+        logger.info(f"Current odds tracker warmed with {len(self.last_updates)} books")
+
+    def split(self, cursor, batch):
+        """Return (changed, unchanged_books, updates) for a batch
+
+        `changed` is a boolean mask over the batch rows, `unchanged_books` the
+        book keys whose last_update is the one already stored and `updates` the
+        new last_update per book, applied with `apply` once the write commits.
+        """
+        changed = np.ones(len(batch), dtype=bool)
+        if not batch.has_column('last_update') or not len(batch):
+            return changed, [], {}
+
+        with self.lock:
+            if not self.warmed:
+                self.warm(cursor)
+            columns = [batch.column(name) for name in BOOK_COLUMNS] + [batch.column('last_update')]
+            unchanged_books = set()
+            updates = {}
+            for i, row in enumerate(zip(*columns)):
+                book, last_update = row[:-1], row[-1]
+                if not last_update:
+                    continue
+                if SKIP_UNCHANGED and self.last_updates.get(book) == last_update:
+                    changed[i] = False
+                    unchanged_books.add(book)
+                else:
+                    updates[book] = last_update
+        return changed, list(unchanged_books), updates
+
+    def apply(self, changed, unchanged_books, updates):
+        """Record a committed batch"""
+        with self.lock:
+            self.last_updates.update(updates)
+            self.stats['batches'] += 1
+            self.stats['rows_seen'] += len(changed)
+            self.stats['rows_skipped'] += int((~changed).sum())
+            self.stats['books_skipped'] += len(unchanged_books)
+
+    def reset(self):
+        """Forget cached last_updates (reloaded on the next batch)"""
+        with self.lock:
+            self.last_updates = {}
+            self.warmed = False
+
+    def get_stats(self):
+        """Rows and books skipped as unchanged"""
+        with self.lock:
+            stats = dict(self.stats, books_tracked=len(self.last_updates), skip_unchanged=SKIP_UNCHANGED)
+        stats['skip_rate'] = stats['rows_skipped'] / stats['rows_seen'] if stats['rows_seen'] else None
+        return stats
+
+def upsert_current(cursor, batch, mask, ts, timestamp):
+    """Upsert the masked batch rows into current_odds (ts only moves when the price changes)"""
+    names = ['sport_key', 'sport_title'] + BOOK_COLUMNS + ['outcome_name', 'event_id', 'last_update']
+    columns = [batch.column(name)[mask] for name in names] + [batch.price[mask].tolist()]
+    cursor.executemany('''
+        INSERT INTO current_odds
+        (sport_key, sport_title, home_team, away_team, commence_time, bookmaker, market, outcome_name,
+         event_id, last_update, price, timestamp, ts, seen_ts)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (home_team, away_team, commence_time, bookmaker, market, outcome_name) DO UPDATE SET
+            sport_key = excluded.sport_key,
+            sport_title = excluded.sport_title,
+            event_id = COALESCE(NULLIF(excluded.event_id, ''), current_odds.event_id),
+            last_update = excluded.last_update,
+            timestamp = CASE WHEN current_odds.price IS excluded.price
+                             THEN current_odds.timestamp ELSE excluded.timestamp END,
+            ts = CASE WHEN current_odds.price IS excluded.price THEN current_odds.ts ELSE excluded.ts END,
+            price = excluded.price,
+            seen_ts = excluded.seen_ts
+    ''', (row + (timestamp, ts, ts) for row in zip(*columns)))
+
+def touch_books(cursor, books, ts):
+    """Mark unchanged books as seen at `ts`"""
+    cursor.executemany(f'''
+        UPDATE current_odds SET seen_ts = ?
+        WHERE {' AND '.join(f'{name} = ?' for name in BOOK_COLUMNS)}
+    ''', ((ts,) + tuple(book) for book in books))
+
+def get_current_odds(since_ms=None, columns='*'):
+    """Snapshot rows seen since `since_ms` as a DataFrame"""
+    query = f'SELECT {columns} FROM {current_source()}'
+    params = ()
+    if since_ms is not None:
+        query += ' WHERE seen_ts >= ?'
+        params = (since_ms,)
+    with get_db().read() as conn:
+        return pd.read_sql_query(query, conn, params=params)
+
+def outcome_side(outcome, home_team, away_team):
+    """'home' / 'draw' / 'away' for an h2h outcome name"""
+    if outcome == home_team:
+        return 'home'
+    if outcome == away_team:
+        return 'away'
+    return OUTCOME_SIDES.get(str(outcome).lower(), outcome)
+
+def event_prices(since_ms=None, market='h2h'):
+    """Best current price per side for each event: [{'match', 'event_id', 'home_team', 'away_team', 'commence_time', 'odds'}]"""
+    df = get_current_odds(since_ms, 'home_team, away_team, commence_time, event_id, market, outcome_name, price')
+    df = df[df['market'] == market]
+    if df.empty:
+        return []
+
+    best = df.groupby(['home_team', 'away_team', 'commence_time', 'outcome_name'], observed=True).agg(
+        price=('price', 'max'), event_id=('event_id', 'max')).reset_index()
+    events = []
+    for (home_team, away_team, commence_time), group in best.groupby(
+            ['home_team', 'away_team', 'commence_time'], observed=True, sort=False):
+        event_id = group['event_id'].iloc[0]
+        events.append({
+            'match': f"{home_team} vs {away_team}",
+            'event_id': event_id if isinstance(event_id, str) and event_id else None,
+            'home_team': home_team,
+            'away_team': away_team,
+            'commence_time': commence_time,
+            'odds': {outcome_side(outcome, home_team, away_team): float(price)
+                     for outcome, price in zip(group['outcome_name'], group['price'])}
+        })
+    events.sort(key=lambda event: event['commence_time'])
+    return events
+
+# Global instance
+current_tracker = CurrentOddsTracker()
+
+register_runtime_metrics('current_odds', current_tracker.get_stats)
@@ -2,12 +2,35 @@
 Flask Dashboard - Web interface for BetSentinel
 """
 from flask import Flask, render_template_string, jsonify
-import sqlite3
 import pandas as pd
 import json
-import os
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timezone
 from pathlib import Path
+from app.schema import cutoff_ms
+from app.db import get_db
+from app.event_tracker import odds_source
+from app.performance_tracker import get_runtime_metrics
+from app.signal_generator import EVENT_KEY, score_signals
+from app.signal_store import recent_signals, signal_counts
+from app.current_odds import get_current_odds
+from app.arbitrage import arbitrage_index
+from app.fair_price import fair_price_engine
+from app.steam import steam_detector
+
+def _api_signal(signal):
+    """Stored signal as returned by the signals endpoints"""
+    return {
+        'timestamp': signal['timestamp'],
+        'home_team': signal['home_team'],
+        'away_team': signal['away_team'],
+        'match': signal['match'],
+        'signal': signal['signal'],
+        'reason': signal['reason'],
+        'odds': signal['odds'] or 0.0,
+        'strategy': signal['strategy'],
+        'transition': signal['transition'],
+        'event_id': signal['event_id']
+    }
 
 def create_app():
     """Create and configure Flask app"""
@@ -744,45 +767,28 @@ def create_app():
     def api_stats():
         """API endpoint for statistics"""
         try:
-            conn = sqlite3.connect('data/odds.db')
-            
-            # Total events
-            cursor = conn.cursor()
-            cursor.execute('SELECT COUNT(DISTINCT home_team || away_team || commence_time) FROM odds')
-            total_events = cursor.fetchone()[0] or 0
-            
-            # Count distinct matches (last 24 hours)
-            cutoff = datetime.now() - timedelta(hours=24)
-            cursor.execute('SELECT COUNT(DISTINCT home_team || away_team) FROM odds WHERE timestamp >= ?', (cutoff,))
-            matches_count = cursor.fetchone()[0] or 0
+            with get_db().read() as conn:
+                # Total events
+                cursor = conn.cursor()
+                cursor.execute('SELECT COUNT(DISTINCT home_team || away_team || commence_time) FROM odds')
+                total_events = cursor.fetchone()[0] or 0
+                
+                # Count distinct matches (last 24 hours)
+                cursor.execute('SELECT COUNT(DISTINCT home_team || away_team) FROM odds WHERE ts >= ?', (cutoff_ms(hours=24),))
+                matches_count = cursor.fetchone()[0] or 0
+                
+                # Average odds
+                df = pd.read_sql_query('SELECT AVG(price) as avg_price FROM odds', conn)
             
-            # Recent signals count (last hour)
-            signals_file = 'data/signals.log'
-            recent_signals = 0
-            if os.path.exists(signals_file):
-                cutoff = datetime.now() - timedelta(hours=1)
-                with open(signals_file, 'r', encoding='utf-8', errors='replace') as f:
-                    for line in f:
-                        if line.strip():
-                            try:
-                                parts = line.split(' | ')
-                                if len(parts) >= 1:
-                                    signal_time = datetime.strptime(parts[0], '%Y-%m-%d %H:%M:%S.%f')
-                                    if signal_time >= cutoff:
-                                        recent_signals += 1
-                            except:
-                                continue
+            # Recent signals count (last hour, indexed ts range)
+            recent_count = sum(signal_counts(cutoff_ms(hours=1)).values())
             
-            # Average odds
-            df = pd.read_sql_query('SELECT AVG(price) as avg_price FROM odds', conn)
             avg_odds = float(df['avg_price'].iloc[0]) if not df.empty and not pd.isna(df['avg_price'].iloc[0]) else None
             
-            conn.close()
-            
             return jsonify({
                 'total_events': total_events,
                 'matches_count': matches_count,
-                'recent_signals': recent_signals,
+                'recent_signals': recent_count,
                 'avg_odds': avg_odds
             })
         
@@ -793,19 +799,16 @@ def create_app():
     def api_recent_odds():
         """API endpoint for recent odds"""
         try:
-            conn = sqlite3.connect('data/odds.db')
-            cutoff = datetime.now() - timedelta(hours=1)
-            
-            query = '''
+            query = f'''
                 SELECT timestamp, home_team, away_team, bookmaker, outcome_name, price
-                FROM odds 
-                WHERE timestamp >= ?
-                ORDER BY timestamp DESC
+                FROM {odds_source()} 
+                WHERE ts >= ?
+                ORDER BY ts DESC
                 LIMIT 50
             '''
             
-            df = pd.read_sql_query(query, conn, params=(cutoff,))
-            conn.close()
+            with get_db().read() as conn:
+                df = pd.read_sql_query(query, conn, params=(cutoff_ms(hours=1),))
             
             # Convert to list of dicts
             data = df.to_dict('records')
@@ -828,92 +831,41 @@ def create_app():
     def api_buy_signals():
         """API endpoint for BUY signals (bets to place)"""
         try:
-            # Read signals from log file
-            signals_file = Path('data/signals.log')
-            buy_signals = []
-            
-            if signals_file.exists():
-                with open(signals_file, 'r', encoding='utf-8', errors='replace') as f:
-                    lines = f.readlines()
-                    
-                    # Parse last 100 lines (most recent signals)
-                    for line in lines[-100:]:
-                        if 'BUY' in line:
-                            try:
-                                # Parse log format: timestamp | match | BUY | reason | Odds: X.XX
-                                parts = line.split(' | ')
-                                if len(parts) >= 5:
-                                    timestamp_str = parts[0].strip()
-                                    match = parts[1].strip()
-                                    signal = parts[2].strip()
-                                    reason = parts[3].strip()
-                                    odds_str = parts[4].replace('Odds:', '').strip()
-                                    
-                                    # Extract home and away teams
-                                    if ' vs ' in match:
-                                        home_team, away_team = match.split(' vs ', 1)
-                                    else:
-                                        home_team = match
-                                        away_team = ''
-                                    
-                                    buy_signals.append({
-                                        'timestamp': timestamp_str,
-                                        'home_team': home_team,
-                                        'away_team': away_team,
-                                        'match': match,
-                                        'signal': signal,
-                                        'reason': reason,
-                                        'odds': float(odds_str) if odds_str.replace('.', '').isdigit() else 0.0
-                                    })
-                            except Exception as e:
-                                continue
+            # Most recent stored BUY signals ((signal, ts) index)
+            buy_signals = [_api_signal(s) for s in recent_signals(limit=100, signal='BUY')]
             
             # Also check database for recent odds that might be BUY signals
-            # This provides real-time BUY signals even if log hasn't been updated
+            # This provides real-time BUY signals before the next generator run stores them
             try:
-                conn = sqlite3.connect('data/odds.db')
-                cutoff = datetime.now() - timedelta(hours=1)
-                
-                query = '''
-                    SELECT home_team, away_team, outcome_name, price, timestamp, bookmaker
-                    FROM odds 
-                    WHERE timestamp >= ?
-                    ORDER BY timestamp DESC
-                '''
-                
-                df = pd.read_sql_query(query, conn, params=(cutoff,))
-                conn.close()
+                # Latest price per bookmaker and outcome from the current_odds snapshot
+                df = get_current_odds(cutoff_ms(hours=1),
+                                      'home_team, away_team, commence_time, outcome_name, price, timestamp, bookmaker')
                 
                 if not df.empty:
-                    # Group by match and analyze for BUY signals
-                    grouped = df.groupby(['home_team', 'away_team'])
+                    # Score every match in one vectorized pass (same rule as the signal generator)
+                    signals = score_signals(df)
+                    signals = signals[signals['signal'] == 'BUY']
                     
-                    for (home_team, away_team), group in grouped:
-                        outcome_odds = group.groupby('outcome_name')['price'].mean()
-                        max_odds = outcome_odds.max()
-                        std_odds = group.groupby('outcome_name')['price'].std().max()
-                        
-                        # BUY signal criteria: odds > 2.0 and low variance
-                        if max_odds > 2.0 and (pd.isna(std_odds) or std_odds < 0.2):
-                            # Check if we already have this signal from log
-                            match_key = f"{home_team} vs {away_team}"
-                            if not any(s['match'] == match_key for s in buy_signals):
-                                # Get best bookmaker for this match
-                                best_bookmaker = group.loc[group['price'].idxmax(), 'bookmaker']
-                                best_outcome = group.loc[group['price'].idxmax(), 'outcome_name']
-                                latest_timestamp = group['timestamp'].max()
-                                
-                                buy_signals.append({
-                                    'timestamp': latest_timestamp,
-                                    'home_team': home_team,
-                                    'away_team': away_team,
-                                    'match': match_key,
-                                    'signal': 'BUY',
-                                    'reason': f'High odds ({max_odds:.2f}) with low variance',
-                                    'odds': float(max_odds),
-                                    'outcome': best_outcome,
-                                    'bookmaker': best_bookmaker
-                                })
+                    # Best quote and latest update per match
+                    best = df.loc[df.groupby(EVENT_KEY)['price'].idxmax(), EVENT_KEY + ['outcome_name', 'bookmaker']]
+                    latest = df.groupby(EVENT_KEY)['timestamp'].max().rename('latest_timestamp')
+                    signals = signals.merge(best, on=EVENT_KEY, how='left').merge(latest, on=EVENT_KEY, how='left')
+                    
+                    for row in signals.itertuples(index=False):
+                        # Check if we already have this signal from the signals table
+                        match_key = f"{row.home_team} vs {row.away_team}"
+                        if not any(s['match'] == match_key for s in buy_signals):
+                            buy_signals.append({
+                                'timestamp': row.latest_timestamp,
+                                'home_team': row.home_team,
+                                'away_team': row.away_team,
+                                'match': match_key,
+                                'signal': 'BUY',
+                                'reason': row.reason,
+                                'odds': float(row.max_odds),
+                                'outcome': row.outcome_name,
+                                'bookmaker': row.bookmaker
+                            })
             except Exception as e:
                 pass
             
@@ -933,42 +885,7 @@ def create_app():
     def api_all_signals():
         """API endpoint for all signals (BUY and IGNORE)"""
         try:
-            signals_file = Path('data/signals.log')
-            all_signals = []
-            
-            if signals_file.exists():
-                with open(signals_file, 'r', encoding='utf-8', errors='replace') as f:
-                    lines = f.readlines()
-                    
-                    # Parse last 200 lines
-                    for line in lines[-200:]:
-                        if ' | ' in line and ('BUY' in line or 'IGNORE' in line):
-                            try:
-                                parts = line.split(' | ')
-                                if len(parts) >= 5:
-                                    timestamp_str = parts[0].strip()
-                                    match = parts[1].strip()
-                                    signal = parts[2].strip()
-                                    reason = parts[3].strip()
-                                    odds_str = parts[4].replace('Odds:', '').strip()
-                                    
-                                    if ' vs ' in match:
-                                        home_team, away_team = match.split(' vs ', 1)
-                                    else:
-                                        home_team = match
-                                        away_team = ''
-                                    
-                                    all_signals.append({
-                                        'timestamp': timestamp_str,
-                                        'home_team': home_team,
-                                        'away_team': away_team,
-                                        'match': match,
-                                        'signal': signal,
-                                        'reason': reason,
-                                        'odds': float(odds_str) if odds_str.replace('.', '').isdigit() else 0.0
-                                    })
-                            except Exception as e:
-                                continue
+            all_signals = [_api_signal(s) for s in recent_signals(limit=100)]
             
             # Sort by timestamp (most recent first)
             all_signals.sort(key=lambda x: x['timestamp'], reverse=True)
@@ -983,6 +900,50 @@ def create_app():
         except Exception as e:
             return jsonify({'error': str(e), 'signals': [], 'count': 0}), 500
     
+    @app.route('/api/arbitrage')
+    def api_arbitrage():
+        """API endpoint for open cross-bookmaker arbitrage opportunities"""
+        try:
+            opportunities = arbitrage_index.open_opportunities()
+            return jsonify({
+                'opportunities': opportunities,
+                'count': len(opportunities),
+                'recent': [_api_signal(s) for s in recent_signals(limit=50, signal='ARB')]
+            })
+        
+        except Exception as e:
+            return jsonify({'error': str(e), 'opportunities': [], 'count': 0}), 500
+    
+    @app.route('/api/steam')
+    def api_steam():
+        """API endpoint for open odds movements (steam moves)"""
+        try:
+            moves = steam_detector.open_moves()
+            return jsonify({
+                'moves': moves,
+                'count': len(moves),
+                'recent': [_api_signal(s) for s in recent_signals(limit=50, signal='STEAM')]
+            })
+        
+        except Exception as e:
+            return jsonify({'error': str(e), 'moves': [], 'count': 0}), 500
+    
+    @app.route('/api/fair-prices')
+    def api_fair_prices():
+        """API endpoint for margin-removed fair prices and expected value per outcome"""
+        try:
+            table = fair_price_engine.table().sort_values('ev', ascending=False)
+            records = table.astype(object).where(table.notna(), None).to_dict('records')
+            return jsonify({'outcomes': records, 'count': len(records), 'method': fair_price_engine.method})
+        
+        except Exception as e:
+            return jsonify({'error': str(e), 'outcomes': [], 'count': 0}), 500
+    
+    @app.route('/api/runtime-metrics')
+    def api_runtime_metrics():
+        """API endpoint for live in-process metrics (database contention, etc.)"""
+        return jsonify(get_runtime_metrics())
+    
     return app
 
 if __name__ == "__main__":
@@ -0,0 +1,270 @@
+"""
+Database - Shared SQLite access layer (WAL, single writer, pooled readers)
+
+All writes in a process go through one writer thread fed by a bounded queue,
+so collector writes never contend with each other and callers get
+backpressure instead of `database is locked` errors. Reads use a pool of
+read-only connections with a large prepared-statement cache; in WAL mode
+they never block on the writer.
+
+Usage:
+    db = get_db()
+    db.write(lambda conn: conn.execute(...))       # runs in the writer thread
+    with db.read() as conn:                          # pooled read-only connection
+        df = pd.read_sql_query(query, conn)
+"""
+import os
+import time
+import queue
+import random
+import sqlite3
+import logging
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+from app import schema
+from app.performance_tracker import register_runtime_metrics
+
+logger = logging.getLogger(__name__)
+
+WRITE_QUEUE_SIZE = int(os.getenv('DB_WRITE_QUEUE_SIZE', 256))
+READ_POOL_SIZE = int(os.getenv('DB_READ_POOL_SIZE', 4))
+BUSY_TIMEOUT_MS = int(os.getenv('DB_BUSY_TIMEOUT_MS', 5000))
+WRITE_RETRIES = 5
+STATEMENT_CACHE_SIZE = 256
+
+# Applied to every connection; journal_mode is persistent and set by the writer
+CONNECTION_PRAGMAS = [
+    f'PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}',
+    'PRAGMA cache_size = -32000',        # 32 MB page cache
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA mmap_size = 268435456',      # 256 MB
+]
+WRITER_PRAGMAS = [
+    'PRAGMA auto_vacuum = INCREMENTAL',  # takes effect on new databases; retention converts old ones
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',       # durable across app crashes in WAL mode
+    'PRAGMA wal_autocheckpoint = 1000',
+]
+
+def _is_busy_error(error):
+    """Check whether an OperationalError is lock contention"""
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+class Database:
+    """One writer thread plus a pool of read-only connections for a SQLite file"""
+
+    def __init__(self, path=schema.DB_PATH, read_pool_size=READ_POOL_SIZE, write_queue_size=WRITE_QUEUE_SIZE):
+        self.path = path
+        self.pid = os.getpid()
+        self.read_pool_size = read_pool_size
+        self.write_queue = queue.Queue(maxsize=write_queue_size)
+        self.read_pool = queue.Queue()
+        self.read_connections = 0
+        self.pool_lock = threading.Lock()
+        self.stats_lock = threading.Lock()
+        self.ready = threading.Event()
+        self.stats = {
+            'writes': 0,
+            'write_errors': 0,
+            'busy_retries': 0,
+            'write_enqueue_wait_total': 0.0,
+            'write_enqueue_wait_max': 0.0,
+            'write_queue_wait_total': 0.0,
+            'write_exec_total': 0.0,
+            'reads': 0,
+            'read_wait_total': 0.0,
+            'read_wait_max': 0.0,
+        }
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.writer = threading.Thread(target=self._writer_loop, name='db-writer', daemon=True)
+        self.writer.start()
+        self.ready.wait()
+
+    def _connect(self, readonly=False):
+        """Open a tuned connection"""
+        if readonly:
+            conn = sqlite3.connect(f'file:{self.path}?mode=ro', uri=True, check_same_thread=False,
+                                   cached_statements=STATEMENT_CACHE_SIZE)
+        else:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None,
+                                   cached_statements=STATEMENT_CACHE_SIZE)
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _record(self, **values):
+        """Accumulate contention counters"""
+        with self.stats_lock:
+            for key, value in values.items():
+                if key.endswith('_max'):
+                    self.stats[key] = max(self.stats[key], value)
+                else:
+                    self.stats[key] += value
+
+    # ------------------------------------------------------------------
+    # Writer
+    # ------------------------------------------------------------------
+
+    def _writer_loop(self):
+        """Execute queued write jobs one at a time on the writer connection"""
+        conn = self._connect()
+        for pragma in WRITER_PRAGMAS:
+            conn.execute(pragma)
+        try:
+            schema.initialize(conn)
+        except Exception as e:
+            logger.error(f"Error initializing database schema: {e}")
+        self.ready.set()
+
+        while True:
+            job = self.write_queue.get()
+            if job is None:
+                break
+            fn, args, transaction, future, enqueued_at = job
+            self._record(write_queue_wait_total=time.time() - enqueued_at)
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            start_time = time.time()
+            for attempt in range(WRITE_RETRIES + 1):
+                try:
+                    if transaction:
+                        conn.execute('BEGIN IMMEDIATE')
+                    result = fn(conn, *args)
+                    if conn.in_transaction:
+                        conn.execute('COMMIT')
+                    future.set_result(result)
+                    self._record(writes=1, write_exec_total=time.time() - start_time)
+                    break
+                except sqlite3.OperationalError as e:
+                    if conn.in_transaction:
+                        conn.execute('ROLLBACK')
+                    if _is_busy_error(e) and attempt < WRITE_RETRIES:
+                        self._record(busy_retries=1)
+                        time.sleep(min(2.0, 0.05 * 2 ** attempt) * random.uniform(0.5, 1.5))
+                        continue
+                    self._record(write_errors=1)
+                    future.set_exception(e)
+                    break
+                except Exception as e:
+                    if conn.in_transaction:
+                        conn.execute('ROLLBACK')
+                    self._record(write_errors=1)
+                    future.set_exception(e)
+                    break
+
+        conn.close()
+
+    def submit(self, fn, *args, transaction=True):
+        """Queue fn(conn, *args) for the writer thread and return a Future
+
+        Blocks while the queue is full (backpressure). With transaction=True
+        the job runs inside BEGIN IMMEDIATE ... COMMIT and is retried on lock
+        contention, so fn must be safe to re-run.
+        """
+        future = Future()
+        start_time = time.time()
+        self.write_queue.put((fn, args, transaction, future, time.time()))
+        waited = time.time() - start_time
+        self._record(write_enqueue_wait_total=waited, write_enqueue_wait_max=waited)
+        return future
+
+    def write(self, fn, *args, transaction=True, timeout=None):
+        """Run fn(conn, *args) in the writer thread and wait for its result"""
+        return self.submit(fn, *args, transaction=transaction).result(timeout=timeout)
+
+    # ------------------------------------------------------------------
+    # Readers
+    # ------------------------------------------------------------------
+
+    @contextmanager
+    def read(self):
+        """Borrow a read-only connection from the pool"""
+        start_time = time.time()
+        conn = None
+        try:
+            conn = self.read_pool.get_nowait()
+        except queue.Empty:
+            with self.pool_lock:
+                if self.read_connections < self.read_pool_size:
+                    self.read_connections += 1
+                    create = True
+                else:
+                    create = False
+            if create:
+                try:
+                    conn = self._connect(readonly=True)
+                except Exception:
+                    with self.pool_lock:
+                        self.read_connections -= 1
+                    raise
+            else:
+                conn = self.read_pool.get()
+
+        waited = time.time() - start_time
+        self._record(reads=1, read_wait_total=waited, read_wait_max=waited)
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self.read_pool.put(conn)
+
+    # ------------------------------------------------------------------
+    # Lifecycle and metrics
+    # ------------------------------------------------------------------
+
+    def get_stats(self):
+        """Get contention metrics"""
+        with self.stats_lock:
+            stats = dict(self.stats)
+        writes = max(stats['writes'] + stats['write_errors'], 1)
+        reads = max(stats['reads'], 1)
+        stats.update({
+            'write_queue_depth': self.write_queue.qsize(),
+            'write_queue_capacity': self.write_queue.maxsize,
+            'read_pool_size': self.read_pool_size,
+            'read_connections_open': self.read_connections,
+            'read_connections_idle': self.read_pool.qsize(),
+            'avg_write_enqueue_wait': stats['write_enqueue_wait_total'] / writes,
+            'avg_write_queue_wait': stats['write_queue_wait_total'] / writes,
+            'avg_write_exec': stats['write_exec_total'] / writes,
+            'avg_read_wait': stats['read_wait_total'] / reads,
+        })
+        return stats
+
+    def close(self):
+        """Stop the writer and close pooled readers"""
+        self.write_queue.put(None)
+        self.writer.join(timeout=5)
+        while True:
+            try:
+                self.read_pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+_db = None
+_db_lock = threading.Lock()
+
+def get_db():
+    """Get the process-wide Database (recreated after fork, e.g. gunicorn workers)"""
+    global _db
+    if _db is None or _db.pid != os.getpid():
+        with _db_lock:
+            if _db is None or _db.pid != os.getpid():
+                _db = Database()
+    return _db
+
+def get_db_stats():
+    """Contention metrics for the process-wide Database"""
+    if _db is None or _db.pid != os.getpid():
+        return {}
+    return _db.get_stats()
+
+register_runtime_metrics('database', get_db_stats)
@@ -0,0 +1,149 @@
+"""
+Delta Store - Change-only odds ingestion with periodic keyframes
+
+In delta mode a price row is only written when the price for its
+(event, bookmaker, market, outcome) key differs from the last one written.
+Every KEYFRAME_INTERVAL seconds a full snapshot is written instead, and its
+time is recorded in `odds_keyframes`. The full book at any time T is then the
+latest row per key between the last keyframe <= T and T (an indexed `ts` scan).
+"""
+import os
+import time
+import logging
+import threading
+import pandas as pd
+from datetime import datetime
+from app import schema
+from app.db import get_db
+
+logger = logging.getLogger(__name__)
+
+# 'full' writes every polled price, 'delta' writes only changed prices
+INGEST_MODE = os.getenv('ODDS_INGEST_MODE', 'full').lower()
+KEYFRAME_INTERVAL = int(os.getenv('ODDS_KEYFRAME_INTERVAL', 3600))  # seconds
+
+KEY_COLUMNS = ['sport_key', 'home_team', 'away_team', 'commence_time',
+               'bookmaker', 'market', 'outcome_name']
+
+def _row_key(row):
+    """Key of a wide-format odds row (see schema.insert_odds_rows)"""
+    sport_key, _, home_team, away_team, commence_time, bookmaker, market, outcome_name, _ = row
+    return (sport_key, home_team, away_team, commence_time, bookmaker, market, outcome_name)
+
+class DeltaTracker:
+    """Tracks the last written price per key and decides what to write"""
+
+    def __init__(self, keyframe_interval=KEYFRAME_INTERVAL):
+        self.keyframe_interval = keyframe_interval
+        self.last_prices = {}
+        self.last_keyframe = 0.0
+        self.warmed = False
+        self.rows_seen = 0
+        self.rows_written = 0
+        self.lock = threading.Lock()
+
+    def warm(self, cursor):
+        """Load last-seen prices and keyframe time from the database"""
+        cursor.execute('SELECT MAX(ts) FROM odds_keyframes')
+        keyframe_ts = cursor.fetchone()[0]
+
+        if keyframe_ts is not None:
+            # Latest row per key since the last keyframe is the current book
+            columns = ', '.join(KEY_COLUMNS)
+            cursor.execute(f'''
+                SELECT {columns}, price FROM odds
+                WHERE id IN (
+                    SELECT MAX(id) FROM odds
+                    WHERE ts >= ?
+                    GROUP BY {columns}
+                )
+            ''', (keyframe_ts,))
+            self.last_prices = {tuple(row[:-1]): row[-1] for row in cursor.fetchall()}
+            self.last_keyframe = keyframe_ts / 1000
+
+        self.warmed = True
+        logger.info(f"Delta tracker warmed with {len(self.last_prices)} prices "
+                    f"(last keyframe: {schema.from_epoch_ms(keyframe_ts) if keyframe_ts else 'none'} UTC)")
+
+    def diff(self, cursor, rows):
+        """Return (rows_to_write, is_keyframe) for a batch of wide-format rows"""
+        with self.lock:
+            if not self.warmed:
+                self.warm(cursor)
+
+            is_keyframe = time.time() - self.last_keyframe >= self.keyframe_interval
+            if is_keyframe:
+                return list(rows), True
+
+            changed = [row for row in rows if self.last_prices.get(_row_key(row)) != row[-1]]
+            return changed, False
+
+    def apply(self, seen_rows, written_rows, is_keyframe):
+        """Update state once the write has been committed"""
+        with self.lock:
+            if is_keyframe:
+                self.last_prices = {}
+                self.last_keyframe = time.time()
+            for row in written_rows:
+                self.last_prices[_row_key(row)] = row[-1]
+            self.rows_seen += len(seen_rows)
+            self.rows_written += len(written_rows)
+
+    def reset(self):
+        """Drop in-memory state so the next batch re-warms from the database"""
+        with self.lock:
+            self.last_prices = {}
+            self.last_keyframe = 0.0
+            self.warmed = False
+
+    def get_stats(self):
+        """Get write reduction statistics"""
+        with self.lock:
+            return {
+                'tracked_keys': len(self.last_prices),
+                'rows_seen': self.rows_seen,
+                'rows_written': self.rows_written,
+                'write_ratio': (self.rows_written / self.rows_seen) if self.rows_seen else None,
+                'last_keyframe': datetime.fromtimestamp(self.last_keyframe).isoformat() if self.last_keyframe else None
+            }
+
+def record_keyframe(cursor, ts):
+    """Mark a full snapshot written at `ts` (epoch milliseconds)"""
+    cursor.execute('INSERT INTO odds_keyframes (timestamp, ts) VALUES (?, ?)',
+                   (schema.from_epoch_ms(ts).strftime('%Y-%m-%d %H:%M:%S'), ts))
+
+def get_snapshot_at(at=None):
+    """Rebuild the full odds book as of a datetime or epoch-ms value (default: now)"""
+    if at is None:
+        at_ms = schema.now_ms()
+    elif isinstance(at, datetime):
+        at_ms = schema.to_epoch_ms(at)
+    else:
+        at_ms = int(at)
+
+    try:
+        with get_db().read() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT MAX(ts) FROM odds_keyframes WHERE ts <= ?', (at_ms,))
+            keyframe_ts = cursor.fetchone()[0]
+
+            # Without a keyframe (full ingest mode) fall back to the whole history
+            window_start = keyframe_ts or 0
+
+            columns = ', '.join(KEY_COLUMNS)
+            query = f'''
+                SELECT * FROM odds
+                WHERE id IN (
+                    SELECT MAX(id) FROM odds
+                    WHERE ts >= ? AND ts <= ?
+                    GROUP BY {columns}
+                )
+            '''
+            return pd.read_sql_query(query, conn, params=(window_start, at_ms))
+
+    except Exception as e:
+        logger.error(f"Error rebuilding odds snapshot: {e}")
+        return pd.DataFrame()
+
+# Global instance
+delta_tracker = DeltaTracker()
@@ -0,0 +1,246 @@
+"""
+Event Tracker - Per-event lifecycle and priority-queue polling
+
+Each event moves through scheduled -> near_kickoff -> in_play -> finished.
+Active events sit in a heap keyed by their next-due time and are refreshed
+individually through the per-event odds endpoint at a cadence that depends
+on their state. Finished events are archived in `event_lifecycle` and leave
+the hot set, so readers using `active_odds` only scan events still in play.
+"""
+import os
+import time
+import heapq
+import logging
+import threading
+from datetime import datetime, timezone
+from app import schema
+from app.db import get_db
+from app.performance_tracker import register_runtime_metrics
+from app.poll_scheduler import (POLL_MODE, PollScheduler, quota_tracker, parse_commence_time,
+                                MIN_POLL_INTERVAL, MAX_POLL_INTERVAL)
+
+logger = logging.getLogger(__name__)
+
+SCHEDULED = 'scheduled'
+NEAR_KICKOFF = 'near_kickoff'
+IN_PLAY = 'in_play'
+FINISHED = 'finished'
+
+NEAR_KICKOFF_HOURS = float(os.getenv('NEAR_KICKOFF_HOURS', 2))
+MATCH_DURATION_HOURS = float(os.getenv('MATCH_DURATION_HOURS', 2.5))
+DISCOVERY_INTERVAL = int(os.getenv('EVENT_DISCOVERY_INTERVAL', 900))  # seconds
+MAX_EVENTS_PER_TICK = int(os.getenv('MAX_EVENTS_PER_TICK', 50))
+
+# Fixed cadence per state; scheduled events use the kickoff-distance tiers
+STATE_INTERVALS = {
+    NEAR_KICKOFF: 120,
+    IN_PLAY: MIN_POLL_INTERVAL,
+}
+
+def lifecycle_state(commence_time, now=None):
+    """Derive the lifecycle state of an event from its kickoff time"""
+    now = now or datetime.now(timezone.utc)
+    kickoff = parse_commence_time(commence_time)
+    if kickoff is None:
+        return SCHEDULED
+    hours = (kickoff - now).total_seconds() / 3600
+    if hours <= -MATCH_DURATION_HOURS:
+        return FINISHED
+    if hours <= 0:
+        return IN_PLAY
+    if hours <= NEAR_KICKOFF_HOURS:
+        return NEAR_KICKOFF
+    return SCHEDULED
+
+def use_active_odds():
+    """Whether readers should restrict themselves to the active working set"""
+    return POLL_MODE == 'event'
+
+def odds_source():
+    """Table or view readers should scan: `active_odds` in event mode, else `odds`"""
+    return 'active_odds' if use_active_odds() else 'odds'
+
+def _upsert_events(conn, rows):
+    """Writer job: persist lifecycle rows"""
+    conn.executemany('''
+        INSERT INTO event_lifecycle
+        (event_id, sport_key, home_team, away_team, commence_time, state, last_polled_ms, next_due_ms, updated_ms)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(event_id) DO UPDATE SET
+            home_team = excluded.home_team,
+            away_team = excluded.away_team,
+            commence_time = excluded.commence_time,
+            state = excluded.state,
+            last_polled_ms = COALESCE(excluded.last_polled_ms, event_lifecycle.last_polled_ms),
+            next_due_ms = excluded.next_due_ms,
+            updated_ms = excluded.updated_ms
+    ''', rows)
+
+class EventTracker:
+    """Priority queue of active events keyed by next-due time"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.events = {}        # event_id -> dict
+        self.heap = []          # (next_due, event_id)
+        self.last_discovery = {}
+        self.request_cost = 1
+        self.scale = 1.0
+        self.loaded = False
+        self.polls = 0
+        self.archived = 0
+
+    def configure(self, request_cost):
+        """Set the quota cost of refreshing one event"""
+        with self.lock:
+            self.request_cost = max(1, request_cost)
+
+    def _row(self, event):
+        """Lifecycle table row for an event"""
+        return (event['id'], event['sport_key'], event['home_team'], event['away_team'],
+                event['commence_time'], event['state'], event.get('last_polled_ms'),
+                int(event['next_due'] * 1000), schema.now_ms())
+
+    def load(self):
+        """Warm the hot set from persisted lifecycle rows"""
+        with self.lock:
+            if self.loaded:
+                return
+            try:
+                with get_db().read() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute('''
+                        SELECT event_id, sport_key, home_team, away_team, commence_time,
+                               state, last_polled_ms, next_due_ms
+                        FROM event_lifecycle WHERE state != ?
+                    ''', (FINISHED,))
+                    rows = cursor.fetchall()
+            except Exception as e:
+                logger.error(f"Error loading event lifecycle: {e}")
+                rows = []
+            for event_id, sport_key, home_team, away_team, commence_time, state, last_polled_ms, next_due_ms in rows:
+                self.events[event_id] = {
+                    'id': event_id, 'sport_key': sport_key, 'home_team': home_team,
+                    'away_team': away_team, 'commence_time': commence_time, 'state': state,
+                    'last_polled_ms': last_polled_ms, 'next_due': (next_due_ms or 0) / 1000
+                }
+                heapq.heappush(self.heap, ((next_due_ms or 0) / 1000, event_id))
+            self.loaded = True
+            logger.info(f"Event tracker loaded {len(rows)} active events")
+
+    def discovery_due(self, sport_key):
+        """Whether a sport's event list should be re-fetched"""
+        return time.time() - self.last_discovery.get(sport_key, 0) >= DISCOVERY_INTERVAL
+
+    def interval_for(self, event):
+        """Budget-scaled refresh interval for an event in its current state"""
+        interval = STATE_INTERVALS.get(event['state'])
+        if interval is None:
+            interval = PollScheduler.base_interval(event['commence_time'])
+        return min(MAX_POLL_INTERVAL, max(MIN_POLL_INTERVAL, interval * self.scale))
+
+    def _rescale(self):
+        """Stretch all cadences together if the active set would exceed the quota budget"""
+        desired_per_hour = 0.0
+        for event in self.events.values():
+            interval = STATE_INTERVALS.get(event['state']) or PollScheduler.base_interval(event['commence_time'])
+            desired_per_hour += 3600 / interval * self.request_cost
+        budget = quota_tracker.budget_per_hour()
+        self.scale = max(1.0, desired_per_hour / budget) if budget > 0 else float('inf')
+
+    def register_events(self, sport_key, api_events):
+        """Add or update events from the events-list endpoint"""
+        now = time.time()
+        changed = []
+        with self.lock:
+            self.last_discovery[sport_key] = now
+            for api_event in api_events or []:
+                event_id = api_event.get('id')
+                if not event_id:
+                    continue
+                state = lifecycle_state(api_event.get('commence_time'))
+                event = self.events.get(event_id)
+                if event is None:
+                    if state == FINISHED:
+                        continue
+                    event = {'id': event_id, 'last_polled_ms': None, 'next_due': now}
+                    self.events[event_id] = event
+                    heapq.heappush(self.heap, (now, event_id))
+                event.update({
+                    'sport_key': api_event.get('sport_key', sport_key),
+                    'home_team': api_event.get('home_team', ''),
+                    'away_team': api_event.get('away_team', ''),
+                    'commence_time': api_event.get('commence_time', ''),
+                    'state': state
+                })
+                changed.append(self._row(event))
+            self._rescale()
+        if changed:
+            get_db().submit(_upsert_events, changed)
+
+    def due_events(self, limit=MAX_EVENTS_PER_TICK):
+        """Pop events whose next-due time has passed, archiving finished ones"""
+        now = time.time()
+        due = []
+        archived = []
+        with self.lock:
+            if quota_tracker.effective_remaining() < self.request_cost:
+                return due
+            while self.heap and self.heap[0][0] <= now and len(due) < limit:
+                next_due, event_id = heapq.heappop(self.heap)
+                event = self.events.get(event_id)
+                # Skip stale heap entries left behind by rescheduling
+                if event is None or event['next_due'] != next_due:
+                    continue
+                event['state'] = lifecycle_state(event['commence_time'])
+                if event['state'] == FINISHED:
+                    del self.events[event_id]
+                    archived.append(self._row(event))
+                    continue
+                due.append(dict(event))
+            if archived:
+                self.archived += len(archived)
+                self._rescale()
+        if archived:
+            get_db().submit(_upsert_events, archived)
+            logger.info(f"Archived {len(archived)} finished events")
+        return due
+
+    def mark_polled(self, event_ids):
+        """Reschedule events after a refresh attempt"""
+        now = time.time()
+        rows = []
+        with self.lock:
+            for event_id in event_ids:
+                event = self.events.get(event_id)
+                if event is None:
+                    continue
+                event['last_polled_ms'] = int(now * 1000)
+                event['next_due'] = now + self.interval_for(event)
+                heapq.heappush(self.heap, (event['next_due'], event_id))
+                rows.append(self._row(event))
+                self.polls += 1
+        if rows:
+            get_db().submit(_upsert_events, rows)
+
+    def get_stats(self):
+        """Active working set by state and queue head"""
+        with self.lock:
+            by_state = {}
+            for event in self.events.values():
+                by_state[event['state']] = by_state.get(event['state'], 0) + 1
+            next_due = min((event['next_due'] for event in self.events.values()), default=None)
+            return {
+                'active_events': len(self.events),
+                'by_state': by_state,
+                'heap_size': len(self.heap),
+                'scale': self.scale,
+                'polls': self.polls,
+                'archived': self.archived,
+                'next_due_in': round(next_due - time.time(), 1) if next_due else None
+            }
+
+# Global instance
+event_tracker = EventTracker()
+
+register_runtime_metrics('event_tracker', event_tracker.get_stats)
@@ -0,0 +1,220 @@
+"""
+Fair Price - Margin-removed probabilities for every event and market in one NumPy pass
+
+Each bookmaker's prices for an (event, market) form a book. A book's implied
+probabilities `1 / price` sum to more than 1; the excess is its overround.
+Removing it gives fair probabilities, either proportionally (`implied / sum`)
+or with Shin's method, which attributes the margin to insider trading and so
+takes more of it off longshots. Shin's insider share `z` is solved for every
+book at once by bisection. The consensus probability of an outcome is the
+weighted mean of its fair probabilities across complete books. Each book is
+weighted by FAIR_BOOK_WEIGHTS divided by its implied sum, so tighter books count
+more. Expected value is `best price * consensus probability - 1`.
+
+The engine reads the current_odds snapshot and caches results per event.
+`ts` only moves when a price changes, so an event is recomputed when its row
+count or price timestamps change and served from the cache otherwise.
+"""
+import os
+import time
+import logging
+import threading
+import numpy as np
+import pandas as pd
+from app.schema import now_ms
+from app.current_odds import get_current_odds, outcome_side
+from app.strategies import EVENT_KEY, register_feature, register_strategy
+from app.performance_tracker import register_runtime_metrics
+
+logger = logging.getLogger(__name__)
+
+FAIR_MARKETS = [m.strip() for m in os.getenv('FAIR_MARKETS', 'h2h').split(',') if m.strip()]
+FAIR_METHOD = os.getenv('FAIR_METHOD', 'shin').lower()      # 'shin' or 'proportional'
+FAIR_MAX_AGE = int(os.getenv('FAIR_MAX_AGE', 3600))         # seconds a bookmaker's prices count as live
+FAIR_MIN_EV = float(os.getenv('FAIR_MIN_EV', 0.02))         # expected value the positive_ev strategy needs
+FAIR_BOOK_WEIGHTS = {
+    name.strip(): float(weight)
+    for name, _, weight in (item.partition('=') for item in os.getenv('FAIR_BOOK_WEIGHTS', '').split(','))
+    if name.strip() and weight.strip()
+}
+SHIN_ITERATIONS = 50
+
+MARKET_KEY = EVENT_KEY + ['market']
+COLUMNS = MARKET_KEY + ['outcome_name', 'books', 'overround', 'implied', 'prob_proportional', 'prob_shin',
+                        'prob', 'fair_price', 'best_price', 'best_bookmaker', 'ev']
+
+def _shin(implied, z, total):
+    """Shin probability of each outcome for insider share z and book implied sum"""
+    return (np.sqrt(z * z + 4 * (1 - z) * implied * implied / total) - z) / (2 * (1 - z))
+
+def shin_probabilities(implied, book, total, iterations=SHIN_ITERATIONS):
+    """Shin fair probabilities for rows grouped into books, solving z per book by bisection
+
+    `book` is each row's book index and `total` the implied sum per book. The
+    probabilities of a book sum to sqrt(total) at z = 0 and decrease in z, so
+    every book's z is bracketed in [0, 1) and halved together each iteration.
+    Books without a margin keep z = 0 and fall back to proportional.
+    """
+    lo = np.zeros(len(total))
+    hi = np.full(len(total), 1 - 1e-9)
+    row_total = total[book]
+    for _ in range(iterations):
+        z = (lo + hi) / 2
+        above = np.bincount(book, _shin(implied, z[book], row_total), minlength=len(total)) > 1
+        lo = np.where(above, z, lo)
+        hi = np.where(above, hi, z)
+    z = np.where(total > 1, (lo + hi) / 2, 0.0)
+    probs = _shin(implied, z[book], row_total)
+    return probs / np.bincount(book, probs, minlength=len(total))[book]
+
+def compute_fair_prices(df, method=FAIR_METHOD, book_weights=None):
+    """Fair probabilities, consensus and expected value per (event, market, outcome)
+
+    `df` holds one price per (event, market, bookmaker, outcome), as in the
+    current_odds snapshot. Only books quoting every outcome of their market
+    are de-margined; every price counts towards the best price.
+    """
+    df = df[df['price'] > 1]
+    if df.empty:
+        return pd.DataFrame(columns=COLUMNS)
+    book_weights = FAIR_BOOK_WEIGHTS if book_weights is None else book_weights
+
+    market = df.groupby(MARKET_KEY, observed=True, sort=False).ngroup().to_numpy()
+    book = df.groupby(MARKET_KEY + ['bookmaker'], observed=True, sort=False).ngroup().to_numpy()
+    outcome = df.groupby(MARKET_KEY + ['outcome_name'], observed=True, sort=False).ngroup().to_numpy()
+    price = df['price'].to_numpy(dtype=float)
+    implied = 1.0 / price
+
+    # Books quoting fewer outcomes than their market has cannot be normalised
+    book_outcomes = np.bincount(book)
+    market_of_book = np.zeros(len(book_outcomes), dtype=np.int64)
+    market_of_book[book] = market
+    market_outcomes = np.zeros(market.max() + 1, dtype=np.int64)
+    np.maximum.at(market_outcomes, market_of_book, book_outcomes)
+    complete = (book_outcomes == market_outcomes[market_of_book])[book]
+
+    total = np.bincount(book, implied)
+    proportional = implied / total[book]
+    shin = shin_probabilities(implied, book, total)
+    weight = df['bookmaker'].map(book_weights).fillna(1.0).to_numpy(dtype=float) / total[book] * complete
+
+    n_outcomes = outcome.max() + 1
+    market_of_outcome = np.zeros(n_outcomes, dtype=np.int64)
+    market_of_outcome[outcome] = market
+    with np.errstate(invalid='ignore', divide='ignore'):
+        weight_sum = np.bincount(outcome, weight, n_outcomes)
+        consensus = {}
+        for name, probs in (('proportional', proportional), ('shin', shin)):
+            mean = np.bincount(outcome, weight * probs, n_outcomes) / weight_sum
+            consensus[name] = mean / np.bincount(market_of_outcome, np.nan_to_num(mean))[market_of_outcome]
+        books = np.bincount(outcome, complete, n_outcomes)
+        overround = np.bincount(outcome, (total[book] - 1) * complete, n_outcomes) / books
+        mean_implied = np.bincount(outcome, implied * complete, n_outcomes) / books
+
+    # Best price per outcome: last row of each outcome once sorted by (outcome, price)
+    order = np.lexsort((price, outcome))
+    best = order[np.r_[outcome[order][1:] != outcome[order][:-1], True]]
+
+    prob = consensus['shin' if method == 'shin' else 'proportional']
+    result = df.iloc[best][MARKET_KEY + ['outcome_name']].reset_index(drop=True)
+    result['books'] = books.astype(int)
+    result['overround'] = overround
+    result['implied'] = mean_implied
+    result['prob_proportional'] = consensus['proportional']
+    result['prob_shin'] = consensus['shin']
+    result['prob'] = prob
+    with np.errstate(divide='ignore'):
+        result['fair_price'] = 1 / prob
+    result['best_price'] = price[best]
+    result['best_bookmaker'] = df['bookmaker'].to_numpy()[best]
+    result['ev'] = price[best] * prob - 1.0
+    return result[COLUMNS]
+
+class FairPriceEngine:
+    """Fair prices from the current_odds snapshot, recomputed only for events whose prices changed"""
+
+    def __init__(self, max_age=FAIR_MAX_AGE, method=FAIR_METHOD):
+        self.max_age_ms = max_age * 1000
+        self.method = method
+        self.results = pd.DataFrame(columns=COLUMNS)
+        self.signatures = {}   # (home, away, commence) -> (rows, max ts, sum ts)
+        self.lock = threading.Lock()
+        self.stats = {'refreshes': 0, 'events_recomputed': 0, 'events_cached': 0,
+                      'rows_computed': 0, 'last_duration': None}
+
+    def refresh(self):
+        """Bring the cached results up to date with the snapshot; returns them"""
+        start_time = time.time()
+        df = get_current_odds(now_ms() - self.max_age_ms,
+                              ', '.join(MARKET_KEY + ['bookmaker', 'outcome_name', 'price', 'ts']))
+        df = df[df['market'].isin(FAIR_MARKETS)]
+        signatures = {}
+        if not df.empty:
+            grouped = df.groupby(EVENT_KEY, observed=True, sort=False)['ts'].agg(['size', 'max', 'sum'])
+            signatures = dict(zip(grouped.index, zip(grouped['size'], grouped['max'], grouped['sum'])))
+
+        with self.lock:
+            changed = [key for key, signature in signatures.items() if self.signatures.get(key) != signature]
+            results = self.results
+            if not results.empty:
+                events = pd.MultiIndex.from_frame(results[EVENT_KEY])
+                results = results[events.isin(list(signatures)) & ~events.isin(changed)]
+            if changed:
+                rows = df[pd.MultiIndex.from_frame(df[EVENT_KEY]).isin(changed)]
+                fresh = compute_fair_prices(rows, self.method)
+                results = pd.concat([results, fresh], ignore_index=True) if not results.empty else fresh
+                self.stats['rows_computed'] += len(rows)
+            self.results = results
+            self.signatures = signatures
+            self.stats['refreshes'] += 1
+            self.stats['events_recomputed'] += len(changed)
+            self.stats['events_cached'] += len(signatures) - len(changed)
+            self.stats['last_duration'] = time.time() - start_time
+        return results
+
+    def table(self):
+        """Fair prices for every live (event, market, outcome)"""
+        try:
+            return self.refresh()
+        except Exception as e:
+            logger.error(f"Error computing fair prices: {e}")
+            return pd.DataFrame(columns=COLUMNS)
+
+    def event_probabilities(self, market='h2h'):
+        """Consensus probability per side for each event: {(home, away, commence): {'home': p, ...}}"""
+        table = self.table()
+        table = table[(table['market'] == market) & table['prob'].notna()]
+        probabilities = {}
+        for home_team, away_team, commence_time, outcome, prob in table[
+                EVENT_KEY + ['outcome_name', 'prob']].itertuples(index=False, name=None):
+            probabilities.setdefault((home_team, away_team, commence_time), {})[
+                outcome_side(outcome, home_team, away_team)] = float(prob)
+        return probabilities
+
+    def get_stats(self):
+        """Cache size and work done"""
+        with self.lock:
+            return dict(self.stats, events=len(self.signatures), outcomes=len(self.results), method=self.method)
+
+def _max_ev(events):
+    """Live feature: best expected value over the event's outcomes at current prices"""
+    best = fair_price_engine.table().groupby(EVENT_KEY, observed=True)['ev'].max()
+    if best.empty:
+        return pd.Series(np.nan, index=events.index)
+    return pd.Series(best.reindex(pd.MultiIndex.from_frame(events[EVENT_KEY])).to_numpy(), index=events.index)
+
+def _describe_positive_ev(events, buy):
+    """Reasons of the positive_ev strategy"""
+    ev = events['max_ev'].map('{:+.1%}'.format)
+    return np.where(buy, 'Expected value ' + ev + ' at the best price',
+                    'Expected value ' + ev + f" below {FAIR_MIN_EV:.1%}")
+
+# Global instance
+fair_price_engine = FairPriceEngine()
+
+register_runtime_metrics('fair_price', fair_price_engine.get_stats)
+
+register_feature('max_ev', _max_ev)
+# positive_ev: some outcome's best price beats its consensus fair price by FAIR_MIN_EV
+register_strategy('positive_ev', ['max_ev'], lambda f: f['max_ev'] > FAIR_MIN_EV,
+                  describe=_describe_positive_ev)
@@ -0,0 +1,346 @@
+"""
+HTTP Client - Resilient access to The Odds API
+
+Every API request goes through `odds_http`, which adds:
+    - keep-alive connection pooling (one `requests.Session` per process)
+    - retries with exponential backoff and full jitter, honoring Retry-After
+      on 429/503, within a per-call time budget
+    - a circuit breaker per endpoint (odds, event_odds, events, ...): after
+      HTTP_BREAKER_THRESHOLD consecutive failures calls fail fast until
+      HTTP_BREAKER_RESET seconds pass, then one trial request decides
+    - read timeouts derived from the p99 of observed latencies, seeded from
+      the `api_latency` history that record_api_latency persists
+
+Usage:
+    data = odds_http.get(url, params, lambda response: response.json())
+    data = await odds_http.get_async(session, url, params, parse_async)
+
+`parse` consumes the response body inside the attempt, so a body that fails
+mid-stream is retried like any other transient error.
+"""
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+from collections import deque
+from contextlib import nullcontext
+from email.utils import parsedate_to_datetime
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+from app.cache import endpoint_for
+from app.poll_scheduler import quota_tracker
+from app.performance_tracker import get_module_metrics, register_runtime_metrics
+
+logger = logging.getLogger(__name__)
+
+HTTP_MAX_RETRIES = int(os.getenv('HTTP_MAX_RETRIES', 3))
+HTTP_RETRY_BUDGET = float(os.getenv('HTTP_RETRY_BUDGET', 30))      # seconds per call, retries included
+HTTP_BACKOFF_BASE = float(os.getenv('HTTP_BACKOFF_BASE', 0.5))
+HTTP_BACKOFF_MAX = float(os.getenv('HTTP_BACKOFF_MAX', 10))
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', 10))
+BREAKER_THRESHOLD = int(os.getenv('HTTP_BREAKER_THRESHOLD', 5))     # consecutive failed attempts
+BREAKER_RESET_SECONDS = float(os.getenv('HTTP_BREAKER_RESET', 60))
+
+# Read timeout = p99 latency x TIMEOUT_MULTIPLIER, clamped; DEFAULT_TIMEOUT until
+# LATENCY_MIN_SAMPLES latencies have been seen
+DEFAULT_TIMEOUT = 10.0
+CONNECT_TIMEOUT = 3.05
+TIMEOUT_MIN = float(os.getenv('HTTP_TIMEOUT_MIN', 2))
+TIMEOUT_MAX = float(os.getenv('HTTP_TIMEOUT_MAX', 30))
+TIMEOUT_MULTIPLIER = 3.0
+LATENCY_WINDOW = 200
+LATENCY_MIN_SAMPLES = 20
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+RETRYABLE_ERRORS = (requests.exceptions.Timeout, requests.exceptions.ConnectionError,
+                    requests.exceptions.ChunkedEncodingError)
+RETRYABLE_ERRORS_ASYNC = (asyncio.TimeoutError, aiohttp.ClientConnectionError, aiohttp.ClientPayloadError)
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Raised without sending a request while an endpoint's breaker is open"""
+
+def retry_after_seconds(headers):
+    """Seconds requested by a Retry-After header (delta-seconds or HTTP date), or None"""
+    value = (headers or {}).get('Retry-After')
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def describe_error(error, status=None):
+    """Short description of a failed attempt (never the URL, which carries the API key)"""
+    if status is not None:
+        return f"HTTP {status}"
+    if isinstance(error, (requests.exceptions.Timeout, asyncio.TimeoutError)):
+        return "timeout"
+    return type(error).__name__
+
+def backoff_delay(attempt):
+    """Exponential backoff with full jitter"""
+    return random.uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * 2 ** attempt))
+
+def percentile(values, q):
+    """Nearest-rank percentile of a non-empty sequence"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+class CircuitBreaker:
+    """closed -> open after `threshold` consecutive failures -> half_open after the cooldown"""
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, reset_seconds=BREAKER_RESET_SECONDS):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.lock = threading.Lock()
+        self.state = 'closed'
+        self.failures = 0
+        self.open_until = 0.0
+        self.trial_in_flight = False
+        self.opened = 0
+
+    def allow(self):
+        """Whether a request may be sent now (half_open lets exactly one through)"""
+        with self.lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.time() >= self.open_until:
+                self.state = 'half_open'
+                self.trial_in_flight = False
+            if self.state == 'half_open' and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        """The endpoint answered; close the breaker"""
+        with self.lock:
+            if self.state != 'closed':
+                logger.info("Circuit closed after successful trial request")
+            self.state = 'closed'
+            self.failures = 0
+            self.trial_in_flight = False
+
+    def record_failure(self, open_for=None):
+        """A failed attempt; opens the breaker at the threshold, on a failed trial,
+        or for `open_for` seconds when the server asked us to back off"""
+        with self.lock:
+            self.failures += 1
+            self.trial_in_flight = False
+            if self.state == 'half_open' or self.failures >= self.threshold or open_for is not None:
+                if self.state != 'open':
+                    self.opened += 1
+                self.state = 'open'
+                self.open_until = time.time() + (open_for if open_for is not None else self.reset_seconds)
+                return True
+            return False
+
+    def snapshot(self):
+        """State for metrics"""
+        with self.lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.failures,
+                'opened': self.opened,
+                'open_for': max(0.0, self.open_until - time.time()) if self.state == 'open' else 0.0,
+            }
+
+class OddsHTTPClient:
+    """Pooled, retrying, circuit-broken GETs with adaptive timeouts"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local_session = None
+        self.session_pid = None
+        self.breakers = {}
+        self.latencies = {}
+        self.seed = deque(maxlen=LATENCY_WINDOW)
+        self.stats = {}
+        self.seeded = False
+
+    def session(self):
+        """Keep-alive session for this process (recreated after fork)"""
+        if self.local_session is None or self.session_pid != os.getpid():
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE, max_retries=0)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            self.local_session = session
+            self.session_pid = os.getpid()
+        return self.local_session
+
+    def _endpoint(self, endpoint):
+        """Breaker and counters for an endpoint, created on first use"""
+        with self.lock:
+            if endpoint not in self.breakers:
+                self.breakers[endpoint] = CircuitBreaker()
+                self.latencies[endpoint] = deque(maxlen=LATENCY_WINDOW)
+                self.stats[endpoint] = {'requests': 0, 'attempts': 0, 'retries': 0, 'failures': 0,
+                                        'rate_limited': 0, 'timeouts': 0, 'short_circuited': 0}
+            return self.breakers[endpoint]
+
+    def _count(self, endpoint, name, value=1):
+        with self.lock:
+            self.stats[endpoint][name] += value
+
+    def _seed_latencies(self):
+        """Start from the API latencies recorded by earlier runs"""
+        self.seeded = True
+        metrics = get_module_metrics('collector') or {}
+        self.seed.extend(latency for latency in metrics.get('api_latency', []) if latency)
+
+    def observe(self, endpoint, latency):
+        """Record the latency of a successful attempt"""
+        with self.lock:
+            self.latencies[endpoint].append(latency)
+
+    def timeout_for(self, endpoint):
+        """Read timeout from the endpoint's p99 latency (or the recorded history)"""
+        if not self.seeded:
+            self._seed_latencies()
+        with self.lock:
+            samples = self.latencies.get(endpoint)
+            if not samples or len(samples) < LATENCY_MIN_SAMPLES:
+                samples = self.seed
+            if len(samples) < LATENCY_MIN_SAMPLES:
+                return DEFAULT_TIMEOUT
+            p99 = percentile(samples, 0.99)
+        return min(max(p99 * TIMEOUT_MULTIPLIER, TIMEOUT_MIN), TIMEOUT_MAX)
+
+    def _after_failure(self, endpoint, breaker, attempt, deadline, error, status, headers, retryable):
+        """Account for a failed attempt; returns the delay before retrying, or None to give up"""
+        if status is not None and status < 500 and status != 429:
+            # The endpoint is healthy, the request was refused (bad key, quota, unknown sport)
+            breaker.record_success()
+            self._count(endpoint, 'failures')
+            return None
+
+        if status == 429:
+            self._count(endpoint, 'rate_limited')
+        elif status is None and isinstance(error, (requests.exceptions.Timeout, asyncio.TimeoutError)):
+            self._count(endpoint, 'timeouts')
+
+        reason = describe_error(error, status)
+        retry_after = retry_after_seconds(headers) if status in (429, 503) else None
+        delay = retry_after if retry_after is not None else backoff_delay(attempt)
+        give_up = not retryable or attempt >= HTTP_MAX_RETRIES or time.time() + delay > deadline
+        if breaker.record_failure(open_for=retry_after if give_up else None):
+            logger.warning(f"Circuit open for {endpoint} endpoint after {reason}")
+            give_up = True
+        if give_up:
+            self._count(endpoint, 'failures')
+            return None
+
+        self._count(endpoint, 'retries')
+        logger.info(f"Retrying {endpoint} request in {delay:.1f}s ({reason})")
+        return delay
+
+    def _check_breaker(self, endpoint, breaker):
+        """Fail fast while the endpoint's breaker is open"""
+        if not breaker.allow():
+            self._count(endpoint, 'short_circuited')
+            raise CircuitOpenError(f"Circuit open for {endpoint} endpoint")
+        self._count(endpoint, 'attempts')
+
+    def get(self, url, params, parse, endpoint=None):
+        """GET with retries; returns `parse(response)` for a successful response"""
+        endpoint = endpoint or endpoint_for(url)
+        breaker = self._endpoint(endpoint)
+        self._count(endpoint, 'requests')
+        deadline = time.time() + HTTP_RETRY_BUDGET
+        attempt = 0
+        while True:
+            self._check_breaker(endpoint, breaker)
+            timeout = self.timeout_for(endpoint)
+            start_time = time.time()
+            try:
+                with self.session().get(url, params=params, timeout=(CONNECT_TIMEOUT, timeout),
+                                        stream=True) as response:
+                    quota_tracker.update(response.headers)
+                    response.raise_for_status()
+                    result = parse(response)
+            except requests.exceptions.RequestException as e:
+                response = getattr(e, 'response', None)
+                status = response.status_code if response is not None else None
+                retryable = status in RETRY_STATUSES or isinstance(e, RETRYABLE_ERRORS)
+                delay = self._after_failure(endpoint, breaker, attempt, deadline, e, status,
+                                            response.headers if response is not None else None, retryable)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                continue
+            except Exception as e:
+                self._after_failure(endpoint, breaker, attempt, deadline, e, None, None, False)
+                raise
+
+            breaker.record_success()
+            self.observe(endpoint, time.time() - start_time)
+            return result
+
+    async def get_async(self, session, url, params, parse, endpoint=None, semaphore=None):
+        """Async variant of get over an aiohttp session; `parse` is a coroutine function
+
+        The semaphore (if any) is held per attempt, not while backing off.
+        """
+        endpoint = endpoint or endpoint_for(url)
+        breaker = self._endpoint(endpoint)
+        self._count(endpoint, 'requests')
+        deadline = time.time() + HTTP_RETRY_BUDGET
+        attempt = 0
+        while True:
+            self._check_breaker(endpoint, breaker)
+            timeout = aiohttp.ClientTimeout(total=None, sock_connect=CONNECT_TIMEOUT,
+                                            sock_read=self.timeout_for(endpoint))
+            start_time = time.time()
+            try:
+                async with semaphore or nullcontext():
+                    async with session.get(url, params=params, timeout=timeout) as response:
+                        quota_tracker.update(response.headers)
+                        response.raise_for_status()
+                        result = await parse(response)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                status = e.status if isinstance(e, aiohttp.ClientResponseError) else None
+                headers = e.headers if isinstance(e, aiohttp.ClientResponseError) else None
+                retryable = status in RETRY_STATUSES or isinstance(e, RETRYABLE_ERRORS_ASYNC)
+                delay = self._after_failure(endpoint, breaker, attempt, deadline, e, status, headers, retryable)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            except Exception as e:
+                self._after_failure(endpoint, breaker, attempt, deadline, e, None, None, False)
+                raise
+
+            breaker.record_success()
+            self.observe(endpoint, time.time() - start_time)
+            return result
+
+    def get_stats(self):
+        """Breaker state, retry counters and current timeout per endpoint"""
+        with self.lock:
+            endpoints = list(self.breakers)
+        stats = {}
+        for endpoint in endpoints:
+            with self.lock:
+                entry = dict(self.stats[endpoint])
+                samples = list(self.latencies[endpoint])
+            entry.update(self.breakers[endpoint].snapshot())
+            entry['timeout'] = self.timeout_for(endpoint)
+            entry['p99_latency'] = percentile(samples, 0.99) if samples else None
+            entry['latency_samples'] = len(samples)
+            stats[endpoint] = entry
+        return stats
+
+# Global instance
+odds_http = OddsHTTPClient()
+
+register_runtime_metrics('http_client', odds_http.get_stats)
@@ -0,0 +1,369 @@
+"""
+Ingest - Bulk loader for historical odds files (CSV or JSON Lines)
+
+Files are streamed in chunks of records, validated and normalized with
+vectorized pandas/NumPy (optionally in a pool of worker processes), and
+written through the shared writer in one large transaction per chunk, with
+bulk-load PRAGMAs and the price range indexes dropped until the end of the
+run. Each chunk commits its checkpoint in `ingest_progress` in the same
+transaction as its rows, so an interrupted import resumes exactly where it
+stopped. The price row ids each chunk inserted are recorded in
+`ingest_batches`; when a file changed or `--restart` is given, its earlier
+rows are deleted in the transaction that resets its checkpoint, so a
+reimport replaces them instead of duplicating them (rows already compacted
+into `odds_bars`, or imported before the ids were recorded, are kept).
+
+Accepted records (one per line, no embedded newlines):
+    - wide rows with the `odds` columns: sport_key, sport_title, home_team,
+      away_team, commence_time, bookmaker, market, outcome_name, price and
+      `ts` (epoch ms) or `timestamp`
+    - JSON Lines of API-shaped events (with `bookmakers`), stamped with the
+      event's `timestamp` (historical snapshots) or `last_update`
+
+Usage:
+    python -m app.ingest data/history/*.csv --chunk-size 100000 --workers 4
+    python -m app.ingest odds-2025.jsonl.gz --restart
+"""
+import os
+import io
+import gzip
+import json
+import time
+import argparse
+import logging
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from app import schema
+from app.db import get_db
+from app.odds_batch import OddsBatch, EVENT_COLUMNS, ROW_COLUMNS, EVENT_DEFAULTS
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = int(os.getenv('INGEST_CHUNK_SIZE', 100000))  # records per transaction
+WORKERS = int(os.getenv('INGEST_WORKERS', 1))
+
+# Applied to the writer connection for the duration of an import
+BULK_PRAGMAS = [
+    'PRAGMA synchronous = OFF',          # app crashes stay safe; checkpoints make the run resumable
+    'PRAGMA cache_size = -262144',       # 256 MB page cache
+    'PRAGMA wal_autocheckpoint = 10000',
+]
+RESTORE_PRAGMAS = [
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA cache_size = -32000',
+    'PRAGMA wal_autocheckpoint = 1000',
+]
+
+ODDS_COLUMNS = list(EVENT_COLUMNS + ROW_COLUMNS) + ['price']
+OUTPUT_COLUMNS = ODDS_COLUMNS + ['timestamp', 'ts']
+REQUIRED_COLUMNS = ['home_team', 'away_team', 'commence_time', 'bookmaker', 'outcome_name', 'price']
+COLUMN_DEFAULTS = dict(EVENT_DEFAULTS, market='h2h')
+DEDUP_KEY = ['home_team', 'away_team', 'commence_time', 'bookmaker', 'market', 'outcome_name', 'ts']
+
+EPOCH = pd.Timestamp(0, tz='UTC')
+
+def _open(path):
+    """Open a source file as text (gzip by extension)"""
+    if str(path).endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, 'r', encoding='utf-8', newline='')
+
+def detect_format(path):
+    """'csv' or 'jsonl' from the file name"""
+    name = str(path).lower().removesuffix('.gz')
+    return 'jsonl' if name.endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+
+def read_chunks(path, fmt, chunk_size, skip=0):
+    """Yield (records, header, lines) blocks of raw text, skipping `skip` records"""
+    with _open(path) as f:
+        header = f.readline() if fmt == 'csv' else ''
+        for _ in islice(f, skip):
+            pass
+        while True:
+            lines = list(islice(f, chunk_size))
+            if not lines:
+                return
+            yield len(lines), header, lines
+
+def _to_epoch_ms(values):
+    """Vectorized epoch ms from datetime strings (naive values are UTC); NaN where invalid"""
+    parsed = pd.to_datetime(values, utc=True, errors='coerce', format='mixed')
+    return (parsed - EPOCH) / pd.Timedelta(milliseconds=1)
+
+def _flatten_events(events):
+    """Wide rows for API-shaped events, stamped with each event's snapshot time"""
+    batch = OddsBatch.from_events(events)
+    frame = pd.DataFrame({name: batch.column(name) for name in ODDS_COLUMNS})
+    snapshot = np.asarray([event.get('timestamp') or event.get('last_update') for event in events], dtype=object)
+    frame['timestamp'] = snapshot[batch.event_index] if len(batch) else []
+    return frame
+
+def _decode(fmt, header, lines):
+    """Raw text block to a DataFrame of strings"""
+    if fmt == 'csv':
+        return pd.read_csv(io.StringIO(header + ''.join(lines)), dtype=str, keep_default_na=False)
+
+    records, events = [], []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            records.append({})  # counted as rejected
+            continue
+        (events if isinstance(record, dict) and 'bookmakers' in record else records).append(record)
+
+    frames = []
+    if records:
+        frames.append(pd.DataFrame.from_records([r if isinstance(r, dict) else {} for r in records]))
+    if events:
+        frames.append(_flatten_events(events))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+def normalize_frame(frame):
+    """Validate and normalize raw rows; returns (rows in OUTPUT_COLUMNS, rejected count)"""
+    total = len(frame)
+    if not total:
+        return pd.DataFrame(columns=OUTPUT_COLUMNS), 0
+
+    missing = [name for name in REQUIRED_COLUMNS if name not in frame.columns]
+    if missing or ('ts' not in frame.columns and 'timestamp' not in frame.columns):
+        raise ValueError(f"missing columns: {', '.join(missing) or 'ts/timestamp'}")
+
+    out = pd.DataFrame(index=frame.index)
+    for name in EVENT_COLUMNS + ROW_COLUMNS:
+        values = frame[name] if name in frame.columns else pd.Series('', index=frame.index)
+        values = values.astype('string').fillna('').str.strip()
+        if name in COLUMN_DEFAULTS:
+            values = values.mask(values == '', COLUMN_DEFAULTS[name])
+        out[name] = values
+
+    out['price'] = pd.to_numeric(frame['price'], errors='coerce')
+
+    ts = pd.to_numeric(frame['ts'], errors='coerce') if 'ts' in frame.columns else None
+    if 'timestamp' in frame.columns:
+        parsed = _to_epoch_ms(frame['timestamp'].astype('string'))
+        ts = parsed if ts is None else ts.fillna(parsed)
+    out['ts'] = ts
+
+    # Kickoffs in the API format so imported rows join live ones on the event key
+    kickoff = pd.to_datetime(out['commence_time'], utc=True, errors='coerce', format='mixed')
+    out['commence_time'] = kickoff.dt.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+    valid = (
+        np.isfinite(out['price'].to_numpy(dtype=float, na_value=np.nan)) & (out['price'] > 1.0)
+        & out['ts'].notna() & (out['ts'] > 0)
+        & out['commence_time'].notna()
+    )
+    for name in ('home_team', 'away_team', 'bookmaker', 'outcome_name'):
+        valid &= out[name] != ''
+    out = out[valid.fillna(False).astype(bool)]
+
+    out['ts'] = out['ts'].astype('int64')
+    out = out.drop_duplicates(DEDUP_KEY)
+    out['timestamp'] = pd.to_datetime(out['ts'], unit='ms').dt.strftime('%Y-%m-%d %H:%M:%S')
+    return out[OUTPUT_COLUMNS], total - len(out)
+
+def parse_chunk(fmt, header, lines):
+    """Worker entry point: raw block to (normalized rows, rejected count)"""
+    frame = _decode(fmt, header, lines)
+    return normalize_frame(frame)
+
+def _row_tuples(rows):
+    """Plain Python tuples for sqlite3 (NumPy scalars are not bindable)"""
+    return zip(*(rows[name].tolist() for name in OUTPUT_COLUMNS))
+
+# ---------------------------------------------------------------------------
+# Writer jobs
+# ---------------------------------------------------------------------------
+
+def _apply_pragmas(conn, pragmas):
+    """Writer job (no transaction)"""
+    for pragma in pragmas:
+        conn.execute(pragma)
+
+def _drop_indexes(conn):
+    """Writer job: drop range indexes for the duration of the load"""
+    schema.drop_price_indexes(conn.cursor())
+
+def _rebuild_indexes(conn):
+    """Writer job: rebuild range indexes and refresh planner statistics"""
+    cursor = conn.cursor()
+    schema.create_price_indexes(cursor)
+    cursor.execute('ANALYZE')
+
+def _checkpoint(conn):
+    """Writer job (no transaction): fold the WAL back into the database"""
+    return conn.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchone()
+
+def _load_progress(conn, path, size, mtime, restart):
+    """Writer job: checkpoint for a file, reset (with its rows deleted) when the file changed or on restart"""
+    row = conn.execute('''
+        SELECT size, mtime, records_done, rows_written, rows_rejected, status
+        FROM ingest_progress WHERE path = ?
+    ''', (path,)).fetchone()
+    if row and not restart and row[0] == size and row[1] == mtime:
+        return {'records_done': row[2], 'rows_written': row[3], 'rows_rejected': row[4], 'status': row[5]}
+
+    if row and not restart:
+        logger.warning(f"{path} changed since it was last imported; starting over")
+    if row:
+        deleted = _delete_file_rows(conn, path)
+        logger.info(f"Deleted {deleted} rows from the previous import of {path}")
+    now = schema.now_ms()
+    conn.execute('''
+        INSERT OR REPLACE INTO ingest_progress
+        (path, size, mtime, records_done, rows_written, rows_rejected, status, started_ms, updated_ms)
+        VALUES (?, ?, ?, 0, 0, 0, 'running', ?, ?)
+    ''', (path, size, mtime, now, now))
+    return {'records_done': 0, 'rows_written': 0, 'rows_rejected': 0, 'status': 'running'}
+
+def _delete_file_rows(conn, path):
+    """Delete the price rows a file's chunks inserted (part of the checkpoint reset)"""
+    table = schema.price_table(conn.cursor())
+    deleted = 0
+    batches = conn.execute('SELECT first_id, last_id FROM ingest_batches WHERE path = ?', (path,)).fetchall()
+    for first_id, last_id in batches:
+        deleted += conn.execute(f'DELETE FROM {table} WHERE id BETWEEN ? AND ?', (first_id, last_id)).rowcount
+    conn.execute('DELETE FROM ingest_batches WHERE path = ?', (path,))
+    return deleted
+
+def _last_id(cursor, table):
+    """Highest price row id (ids only grow: the price tables use AUTOINCREMENT)"""
+    return cursor.execute(f'SELECT MAX(id) FROM {table}').fetchone()[0] or 0
+
+def _write_chunk(conn, path, records, rows, rejected):
+    """Writer job: insert one chunk, record its row ids and advance the file checkpoint atomically"""
+    cursor = conn.cursor()
+    table = schema.price_table(cursor)
+    first_id = _last_id(cursor, table) + 1
+    schema.insert_history_rows(cursor, _row_tuples(rows))
+    last_id = _last_id(cursor, table)
+    if last_id >= first_id:
+        cursor.execute('INSERT INTO ingest_batches (path, first_id, last_id) VALUES (?, ?, ?)',
+                       (path, first_id, last_id))
+    cursor.execute('''
+        UPDATE ingest_progress
+        SET records_done = records_done + ?, rows_written = rows_written + ?,
+            rows_rejected = rows_rejected + ?, updated_ms = ?
+        WHERE path = ?
+    ''', (records, len(rows), rejected, schema.now_ms(), path))
+
+def _finish_file(conn, path):
+    """Writer job: mark a file as fully imported"""
+    conn.execute("UPDATE ingest_progress SET status = 'done', updated_ms = ? WHERE path = ?",
+                 (schema.now_ms(), path))
+
+# ---------------------------------------------------------------------------
+# Driver
+# ---------------------------------------------------------------------------
+
+def _parsed_chunks(blocks, fmt, executor, window):
+    """Parse blocks in order, keeping at most `window` in flight in the pool"""
+    if executor is None:
+        for records, header, lines in blocks:
+            yield (records,) + parse_chunk(fmt, header, lines)
+        return
+
+    pending = []
+    for records, header, lines in blocks:
+        pending.append((records, executor.submit(parse_chunk, fmt, header, lines)))
+        if len(pending) >= window:
+            records, future = pending.pop(0)
+            yield (records,) + future.result()
+    for records, future in pending:
+        yield (records,) + future.result()
+
+def ingest_file(path, fmt=None, chunk_size=CHUNK_SIZE, executor=None, window=2, restart=False):
+    """Import one file, resuming from its checkpoint; returns a summary dict"""
+    db = get_db()
+    path = str(Path(path).resolve())
+    fmt = fmt or detect_format(path)
+    stat = os.stat(path)
+
+    progress = db.write(_load_progress, path, stat.st_size, stat.st_mtime, restart)
+    if progress['status'] == 'done':
+        logger.info(f"Skipping {path}: already imported ({progress['rows_written']} rows)")
+        return dict(progress, path=path, rows=0, rejected=0, seconds=0.0, skipped=True)
+    if progress['records_done']:
+        logger.info(f"Resuming {path} after {progress['records_done']} records")
+
+    start_time = time.time()
+    rows_written = rejected_total = 0
+    blocks = read_chunks(path, fmt, chunk_size, skip=progress['records_done'])
+    for records, rows, rejected in _parsed_chunks(blocks, fmt, executor, window):
+        db.write(_write_chunk, path, records, rows, rejected)
+        rows_written += len(rows)
+        rejected_total += rejected
+        elapsed = time.time() - start_time
+        logger.info(f"{os.path.basename(path)}: {rows_written} rows ({rejected_total} rejected), "
+                    f"{rows_written / elapsed if elapsed else 0:,.0f} rows/s")
+
+    db.write(_finish_file, path)
+    seconds = time.time() - start_time
+    return {'path': path, 'rows': rows_written, 'rejected': rejected_total, 'seconds': seconds, 'skipped': False}
+
+def run_ingest(paths, fmt=None, chunk_size=CHUNK_SIZE, workers=WORKERS, restart=False, keep_indexes=False):
+    """Bulk import files; returns totals including rows per second"""
+    db = get_db()
+    start_time = time.time()
+    results = []
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+
+    db.write(_apply_pragmas, BULK_PRAGMAS, transaction=False)
+    if not keep_indexes:
+        db.write(_drop_indexes)
+    try:
+        for path in paths:
+            try:
+                results.append(ingest_file(path, fmt, chunk_size, executor, window=max(workers, 1) * 2,
+                                           restart=restart))
+            except Exception as e:
+                logger.error(f"Error importing {path}: {e}")
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        index_start = time.time()
+        if not keep_indexes:
+            logger.info("Rebuilding indexes...")
+            db.write(_rebuild_indexes)
+        db.write(_apply_pragmas, RESTORE_PRAGMAS, transaction=False)
+        db.write(_checkpoint, transaction=False)
+        index_seconds = time.time() - index_start
+
+    rows = sum(r['rows'] for r in results)
+    seconds = time.time() - start_time
+    summary = {
+        'files': len(results),
+        'rows': rows,
+        'rejected': sum(r['rejected'] for r in results),
+        'seconds': seconds,
+        'index_seconds': index_seconds,
+        'rows_per_second': rows / seconds if seconds else 0.0,
+    }
+    logger.info(f"Ingest complete: {rows} rows from {summary['files']} files in {seconds:.1f}s "
+                f"({summary['rows_per_second']:,.0f} rows/s, {summary['rejected']} rejected, "
+                f"indexes {index_seconds:.1f}s)")
+    return summary
+
+def parse_args(argv=None):
+    """Command line options"""
+    parser = argparse.ArgumentParser(description='Bulk import historical odds files')
+    parser.add_argument('paths', nargs='+', help='CSV or JSON Lines files (optionally .gz)')
+    parser.add_argument('--format', choices=['csv', 'jsonl'], help='override detection by extension')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='records per transaction')
+    parser.add_argument('--workers', type=int, default=WORKERS, help='parser processes (1 = parse in-process)')
+    parser.add_argument('--restart', action='store_true', help='ignore checkpoints and import from the start')
+    parser.add_argument('--keep-indexes', action='store_true',
+                        help='do not drop range indexes (for small imports into a large live database)')
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    args = parse_args()
+    run_ingest(args.paths, args.format, args.chunk_size, args.workers, args.restart, args.keep_indexes)
@@ -0,0 +1,290 @@
+"""
+Odds Batch - Compact columnar representation of fetched odds
+
+An API response is flattened in one streaming pass into NumPy arrays: prices
+are float64 and every string column (sport, teams, kickoff, bookmaker,
+market, outcome) is stored as int32 codes into one shared dictionary of
+interned strings. Event-level columns are stored once per event rather than
+once per price, and the full JSON tree of a response is never held in memory.
+"""
+import json
+import codecs
+import logging
+from array import array
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+EVENT_COLUMNS = ('sport_key', 'sport_title', 'home_team', 'away_team', 'commence_time')
+ROW_COLUMNS = ('bookmaker', 'market', 'outcome_name')
+COLUMNS = EVENT_COLUMNS + ROW_COLUMNS + ('price',)
+# Carried alongside the odds row for the current_odds snapshot, not stored in history
+EXTRA_EVENT_COLUMNS = ('event_id',)    # the API's event id
+EXTRA_ROW_COLUMNS = ('last_update',)   # the bookmaker's last_update
+
+EVENT_DEFAULTS = {'sport_key': 'soccer', 'sport_title': 'Soccer'}
+STREAM_CHUNK_SIZE = 64 * 1024
+
+class OddsBatch:
+    """Columnar odds rows: one row per (event, bookmaker, market, outcome) price"""
+
+    def __init__(self, strings, event_codes, event_index, row_codes, price):
+        self.strings = strings            # shared string dictionary
+        self.event_codes = event_codes    # column -> int32[n_events]
+        self.event_index = event_index    # int32[n_rows], row -> event
+        self.row_codes = row_codes        # column -> int32[n_rows]
+        self.price = price                # float64[n_rows]
+
+    def __len__(self):
+        return len(self.price)
+
+    @property
+    def n_events(self):
+        """Number of events in the batch (including events without prices)"""
+        return len(self.event_codes['sport_key'])
+
+    @property
+    def nbytes(self):
+        """Size of the array data in bytes"""
+        arrays = list(self.event_codes.values()) + list(self.row_codes.values()) + [self.event_index, self.price]
+        return sum(a.nbytes for a in arrays)
+
+    def _decoded(self, codes):
+        """Decode an array of string codes"""
+        return np.asarray(self.strings, dtype=object)[codes]
+
+    def codes(self, name):
+        """Per-row string codes of a column"""
+        if name in self.event_codes:
+            return self.event_codes[name][self.event_index]
+        return self.row_codes[name]
+
+    def has_column(self, name):
+        """Whether the batch carries a column (batches spooled by older versions lack the extras)"""
+        return name == 'price' or name in self.event_codes or name in self.row_codes
+
+    def column(self, name):
+        """Per-row values of a column (empty strings for a missing extra column)"""
+        if name == 'price':
+            return self.price
+        if not self.has_column(name):
+            return np.full(len(self.price), '', dtype=object)
+        return self._decoded(self.codes(name))
+
+    def event_values(self, name):
+        """Per-event values of an event-level column"""
+        return self._decoded(self.event_codes[name]).tolist()
+
+    def rows(self):
+        """Iterate wide-format row tuples (see schema.insert_odds_rows)"""
+        columns = [self.column(name) for name in EVENT_COLUMNS + ROW_COLUMNS]
+        return zip(*columns, self.price.tolist())
+
+    def to_dataframe(self):
+        """DataFrame with categorical string columns sharing the batch dictionary"""
+        categories = pd.Index(self.strings, dtype=object)
+        data = {name: pd.Categorical.from_codes(self.codes(name), categories=categories)
+                for name in EVENT_COLUMNS + ROW_COLUMNS}
+        data['price'] = self.price
+        return pd.DataFrame(data)
+
+    @classmethod
+    def from_events(cls, events):
+        """Build a batch from already decoded event dicts"""
+        builder = OddsBatchBuilder()
+        for event in events or []:
+            builder.add_event(event)
+        return builder.build()
+
+    @classmethod
+    def concat(cls, batches):
+        """Merge batches, re-encoding their codes into one dictionary"""
+        batches = [batch for batch in batches if batch is not None]
+        if len(batches) == 1:
+            return batches[0]
+
+        strings = []
+        index = {}
+        event_codes = {name: [] for name in EVENT_COLUMNS + EXTRA_EVENT_COLUMNS}
+        row_codes = {name: [] for name in ROW_COLUMNS + EXTRA_ROW_COLUMNS}
+        event_index = []
+        prices = []
+        offset = 0
+
+        def intern(value):
+            code = index.get(value)
+            if code is None:
+                code = index[value] = len(strings)
+                strings.append(value)
+            return code
+
+        for batch in batches:
+            remap = np.empty(len(batch.strings), dtype=np.int32)
+            for i, value in enumerate(batch.strings):
+                remap[i] = intern(value)
+            for name in event_codes:
+                if name in batch.event_codes:
+                    event_codes[name].append(remap[batch.event_codes[name]])
+                else:
+                    event_codes[name].append(np.full(batch.n_events, intern(''), dtype=np.int32))
+            for name in row_codes:
+                if name in batch.row_codes:
+                    row_codes[name].append(remap[batch.row_codes[name]])
+                else:
+                    row_codes[name].append(np.full(len(batch), intern(''), dtype=np.int32))
+            event_index.append(batch.event_index + offset)
+            prices.append(batch.price)
+            offset += batch.n_events
+
+        def join(parts, dtype):
+            return np.concatenate(parts).astype(dtype, copy=False) if parts else np.empty(0, dtype=dtype)
+
+        return cls(
+            strings,
+            {name: join(parts, np.int32) for name, parts in event_codes.items()},
+            join(event_index, np.int32),
+            {name: join(parts, np.int32) for name, parts in row_codes.items()},
+            join(prices, np.float64)
+        )
+
+class OddsBatchBuilder:
+    """Flattens event dicts into an OddsBatch one event at a time"""
+
+    def __init__(self):
+        self.strings = []
+        self.index = {}
+        self.event_codes = {name: array('i') for name in EVENT_COLUMNS + EXTRA_EVENT_COLUMNS}
+        self.row_codes = {name: array('i') for name in ROW_COLUMNS + EXTRA_ROW_COLUMNS}
+        self.event_index = array('i')
+        self.price = array('d')
+
+    def intern(self, value):
+        """Dictionary code for a string"""
+        value = '' if value is None else str(value)
+        code = self.index.get(value)
+        if code is None:
+            code = self.index[value] = len(self.strings)
+            self.strings.append(value)
+        return code
+
+    def add_event(self, event):
+        """Flatten one API event into the columns"""
+        event_number = len(self.event_codes['sport_key'])
+        for name in EVENT_COLUMNS:
+            self.event_codes[name].append(self.intern(event.get(name, EVENT_DEFAULTS.get(name, ''))))
+        self.event_codes['event_id'].append(self.intern(event.get('id', '')))
+
+        bookmaker_column = self.row_codes['bookmaker']
+        market_column = self.row_codes['market']
+        outcome_column = self.row_codes['outcome_name']
+        last_update_column = self.row_codes['last_update']
+        for bookmaker in event.get('bookmakers', []):
+            bookmaker_code = self.intern(bookmaker.get('key', ''))
+            last_update_code = self.intern(bookmaker.get('last_update', ''))
+            for market in bookmaker.get('markets', []):
+                market_code = self.intern(market.get('key', ''))
+                for outcome in market.get('outcomes', []):
+                    price = outcome.get('price', 0.0)
+                    bookmaker_column.append(bookmaker_code)
+                    market_column.append(market_code)
+                    last_update_column.append(last_update_code)
+                    outcome_column.append(self.intern(outcome.get('name', '')))
+                    self.event_index.append(event_number)
+                    self.price.append(float(price) if price is not None else np.nan)
+
+    def build(self):
+        """Freeze the columns into NumPy arrays"""
+        return OddsBatch(
+            self.strings,
+            {name: np.frombuffer(column, dtype=np.intc).astype(np.int32) for name, column in self.event_codes.items()},
+            np.frombuffer(self.event_index, dtype=np.intc).astype(np.int32),
+            {name: np.frombuffer(column, dtype=np.intc).astype(np.int32) for name, column in self.row_codes.items()},
+            np.frombuffer(self.price, dtype=np.float64).copy()
+        )
+
+class EventStreamParser:
+    """Incrementally decodes events from a JSON array (or a single event object)
+
+    Bytes are fed as they arrive; each complete top-level element is decoded
+    with `raw_decode` and handed back, so only one event is materialized at a
+    time.
+    """
+
+    def __init__(self):
+        self.decoder = json.JSONDecoder()
+        self.text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = ''
+        self.started = False
+        self.single = False
+        self.done = False
+
+    def feed(self, chunk):
+        """Add bytes and return the events completed by them"""
+        self.buffer += self.text_decoder.decode(chunk)
+        return self._drain()
+
+    def close(self):
+        """Flush remaining input and fail on a truncated document"""
+        self.buffer += self.text_decoder.decode(b'', final=True)
+        events = self._drain()
+        if not self.done and (self.started or self.buffer.strip()):
+            raise ValueError("Truncated JSON odds response")
+        return events
+
+    def _drain(self):
+        buffer = self.buffer
+        position = 0
+        events = []
+        while not self.done:
+            while position < len(buffer) and buffer[position] in ' \t\r\n':
+                position += 1
+            if position >= len(buffer):
+                break
+            char = buffer[position]
+            if not self.started:
+                self.started = True
+                if char == '[':
+                    position += 1
+                    continue
+                if char != '{':
+                    raise ValueError(f"Unexpected JSON odds response starting with {char!r}")
+                self.single = True
+            if not self.single and char == ',':
+                position += 1
+                continue
+            if not self.single and char == ']':
+                position += 1
+                self.done = True
+                break
+            try:
+                event, position = self.decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                break  # element not complete yet
+            events.append(event)
+            if self.single:
+                self.done = True
+        self.buffer = buffer[position:]
+        return events
+
+def parse_odds_stream(chunks):
+    """Build an OddsBatch from an iterable of response byte chunks"""
+    parser = EventStreamParser()
+    builder = OddsBatchBuilder()
+    for chunk in chunks:
+        for event in parser.feed(chunk):
+            builder.add_event(event)
+    for event in parser.close():
+        builder.add_event(event)
+    return builder.build()
+
+async def parse_odds_stream_async(chunks):
+    """Build an OddsBatch from an async iterable of response byte chunks"""
+    parser = EventStreamParser()
+    builder = OddsBatchBuilder()
+    async for chunk in chunks:
+        for event in parser.feed(chunk):
+            builder.add_event(event)
+    for event in parser.close():
+        builder.add_event(event)
+    return builder.build()
@@ -15,6 +15,9 @@ logger = logging.getLogger(__name__)
 PERFORMANCE_FILE = Path('data/performance.json')
 METRICS_HISTORY_SIZE = 100
 
+# Live in-process metrics (name -> callable returning a dict), e.g. DB contention
+_runtime_metrics_sources = {}
+
 def track_performance(module_name):
     """Decorator to track performance of a function"""
     def decorator(func):
@@ -196,6 +199,21 @@ def get_all_metrics():
         logger.error(f"Error getting all metrics: {e}")
         return {}
 
+def register_runtime_metrics(name, provider):
+    """Register a callable exposing live in-process metrics under a name"""
+    _runtime_metrics_sources[name] = provider
+
+def get_runtime_metrics():
+    """Collect live metrics from all registered providers"""
+    runtime_metrics = {}
+    for name, provider in list(_runtime_metrics_sources.items()):
+        try:
+            runtime_metrics[name] = provider()
+        except Exception as e:
+            logger.error(f"Error collecting runtime metrics for {name}: {e}")
+            runtime_metrics[name] = {'error': str(e)}
+    return runtime_metrics
+
 def record_api_latency(module_name, latency):
     """Record API latency for a module"""
     record_metrics(
@@ -0,0 +1,438 @@
+"""
+P&L Backtester - Replays stored odds in time order, stakes strategy bets and settles them
+
+The replay rebuilds, at the end of every PNL_STEP_MINUTES step, the book a
+strategy would have seen live. Like the `current_odds` snapshot the signal
+generator scores, the book holds the latest price of every bookmaker outcome
+stored within the last PNL_QUOTE_MAX_AGE seconds (the live signal window by
+default). Strategy features come from per-outcome mean / std / count / min /
+max over that book, so `value` reads the same spread in the replay as live.
+The odds history is walked day by day, oldest first. Each day is reduced to
+the last price per (bookmaker outcome, step): SQLite does this for the days
+still in the database, and NumPy does it for archive partitions. The book is
+then folded into price moments per (decision point, outcome). The registered
+strategies are evaluated on all (event, step) rows at once.
+
+Each strategy bets once per event, at its first pre-kickoff BUY. It stakes
+PNL_STAKE on the outcome with the highest mean price. The fill is the best
+price in the book at the end of that step, so quotes replaced earlier in the
+step are never filled. Only the PNL_MARKET market is replayed, as it is the
+one results settle. Bets are settled against the `results` table (see
+app/results.py). Bets without a result stay unsettled. Settled bets are
+ordered by kickoff to build the equity curve from PNL_BANKROLL. That curve
+gives ROI (profit / bankroll), yield (profit / staked), maximum drawdown and
+hit rate.
+
+With delta ingestion (ODDS_INGEST_MODE=delta), unchanged prices are stored
+only at keyframes. Keep PNL_QUOTE_MAX_AGE at least ODDS_KEYFRAME_INTERVAL so
+quiet quotes stay in the book. Likewise, with ODDS_SKIP_UNCHANGED (default)
+a bookmaker whose last_update did not move is not written to history again,
+so its last row can be older than the poll interval while still live.
+
+Usage: python -m app.pnl_backtester [--days 365] [--step 60] [--strategies value,high_mean]
+"""
+import os
+import time
+import json
+import argparse
+import logging
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from app.schema import cutoff_ms, now_ms
+from app.db import get_db
+from app.archive import load_manifest, list_partitions, partition_frame
+from app.strategies import EVENT_KEY, required_features, event_features, decide, historical_strategies
+from app.backtester import BACKTEST_STRATEGY, DAY_MS
+from app.signal_generator import SIGNAL_WINDOW_HOURS
+from app.results import load_results
+
+logger = logging.getLogger(__name__)
+
+PNL_DAYS = int(os.getenv('PNL_DAYS', 30))
+PNL_STEP_MINUTES = int(os.getenv('PNL_STEP_MINUTES', 60))   # decision interval of the replay
+PNL_STAKE = float(os.getenv('PNL_STAKE', 10.0))             # flat stake per bet
+PNL_BANKROLL = float(os.getenv('PNL_BANKROLL', 1000.0))     # starting bankroll for ROI and drawdown
+PNL_MARKET = os.getenv('PNL_MARKET', 'h2h')                 # market replayed and settled
+PNL_QUOTE_MAX_AGE = int(os.getenv('PNL_QUOTE_MAX_AGE', SIGNAL_WINDOW_HOURS * 3600))  # seconds a quote stays in the book
+
+PNL_COLUMNS = EVENT_KEY + ['bookmaker', 'market', 'outcome_name', 'price', 'ts']
+QUOTE_KEY = EVENT_KEY + ['outcome_name', 'bookmaker']
+QUOTE_COLUMNS = QUOTE_KEY + ['step', 'price', 'ts']
+STEP_KEY = EVENT_KEY + ['step']
+OUTCOME_SIDES = {'draw': 'draw', 'tie': 'draw'}
+
+def _column_codes(column):
+    """Integer codes of one column and their upper bound (categorical codes are used as they are)"""
+    if isinstance(getattr(column, 'dtype', None), pd.CategoricalDtype):
+        return column.cat.codes.to_numpy(dtype=np.int64) + 1, len(column.cat.categories) + 1
+    codes, uniques = pd.factorize(column, use_na_sentinel=False)
+    return codes, len(uniques)
+
+def _codes(*columns):
+    """Dense integer code per distinct combination of the columns, in order of first appearance"""
+    code, size = _column_codes(columns[0])
+    for column in columns[1:]:
+        other, n = _column_codes(column)
+        if size * n >= 2 ** 62:
+            code, uniques = pd.factorize(code)
+            size = len(uniques)
+        code = code * n + other
+        size *= n
+    return pd.factorize(code)[0]
+
+def _first_rows(code):
+    """Row index of the first appearance of every code"""
+    first = np.empty(code.max() + 1, dtype=np.int64)
+    first[code[::-1]] = np.arange(len(code) - 1, -1, -1)
+    return first
+
+def _combine(group, sums, sqs, counts, mins, maxs):
+    """Moments per group code: summed sum / sq / count, min of mins, max of maxs"""
+    n = group.max() + 1
+    low = np.full(n, np.inf)
+    high = np.full(n, -np.inf)
+    np.minimum.at(low, group, mins)
+    np.maximum.at(high, group, maxs)
+    return (np.bincount(group, sums, n), np.bincount(group, sqs, n), np.bincount(group, counts, n),
+            low, high)
+
+def quote_steps(df, step_ms, market=PNL_MARKET):
+    """Last price of each bookmaker outcome per step, with the time it was stored, from raw odds"""
+    df = df[df['market'] == market]
+    if df.empty:
+        return pd.DataFrame(columns=QUOTE_COLUMNS)
+    ts = df['ts'].to_numpy(dtype=np.int64)
+    step = ts // step_ms
+    group = _codes(*(df[column] for column in QUOTE_KEY), step)
+    order = np.lexsort((ts, group))
+    last = order[np.r_[group[order][1:] != group[order][:-1], True]]
+    quotes = df.iloc[last][QUOTE_KEY + ['price', 'ts']].reset_index(drop=True)
+    quotes['step'] = step[last]
+    return quotes[QUOTE_COLUMNS]
+
+def iter_quote_steps(days=PNL_DAYS, step_ms=PNL_STEP_MINUTES * 60 * 1000, market=PNL_MARKET):
+    """Yield quote steps one day at a time: reduced from the memory-mapped archive for
+    days that left the database, then aggregated by SQLite from `odds_history`"""
+    start = cutoff_ms(days=days)
+    archived_until = load_manifest().get('archived_until', 0)
+
+    for partition in list_partitions(start, archived_until):
+        df = partition_frame(partition, PNL_COLUMNS, start_ms=start, end_ms=archived_until)
+        if not df.empty:
+            yield quote_steps(df, step_ms, market)
+
+    # SQLite takes a bare column in a MAX() aggregate from the row holding the maximum
+    query = f'''
+        SELECT {', '.join(QUOTE_KEY)}, ts / ? AS step, price, MAX(ts) AS last_ts
+        FROM odds_history
+        WHERE ts >= ? AND ts < ? AND market = ? AND price IS NOT NULL
+        GROUP BY {', '.join(QUOTE_KEY)}, step
+    '''
+    day_start = max(start, archived_until)
+    end = now_ms() + 1
+    while day_start < end:
+        day_end = min(day_start + DAY_MS, end)
+        try:
+            with get_db().read() as conn:
+                df = pd.read_sql_query(query, conn, params=(step_ms, day_start, day_end, market))
+        except Exception as e:
+            logger.error(f"Error fetching odds partition: {e}")
+            df = pd.DataFrame()
+        if not df.empty:
+            yield df.rename(columns={'last_ts': 'ts'})[QUOTE_COLUMNS]
+        day_start = day_end
+
+class PointInTimeBook:
+    """The book a strategy would have seen at the end of every step, built partition by partition
+
+    Like the live `current_odds` snapshot, the book holds each bookmaker's
+    latest price per outcome, counting only quotes stored within the last
+    `max_age` seconds. Every quote step is in force from its step until the
+    quote's next step or until it ages out. Partitions are reduced to price
+    moments over the in-force quotes per (decision point, outcome) as they
+    arrive. Each quote's latest step is held back, because the next
+    partition may still replace it within the same step.
+    """
+
+    def __init__(self, step_ms, max_age=PNL_QUOTE_MAX_AGE):
+        self.step_ms = step_ms
+        self.max_age_ms = max_age * 1000
+        self.events = {}           # (home, away, commence) -> event code
+        self.outcomes = {}         # (event code, outcome name) -> outcome code
+        self.quotes = {}           # (home, away, commence, outcome name, bookmaker) -> (quote, outcome code)
+        self.outcome_event = []
+        self.outcome_name = []
+        self.carry = None          # latest step of every quote: (quote, outcome, step, price, ts)
+        self.moments = []          # per-partition (outcome, step, sum, sq, count, min, max)
+        self.rows = 0
+
+    def _encode(self, df):
+        """Quote and outcome code of every row (codes are kept across partitions)"""
+        local = _codes(*(df[column] for column in QUOTE_KEY))
+        first = _first_rows(local)
+        keys = zip(*(df[column].iloc[first].to_numpy() for column in QUOTE_KEY))
+        codes = np.empty((len(first), 2), dtype=np.int64)
+        for i, key in enumerate(keys):
+            code = self.quotes.get(key)
+            if code is None:
+                event = self.events.setdefault(key[:3], len(self.events))
+                outcome = self.outcomes.get((event, key[3]))
+                if outcome is None:
+                    outcome = self.outcomes[(event, key[3])] = len(self.outcome_event)
+                    self.outcome_event.append(event)
+                    self.outcome_name.append(key[3])
+                code = self.quotes[key] = (len(self.quotes), outcome)
+            codes[i] = code
+        return codes[local, 0], codes[local, 1]
+
+    def add(self, df):
+        """Fold one partition of quote steps (oldest first) into the book"""
+        if df.empty:
+            return
+        self.rows += len(df)
+        arrays = self._encode(df) + (df['step'].to_numpy(dtype=np.int64),
+                                     df['price'].to_numpy(dtype=float), df['ts'].to_numpy(dtype=np.int64))
+        if self.carry is not None:
+            # Held quotes that aged out before this partition starts are final
+            expired = self._last_step(self.carry[4]) < arrays[2].min()
+            self._emit(*(held[expired] for held in self.carry), final=True)
+            arrays = tuple(np.concatenate([held[~expired], new]) for held, new in zip(self.carry, arrays))
+        self.carry = self._emit(*arrays, final=False)
+
+    def _last_step(self, ts):
+        """Last step at whose end a quote stored at `ts` is still in the book"""
+        return (ts + self.max_age_ms) // self.step_ms - 1
+
+    def _emit(self, quote, outcome, step, price, ts, final):
+        """Spread quote steps over the decision points they are in force at and reduce them
+
+        Returns the held-back latest step of every quote (None when `final`).
+        """
+        if not len(quote):
+            return None
+        # Last row per (quote, step): a step split across partitions keeps its later price
+        order = np.lexsort((ts, step, quote))
+        last = np.r_[(quote[order][1:] != quote[order][:-1]) | (step[order][1:] != step[order][:-1]), True]
+        order = order[last]
+        quote, outcome, step, price, ts = quote[order], outcome[order], step[order], price[order], ts[order]
+
+        latest = np.r_[quote[1:] != quote[:-1], True]
+        next_step = np.where(latest, np.iinfo(np.int64).max, np.r_[step[1:], 0])
+        held = None
+        if not final:
+            held = (quote[latest], outcome[latest], step[latest], price[latest], ts[latest])
+            next_step, outcome, step, price, ts = (values[~latest] for values in (next_step, outcome, step, price, ts))
+
+        # A quote counts at the end of step s while (s + 1) * step_ms - ts <= max_age
+        until = np.minimum(next_step - 1, self._last_step(ts))
+        length = np.maximum(until - step + 1, 0)
+        row = np.repeat(np.arange(len(step)), length)
+        if not len(row):
+            return held
+        offset = np.arange(len(row)) - np.repeat(np.cumsum(length) - length, length)
+        outcome = outcome[row]
+        point_step = step[row] + offset
+        prices = price[row]
+        step_min = point_step.min()
+        group = pd.factorize(outcome * (point_step.max() - step_min + 1) + (point_step - step_min))[0]
+        first = _first_rows(group)
+        self.moments.append((outcome[first], point_step[first]) + _combine(
+            group, prices, prices * prices, np.ones(len(prices)), prices, prices))
+        return held
+
+    def replay_frame(self):
+        """Book statistics per decision point (event, step), one column per outcome slot
+
+        Returns (points, event, wide, outcomes): `points` has the event key and
+        step of every decision point, sorted by event and step; `event` is each
+        point's event code; `wide` holds (points x slots) arrays of count / sum /
+        sq / min / max over the in-force quotes; `outcomes` names the outcome of
+        each (event, slot).
+        """
+        if self.carry is not None:
+            self._emit(*self.carry, final=True)
+            self.carry = None
+        if not self.moments:
+            return None
+        outcome, step = (np.concatenate([part[i] for part in self.moments]) for i in range(2))
+        group = _codes(outcome, step)
+        first = _first_rows(group)
+        moments = _combine(group, *(np.concatenate([part[i] for part in self.moments]) for i in range(2, 7)))
+        outcome, step = outcome[first], step[first]
+
+        # Slot of an outcome: its position among its event's outcomes
+        outcome_event = np.asarray(self.outcome_event, dtype=np.int64)
+        slot = pd.Series(outcome_event).groupby(outcome_event).cumcount().to_numpy()
+        n_slots = slot.max() + 1
+        outcomes = np.full((len(self.events), n_slots), None, dtype=object)
+        outcomes[outcome_event, slot] = self.outcome_name
+
+        # Decision points sorted by (event, step)
+        event = outcome_event[outcome]
+        step_min = step.min()
+        span = step.max() - step_min + 1
+        keys, point = np.unique(event * span + (step - step_min), return_inverse=True)
+        wide = {}
+        for name, values in zip(('sum', 'sq', 'count', 'min', 'max'), moments):
+            wide[name] = np.full((len(keys), n_slots), np.nan)
+            wide[name][point, slot[outcome]] = values
+
+        event_rows = pd.DataFrame(list(self.events), columns=EVENT_KEY)
+        point_event = keys // span
+        points = event_rows.iloc[point_event].reset_index(drop=True)
+        points['step'] = keys % span + step_min
+        return points, point_event, wide, outcomes
+
+def point_in_time_stats(wide):
+    """Per-(point, slot) mean / std / count / min / max of the book, as the strategies read them; plus the mean array"""
+    count = wide['count']
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = wide['sum'] / count
+        variance = np.clip((wide['sq'] - wide['sum'] * mean) / (count - 1), 0, None)
+        std = np.where(count > 1, np.sqrt(variance), np.nan)
+    valid = ~np.isnan(mean)
+    point, slot = np.nonzero(valid)
+    index = pd.MultiIndex.from_arrays([point, slot], names=['point', 'slot'])
+    stats = pd.DataFrame({'mean': mean[valid], 'std': std[valid], 'count': count[valid],
+                          'min': wide['min'][valid], 'max': wide['max'][valid]}, index=index)
+    return stats, mean
+
+def _kickoff_ms(commence_time):
+    """Epoch ms of ISO kickoff times (NaN when unparseable)"""
+    kickoff = pd.to_datetime(commence_time, utc=True, errors='coerce')
+    return ((kickoff - pd.Timestamp(0, tz='UTC')).dt.total_seconds() * 1000).to_numpy()
+
+def _sides(bets):
+    """'home' / 'draw' / 'away' of each bet's outcome"""
+    outcome = bets['outcome_name']
+    return np.select([outcome == bets['home_team'], outcome == bets['away_team']], ['home', 'away'],
+                     default=outcome.str.lower().map(OUTCOME_SIDES).fillna(outcome).to_numpy())
+
+def place_bets(events, event, decisions, mean, best, outcomes, step_ms):
+    """First pre-kickoff BUY per event for every strategy: {name: bets DataFrame}
+
+    `events` and `decisions` have one row per decision point, sorted by event
+    and step; `event` is each point's event code. A bet takes the outcome with
+    the highest book mean and fills at `best`, the best quote in force at the
+    end of the step.
+    """
+    first = _first_rows(event)
+    kickoff = _kickoff_ms(events['commence_time'].iloc[first].reset_index(drop=True))[event]
+    prematch = (events['step'].to_numpy() + 1) * step_ms <= kickoff
+    means = np.nan_to_num(mean, nan=-np.inf)
+
+    bets = {}
+    for name in decisions:
+        rows = np.flatnonzero(decisions[name].to_numpy() & prematch)
+        rows = rows[np.r_[True, event[rows][1:] != event[rows][:-1]]] if len(rows) else rows
+        slot = means[rows].argmax(axis=1) if len(rows) else np.zeros(0, dtype=int)
+        placed = events.iloc[rows][STEP_KEY].reset_index(drop=True)
+        placed['slot'] = slot
+        placed['price'] = best[rows, slot]
+        placed['outcome_name'] = outcomes[event[rows], slot]
+        bets[name] = placed
+    return bets
+
+def settle(bets, results, stake=PNL_STAKE, bankroll=PNL_BANKROLL):
+    """P&L metrics of one strategy's bets against match results"""
+    bets = bets.merge(results[EVENT_KEY + ['winner']], on=EVENT_KEY, how='left')
+    settled = bets[bets['winner'].notna() & (bets['price'] > 1)].sort_values(['commence_time', 'step'])
+    won = (_sides(settled) == settled['winner'].to_numpy()) if len(settled) else np.zeros(0, dtype=bool)
+    profit = np.where(won, stake * (settled['price'].to_numpy() - 1), -stake)
+
+    equity = bankroll + np.cumsum(profit)
+    peak = np.maximum.accumulate(np.r_[bankroll, equity])[1:]
+    drawdown = peak - equity
+    staked = stake * len(settled)
+    total = float(profit.sum())
+    return {
+        'bets': len(bets),
+        'settled': len(settled),
+        'unsettled': len(bets) - len(settled),
+        'wins': int(won.sum()),
+        'hit_rate': float(won.mean()) if len(settled) else None,
+        'staked': staked,
+        'profit': total,
+        'roi': total / bankroll if bankroll else None,
+        'yield': total / staked if staked else None,
+        'max_drawdown': float(drawdown.max()) if len(drawdown) else 0.0,
+        'max_drawdown_pct': float((drawdown / peak).max()) if len(drawdown) else 0.0,
+        'avg_odds': float(settled['price'].mean()) if len(settled) else None,
+        'final_bankroll': bankroll + total
+    }
+
+def calculate_pnl(partitions, names=None, step_minutes=PNL_STEP_MINUTES, stake=PNL_STAKE,
+                  bankroll=PNL_BANKROLL, results=None, max_age=PNL_QUOTE_MAX_AGE):
+    """Replay quote steps (oldest partition first) and settle every strategy's bets; returns P&L metrics
+
+    `partitions` are quote steps of `step_minutes` steps, from `iter_quote_steps`
+    or `quote_steps` of raw odds partitions.
+    """
+    start_time = time.time()
+    step_ms = step_minutes * 60 * 1000
+    names = historical_strategies() if names is None else list(names)
+    metrics = {'step_minutes': step_minutes, 'quote_max_age': max_age, 'stake': stake, 'bankroll': bankroll,
+               'events': 0, 'decision_points': 0, 'strategies': {},
+               'timestamp': datetime.now().isoformat()}
+
+    book = PointInTimeBook(step_ms, max_age)
+    for df in partitions:
+        book.add(df)
+    replay = book.replay_frame()
+    if replay is None:
+        return None
+
+    points, event, wide, outcomes = replay
+    stats, mean = point_in_time_stats(wide)
+    features = event_features(stats, required_features(names), key=['point'])
+    events = pd.concat([points, features.set_index('point').reindex(points.index)], axis=1)
+    decisions = decide(events, names)
+
+    if results is None:
+        results = load_results()
+    bets = place_bets(events, event, decisions, mean, wide['max'], outcomes, step_ms)
+    for name, placed in bets.items():
+        metrics['strategies'][name] = settle(placed, results, stake, bankroll)
+
+    metrics['quote_steps'] = book.rows
+    metrics['events'] = len(np.unique(event))
+    metrics['decision_points'] = len(events)
+    metrics['results'] = len(results)
+    metrics['duration'] = time.time() - start_time
+    return metrics
+
+def run_pnl_backtest(days=PNL_DAYS, names=None, step_minutes=PNL_STEP_MINUTES):
+    """Replay the last `days` of stored odds; P&L metrics, or None without odds"""
+    try:
+        metrics = calculate_pnl(iter_quote_steps(days, step_minutes * 60 * 1000), names, step_minutes)
+    except Exception as e:
+        logger.error(f"Error in P&L backtest: {e}")
+        return None
+    if metrics is None:
+        return None
+
+    metrics['days'] = days
+    summary = metrics['strategies'].get(BACKTEST_STRATEGY)
+    if summary:
+        roi = f"{summary['roi']:.2%}" if summary['roi'] is not None else 'n/a'
+        logger.info(f"P&L backtest ({BACKTEST_STRATEGY}, {days} days): {summary['settled']} settled bets, "
+                    f"profit {summary['profit']:.2f}, ROI {roi}, max drawdown {summary['max_drawdown']:.2f} "
+                    f"({metrics['duration']:.2f}s)")
+    return metrics
+
+def main(argv=None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description='Replay stored odds and settle strategy bets')
+    parser.add_argument('--days', type=int, default=PNL_DAYS)
+    parser.add_argument('--step', type=int, default=PNL_STEP_MINUTES, help='decision step in minutes')
+    parser.add_argument('--strategies', help='comma-separated strategy names (default: all historical)')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    names = args.strategies.split(',') if args.strategies else None
+    metrics = run_pnl_backtest(args.days, names, args.step)
+    print(json.dumps(metrics, indent=2) if metrics else "No historical odds data available")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+"""
+Poll Scheduler - Quota-aware adaptive polling for The Odds API
+
+The Odds API reports the account's remaining monthly quota in the
+`x-requests-remaining` / `x-requests-used` response headers. The scheduler
+spreads what is left until the monthly reset across the configured sports:
+each sport gets a base cadence from how close its next kickoff is, and all
+cadences are stretched together whenever the combined request rate would
+exceed the hourly budget.
+"""
+import os
+import json
+import time
+import logging
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from pathlib import Path
+from app.performance_tracker import register_runtime_metrics
+
+logger = logging.getLogger(__name__)
+
+# 'fixed' polls every sport every 60s, 'adaptive' uses this scheduler,
+# 'event' refreshes individual events by lifecycle (see event_tracker)
+POLL_MODE = os.getenv('POLL_MODE', 'fixed').lower()
+POLL_TICK_SECONDS = 15
+
+MONTHLY_QUOTA = int(os.getenv('ODDS_MONTHLY_QUOTA', 500))      # assumed until headers are seen
+QUOTA_RESERVE = float(os.getenv('ODDS_QUOTA_RESERVE', 0.05))   # fraction kept back for manual use
+MIN_POLL_INTERVAL = int(os.getenv('MIN_POLL_INTERVAL', 60))
+MAX_POLL_INTERVAL = int(os.getenv('MAX_POLL_INTERVAL', 6 * 3600))
+
+QUOTA_FILE = Path('data/quota.json')
+QUOTA_HISTORY_HOURS = 24
+BURN_RATE_WINDOW_HOURS = 6
+
+# (hours until kickoff, base interval in seconds); events that kicked off up
+# to IN_PLAY_HOURS ago count as in play and use the first tier
+CADENCE_TIERS = [
+    (1, 60),
+    (6, 300),
+    (24, 1800),
+    (72, 3 * 3600),
+]
+IN_PLAY_HOURS = 3
+IDLE_INTERVAL = MAX_POLL_INTERVAL
+
+def parse_commence_time(value):
+    """Parse an API commence_time (ISO 8601, 'Z' suffix) to an aware datetime"""
+    try:
+        return datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+
+def next_quota_reset(now=None):
+    """The quota resets at the start of each calendar month (UTC)"""
+    now = now or datetime.now(timezone.utc)
+    if now.month == 12:
+        return datetime(now.year + 1, 1, 1, tzinfo=timezone.utc)
+    return datetime(now.year, now.month + 1, 1, tzinfo=timezone.utc)
+
+class QuotaTracker:
+    """Tracks API quota from response headers, persisted across restarts"""
+
+    def __init__(self, quota_file=QUOTA_FILE):
+        self.quota_file = quota_file
+        self.lock = threading.Lock()
+        self.remaining = None
+        self.used = None
+        self.updated_at = None
+        self.history = []  # [(epoch seconds, requests used)]
+        self.load()
+
+    def load(self):
+        """Load the last known quota state"""
+        try:
+            if self.quota_file.exists():
+                with open(self.quota_file, 'r', encoding='utf-8') as f:
+                    state = json.load(f)
+                self.remaining = state.get('remaining')
+                self.used = state.get('used')
+                self.updated_at = state.get('updated_at')
+                self.history = [tuple(entry) for entry in state.get('history', [])]
+        except Exception as e:
+            logger.error(f"Error loading quota state: {e}")
+
+    def save(self):
+        """Persist quota state so restarts and other processes see it"""
+        try:
+            self.quota_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.quota_file, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'remaining': self.remaining,
+                    'used': self.used,
+                    'updated_at': self.updated_at,
+                    'history': self.history
+                }, f)
+        except Exception as e:
+            logger.error(f"Error saving quota state: {e}")
+
+    def update(self, headers):
+        """Record quota headers from an API response"""
+        remaining = headers.get('x-requests-remaining')
+        used = headers.get('x-requests-used')
+        if remaining is None:
+            return
+
+        with self.lock:
+            now = time.time()
+            self.remaining = int(float(remaining))
+            self.used = int(float(used)) if used is not None else self.used
+            self.updated_at = datetime.now(timezone.utc).isoformat()
+            if self.used is not None:
+                # A drop in `used` means the monthly quota was reset
+                if self.history and self.used < self.history[-1][1]:
+                    self.history = []
+                self.history.append((now, self.used))
+                cutoff = now - QUOTA_HISTORY_HOURS * 3600
+                self.history = [entry for entry in self.history if entry[0] >= cutoff][-1000:]
+            self.save()
+
+    def effective_remaining(self):
+        """Remaining requests minus the reserve"""
+        remaining = self.remaining if self.remaining is not None else MONTHLY_QUOTA
+        return max(0.0, remaining - QUOTA_RESERVE * MONTHLY_QUOTA)
+
+    def budget_per_hour(self, now=None):
+        """Requests per hour that can be spent evenly until the monthly reset"""
+        now = now or datetime.now(timezone.utc)
+        hours_left = max((next_quota_reset(now) - now).total_seconds() / 3600, 1.0)
+        return self.effective_remaining() / hours_left
+
+    def burn_rate(self):
+        """Observed requests used per hour over the recent window"""
+        with self.lock:
+            cutoff = time.time() - BURN_RATE_WINDOW_HOURS * 3600
+            window = [entry for entry in self.history if entry[0] >= cutoff]
+        if len(window) < 2 or window[-1][0] <= window[0][0]:
+            return None
+        return (window[-1][1] - window[0][1]) / ((window[-1][0] - window[0][0]) / 3600)
+
+    def projected_exhaustion(self):
+        """When the quota runs out at the current burn rate (None if it will not)"""
+        rate = self.burn_rate()
+        if not rate or self.remaining is None:
+            return None
+        exhaustion = datetime.now(timezone.utc).timestamp() + self.remaining / rate * 3600
+        return datetime.fromtimestamp(exhaustion, tz=timezone.utc)
+
+class PollScheduler:
+    """Decides which sports are due for polling"""
+
+    def __init__(self, quota):
+        self.quota = quota
+        self.lock = threading.Lock()
+        self.sports = {}
+        self.request_cost = 1
+        self.scale = 1.0
+        self.decisions = deque(maxlen=50)
+        self.polls = 0
+        self.skipped_ticks = 0
+
+    def configure(self, sport_keys, request_cost):
+        """Set the sports to schedule and the quota cost of polling one sport"""
+        with self.lock:
+            self.request_cost = max(1, request_cost)
+            for sport_key in sport_keys:
+                self.sports.setdefault(sport_key, {
+                    'last_poll': 0.0,
+                    'next_kickoff': None,
+                    'interval': MIN_POLL_INTERVAL
+                })
+
+    def record_poll(self, sport_key, commence_times):
+        """Remember the nearest relevant kickoff from a sport's latest response"""
+        now = datetime.now(timezone.utc)
+        kickoffs = []
+        for value in commence_times or []:
+            commence_time = parse_commence_time(value)
+            if commence_time and (now - commence_time).total_seconds() < IN_PLAY_HOURS * 3600:
+                kickoffs.append(commence_time)
+        with self.lock:
+            state = self.sports.setdefault(sport_key, {'last_poll': time.time(), 'interval': MIN_POLL_INTERVAL})
+            state['next_kickoff'] = min(kickoffs).isoformat() if kickoffs else None
+
+    @staticmethod
+    def base_interval(next_kickoff, now=None):
+        """Cadence before budget scaling, from hours until the next kickoff"""
+        if next_kickoff is None:
+            return IDLE_INTERVAL
+        now = now or datetime.now(timezone.utc)
+        hours = (parse_commence_time(next_kickoff) - now).total_seconds() / 3600
+        for max_hours, interval in CADENCE_TIERS:
+            if hours <= max_hours:
+                return interval
+        return IDLE_INTERVAL
+
+    def plan(self):
+        """Compute budget-scaled intervals for all sports"""
+        base = {sport_key: self.base_interval(state.get('next_kickoff'))
+                for sport_key, state in self.sports.items()}
+        desired_per_hour = sum(3600 / interval * self.request_cost for interval in base.values())
+        budget = self.quota.budget_per_hour()
+        self.scale = max(1.0, desired_per_hour / budget) if budget > 0 else float('inf')
+        for sport_key, interval in base.items():
+            scaled = interval * self.scale
+            self.sports[sport_key]['interval'] = min(MAX_POLL_INTERVAL, max(MIN_POLL_INTERVAL, scaled))
+        return desired_per_hour, budget
+
+    def due_sports(self):
+        """Return sports whose interval has elapsed and mark them as polled"""
+        with self.lock:
+            desired_per_hour, budget = self.plan()
+            now = time.time()
+            due = []
+            if self.quota.effective_remaining() < self.request_cost:
+                self.skipped_ticks += 1
+                return due
+            for sport_key, state in self.sports.items():
+                if now - state['last_poll'] >= state['interval']:
+                    state['last_poll'] = now
+                    due.append(sport_key)
+                    self.polls += 1
+                    self.decisions.append({
+                        'time': datetime.now(timezone.utc).isoformat(),
+                        'sport': sport_key,
+                        'interval': round(state['interval'], 1),
+                        'next_kickoff': state.get('next_kickoff'),
+                        'scale': round(self.scale, 3),
+                        'desired_per_hour': round(desired_per_hour, 2),
+                        'budget_per_hour': round(budget, 2)
+                    })
+            if due:
+                logger.info(f"Polling {len(due)} sports (budget {budget:.1f} req/h, scale x{self.scale:.2f}): {', '.join(due)}")
+            return due
+
+    def get_stats(self):
+        """Polling decisions, budget burn rate and projected exhaustion"""
+        with self.lock:
+            exhaustion = self.quota.projected_exhaustion()
+            return {
+                'mode': POLL_MODE,
+                'requests_remaining': self.quota.remaining,
+                'requests_used': self.quota.used,
+                'quota_updated_at': self.quota.updated_at,
+                'quota_resets_at': next_quota_reset().isoformat(),
+                'budget_per_hour': self.quota.budget_per_hour(),
+                'burn_rate_per_hour': self.quota.burn_rate(),
+                'projected_exhaustion': exhaustion.isoformat() if exhaustion else None,
+                'exhausts_before_reset': bool(exhaustion and exhaustion < next_quota_reset()),
+                'scale': self.scale,
+                'polls': self.polls,
+                'skipped_ticks': self.skipped_ticks,
+                'sports': {sport_key: dict(state) for sport_key, state in self.sports.items()},
+                'recent_decisions': list(self.decisions)[-20:]
+            }
+
+# Global instances
+quota_tracker = QuotaTracker()
+poll_scheduler = PollScheduler(quota_tracker)
+
+register_runtime_metrics('polling', poll_scheduler.get_stats)
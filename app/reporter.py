@@ -1,68 +1,41 @@
 """
 Reporter - Generates daily reports with charts and summaries
 """
-import sqlite3
 import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 import logging
-from datetime import datetime, timedelta
-import os
+from datetime import datetime
+from app.schema import cutoff_ms
+from app.db import get_db
+from app.signal_store import signal_counts
 
 logger = logging.getLogger(__name__)
 
 def get_daily_data():
-    """Get data from the last 24 hours"""
-    conn = sqlite3.connect('data/odds.db')
-    
+    """Get data from the last 24 hours (raw rows and compacted bars)"""
     try:
-        cutoff_time = datetime.now() - timedelta(days=1)
-        
         query = '''
-            SELECT * FROM odds 
-            WHERE timestamp >= ?
-            ORDER BY timestamp ASC
+            SELECT * FROM odds_history 
+            WHERE ts >= ?
+            ORDER BY ts ASC
         '''
         
-        df = pd.read_sql_query(query, conn, params=(cutoff_time,))
+        with get_db().read() as conn:
+            df = pd.read_sql_query(query, conn, params=(cutoff_ms(days=1),))
         return df
     
     except Exception as e:
         logger.error(f"Error fetching daily data: {e}")
         return pd.DataFrame()
-    
-    finally:
-        conn.close()
 
-def read_signals_log():
-    """Read signals from log file"""
-    signals_file = 'data/signals.log'
-    
-    if not os.path.exists(signals_file):
-        return []
-    
-    signals = []
+def get_daily_signals():
+    """Signal counts per kind ({'BUY': n, 'IGNORE': m}) for the last 24 hours"""
     try:
-        with open(signals_file, 'r') as f:
-            lines = f.readlines()
-            # Get last 24 hours of signals
-            cutoff = datetime.now() - timedelta(days=1)
-            
-            for line in lines:
-                if line.strip():
-                    parts = line.split(' | ')
-                    if len(parts) >= 4:
-                        try:
-                            signal_time = datetime.strptime(parts[0], '%Y-%m-%d %H:%M:%S.%f')
-                            if signal_time >= cutoff:
-                                signals.append(line.strip())
-                        except ValueError:
-                            continue
-    
+        return signal_counts(cutoff_ms(days=1))
     except Exception as e:
-        logger.error(f"Error reading signals log: {e}")
-    
-    return signals
+        logger.error(f"Error reading signals: {e}")
+        return {}
 
 def generate_charts(df):
     """Generate matplotlib charts"""
@@ -152,10 +125,10 @@ def generate_summary(df, signals):
         summary.append("")
     
     summary.append("SIGNALS GENERATED:")
-    summary.append(f"  Total signals in last 24h: {len(signals)}")
+    summary.append(f"  Total signals in last 24h: {sum(signals.values())}")
     
-    buy_count = sum(1 for s in signals if 'BUY' in s)
-    ignore_count = sum(1 for s in signals if 'IGNORE' in s)
+    buy_count = signals.get('BUY', 0)
+    ignore_count = signals.get('IGNORE', 0)
     
     summary.append(f"  BUY signals: {buy_count}")
     summary.append(f"  IGNORE signals: {ignore_count}")
@@ -173,7 +146,7 @@ def generate_daily_report():
     df = get_daily_data()
     
     # Get signals
-    signals = read_signals_log()
+    signals = get_daily_signals()
     
     # Generate charts
     chart_path = generate_charts(df)
@@ -0,0 +1,148 @@
+"""
+Results - Match results for settling bets, from the scores endpoint or a CSV import
+
+`collect_results` fetches completed games of the last SCORES_DAYS_FROM days
+for every collected sport (2 quota units per sport) and upserts them into the
+`results` table. Older seasons can be loaded from a CSV with the columns
+home_team, away_team, commence_time, home_score, away_score (and optionally
+event_id, sport_key). Results are keyed like odds, by (home, away, commence).
+
+Usage:
+    python -m app.results fetch
+    python -m app.results import data/results.csv
+"""
+import os
+import csv
+import argparse
+import logging
+from datetime import datetime
+import pandas as pd
+from app import schema
+from app.db import get_db
+
+logger = logging.getLogger(__name__)
+
+SCORES_DAYS_FROM = int(os.getenv('SCORES_DAYS_FROM', 3))  # completed games from the last N days (1-3)
+IMPORT_BATCH_SIZE = 10000
+
+def winner(home_score, away_score):
+    """'home' / 'draw' / 'away' from a final score"""
+    if home_score > away_score:
+        return 'home'
+    if home_score < away_score:
+        return 'away'
+    return 'draw'
+
+def _score(value):
+    """Numeric score (None when missing or not a number)"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def _iso_ms(value):
+    """Epoch ms of an API ISO timestamp (now when missing)"""
+    try:
+        return schema.to_epoch_ms(datetime.fromisoformat(str(value).replace('Z', '+00:00')))
+    except ValueError:
+        return schema.now_ms()
+
+def parse_scores(events):
+    """Result rows for the completed games of a /scores response"""
+    rows = []
+    for event in events or []:
+        if not event.get('completed') or not event.get('scores'):
+            continue
+        scores = {score.get('name'): _score(score.get('score')) for score in event['scores']}
+        home_score, away_score = scores.get(event.get('home_team')), scores.get(event.get('away_team'))
+        if home_score is None or away_score is None:
+            continue
+        rows.append((event['home_team'], event['away_team'], event['commence_time'], event.get('id'),
+                     event.get('sport_key'), home_score, away_score, winner(home_score, away_score),
+                     'scores', _iso_ms(event.get('last_update'))))
+    return rows
+
+def _upsert_results(conn, rows):
+    """Writer job: insert or refresh result rows"""
+    conn.executemany('''
+        INSERT INTO results
+        (home_team, away_team, commence_time, event_id, sport_key, home_score, away_score, winner, source, ts)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (home_team, away_team, commence_time) DO UPDATE SET
+            event_id = COALESCE(excluded.event_id, results.event_id),
+            sport_key = COALESCE(excluded.sport_key, results.sport_key),
+            home_score = excluded.home_score,
+            away_score = excluded.away_score,
+            winner = excluded.winner,
+            source = excluded.source,
+            ts = excluded.ts
+    ''', rows)
+    return len(rows)
+
+def store_results(rows):
+    """Write result rows in one transaction"""
+    if not rows:
+        return 0
+    return get_db().write(_upsert_results, rows)
+
+def collect_results(sports=None):
+    """Fetch and store completed games for every collected sport; returns the results stored"""
+    from app.collector import ODDS_SPORTS, fetch_scores
+    stored = 0
+    for sport_key in sports or ODDS_SPORTS:
+        try:
+            stored += store_results(parse_scores(fetch_scores(sport_key, SCORES_DAYS_FROM)))
+        except Exception as e:
+            logger.error(f"Error collecting {sport_key} results: {e}")
+    logger.info(f"Stored {stored} match results")
+    return stored
+
+def import_results(path):
+    """Import results from a CSV file; returns the number of rows imported"""
+    imported = rejected = 0
+    rows = []
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        for record in csv.DictReader(f):
+            home_score, away_score = _score(record.get('home_score')), _score(record.get('away_score'))
+            if not record.get('home_team') or not record.get('commence_time') or home_score is None or away_score is None:
+                rejected += 1
+                continue
+            rows.append((record['home_team'], record['away_team'], record['commence_time'],
+                         record.get('event_id') or None, record.get('sport_key') or None, home_score, away_score,
+                         winner(home_score, away_score), 'import', schema.now_ms()))
+            if len(rows) >= IMPORT_BATCH_SIZE:
+                imported += store_results(rows)
+                rows = []
+    imported += store_results(rows)
+    logger.info(f"Imported {imported} results from {path} ({rejected} rejected)")
+    return imported
+
+def load_results(since_commence=None):
+    """Results as a DataFrame, optionally only games that commenced from an ISO time on"""
+    query = 'SELECT home_team, away_team, commence_time, home_score, away_score, winner FROM results'
+    params = ()
+    if since_commence is not None:
+        query += ' WHERE commence_time >= ?'
+        params = (since_commence,)
+    with get_db().read() as conn:
+        return pd.read_sql_query(query, conn, params=params)
+
+def main(argv=None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description='Match results maintenance')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('fetch', help='fetch completed games from the scores endpoint')
+    import_parser = subparsers.add_parser('import', help='import results from a CSV file')
+    import_parser.add_argument('path')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    from app.collector import init_database
+    init_database()
+    if args.command == 'fetch':
+        collect_results()
+    else:
+        import_results(args.path)
+
+if __name__ == "__main__":
+    main()
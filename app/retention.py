@@ -0,0 +1,151 @@
+"""
+Retention - Compacts old raw odds into OHLC bars and reclaims space
+
+Raw price rows older than ODDS_RAW_RETENTION_DAYS are downsampled into one
+open/high/low/close bar per (event, bookmaker, market, outcome) and
+ODDS_BAR_INTERVAL, copied at full resolution into the columnar archive
+(app/archive.py), then deleted, and freed pages are returned to the
+filesystem with an incremental vacuum. `odds_history` reads both DB tiers.
+"""
+import os
+import time
+import logging
+from datetime import datetime
+from app import schema
+from app.archive import ARCHIVE_ENABLED, archive_window
+from app.current_odds import current_tracker
+from app.db import get_db
+from app.performance_tracker import track_performance, register_runtime_metrics
+
+logger = logging.getLogger(__name__)
+
+RAW_RETENTION_DAYS = int(os.getenv('ODDS_RAW_RETENTION_DAYS', 7))
+BAR_INTERVAL = os.getenv('ODDS_BAR_INTERVAL', 'minute').lower()
+BAR_SECONDS = {'minute': 60, 'hour': 3600}.get(BAR_INTERVAL, 60)
+COMPACTION_WINDOW_HOURS = 6  # raw time range compacted per write transaction
+
+BAR_KEY = ('sport_key, sport_title, home_team, away_team, commence_time, '
+           'bookmaker, market, outcome_name')
+
+_last_run = {}
+
+def _compact_window(conn, cutoff, bar_ms, window_ms):
+    """Writer job: compact the oldest window of raw rows before `cutoff`
+
+    Returns (rows_compacted, bars_written, window_end) or None when nothing is left.
+    """
+    cursor = conn.cursor()
+    table = schema.price_table(cursor)
+    cursor.execute(f'SELECT MIN(ts) FROM {table} WHERE ts < ?', (cutoff,))
+    oldest = cursor.fetchone()[0]
+    if oldest is None:
+        return None
+
+    # Windows start on a bar boundary so no bar is split across two runs
+    start = oldest // bar_ms * bar_ms
+    end = min(start + window_ms, cutoff)
+
+    cursor.execute(f'''
+        INSERT INTO odds_bars
+        ({BAR_KEY}, bar_ts, bar_seconds, open, high, low, close, last_ts, ticks, timestamp)
+        SELECT {BAR_KEY}, bar_ts, {bar_ms // 1000},
+               MIN(open_price), MAX(price), MIN(price), MIN(close_price), MAX(ts), COUNT(*),
+               strftime('%Y-%m-%d %H:%M:%S', bar_ts / 1000, 'unixepoch')
+        FROM (
+            SELECT {BAR_KEY}, price, ts, ts / {bar_ms} * {bar_ms} AS bar_ts,
+                   FIRST_VALUE(price) OVER bar AS open_price,
+                   LAST_VALUE(price) OVER bar AS close_price
+            FROM odds
+            WHERE ts >= ? AND ts < ?
+            WINDOW bar AS (PARTITION BY {BAR_KEY}, ts / {bar_ms} ORDER BY ts, id
+                           ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING)
+        )
+        GROUP BY {BAR_KEY}, bar_ts
+    ''', (start, end))
+    bars = cursor.rowcount
+
+    # Keep full-resolution rows in the columnar archive before deleting them
+    if ARCHIVE_ENABLED:
+        archive_window(cursor, start, end)
+
+    cursor.execute(f'DELETE FROM {table} WHERE ts >= ? AND ts < ?', (start, end))
+    rows = cursor.rowcount
+    return rows, bars, end
+
+def _drop_old_keyframes(conn, cutoff):
+    """Writer job: keyframes before the cutoff no longer have raw rows behind them"""
+    return conn.execute('DELETE FROM odds_keyframes WHERE ts < ?', (cutoff,)).rowcount
+
+def _prune_current_odds(conn, cutoff):
+    """Writer job: drop snapshot rows no fetch has confirmed since the cutoff"""
+    return conn.execute('DELETE FROM current_odds WHERE seen_ts < ?', (cutoff,)).rowcount
+
+def _vacuum(conn):
+    """Writer job (no transaction): return free pages to the filesystem"""
+    if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+        # Databases created before incremental auto-vacuum need one full VACUUM to switch
+        logger.info("Converting database to incremental auto-vacuum (one-time VACUUM)...")
+        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        conn.execute('VACUUM')
+    free_pages = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    # The pragma frees one page per step, so it has to be stepped to completion
+    conn.execute('PRAGMA incremental_vacuum').fetchall()
+    return free_pages - conn.execute('PRAGMA freelist_count').fetchone()[0]
+
+@track_performance('retention')
+def run_retention(days=None):
+    """Compact raw odds older than `days` into bars, then vacuum"""
+    days = RAW_RETENTION_DAYS if days is None else days
+    bar_ms = BAR_SECONDS * 1000
+    cutoff = schema.cutoff_ms(days=days) // bar_ms * bar_ms
+    window_ms = COMPACTION_WINDOW_HOURS * 3600 * 1000
+    logger.info(f"Compacting odds older than {days} days into {BAR_INTERVAL} bars...")
+
+    start_time = time.time()
+    db = get_db()
+    rows_compacted = bars_written = 0
+    try:
+        # One short transaction per window so collector writes interleave
+        while True:
+            result = db.write(_compact_window, cutoff, bar_ms, window_ms)
+            if result is None:
+                break
+            rows, bars, _ = result
+            rows_compacted += rows
+            bars_written += bars
+
+        keyframes = db.write(_drop_old_keyframes, cutoff)
+        current_pruned = db.write(_prune_current_odds, cutoff)
+        if current_pruned:
+            current_tracker.reset()
+        pages_freed = db.write(_vacuum, transaction=False)
+    except Exception as e:
+        logger.error(f"Error running retention: {e}")
+        return None
+
+    _last_run.update({
+        'time': datetime.now().isoformat(),
+        'cutoff': schema.from_epoch_ms(cutoff).isoformat(),
+        'bar_seconds': BAR_SECONDS,
+        'rows_compacted': rows_compacted,
+        'bars_written': bars_written,
+        'keyframes_dropped': keyframes,
+        'current_odds_pruned': current_pruned,
+        'pages_freed': pages_freed,
+        'duration': time.time() - start_time
+    })
+    ratio = f"{rows_compacted / bars_written:.1f}x" if bars_written else "n/a"
+    logger.info(f"Retention complete: {rows_compacted} raw rows -> {bars_written} bars ({ratio}), "
+                f"{pages_freed} pages freed in {time.time() - start_time:.1f}s")
+    return dict(_last_run)
+
+def get_retention_stats():
+    """Result of the last retention run"""
+    return dict(_last_run)
+
+register_runtime_metrics('retention', get_retention_stats)
+
+if __name__ == "__main__":
+    # Run one retention pass
+    logging.basicConfig(level=logging.INFO)
+    run_retention()
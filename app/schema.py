@@ -0,0 +1,682 @@
+"""
+Schema - Odds storage layouts (wide table or normalized dimensions)
+
+The wide layout keeps every price row self-describing in a single `odds`
+table. The normalized layout stores repeated strings once in dimension
+tables (`events`, `bookmakers`, `markets`, `outcomes`) and keeps prices in
+the narrow `odds_fact` table. In normalized mode `odds` becomes a view with
+the original columns, so existing `SELECT ... FROM odds` queries keep working.
+
+Schema changes are applied by `run_migrations`, which tracks the applied
+version in `PRAGMA user_version`.
+"""
+import os
+import time
+import logging
+from datetime import datetime, timedelta, timezone
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = 'data/odds.db'
+
+# 'wide' (default) or 'normalized'. Once a database has been normalized it
+# stays normalized - writers detect the layout from the file, not from here.
+STORAGE_MODE = os.getenv('ODDS_STORAGE_MODE', 'wide').lower()
+
+# Dimension table -> natural key column
+DIMENSIONS = {
+    'bookmakers': 'key',
+    'markets': 'key',
+    'outcomes': 'name',
+}
+
+# Range scans use the integer `ts` column (epoch milliseconds, UTC);
+# the text `timestamp` column is kept for display and backwards compatibility
+TS_FROM_TIMESTAMP = "CAST(strftime('%s', {column}) AS INTEGER) * 1000"
+
+# Per-process caches of natural key -> integer id
+_event_ids = {}
+_dimension_ids = {table: {} for table in DIMENSIONS}
+
+def now_ms():
+    """Current time in epoch milliseconds"""
+    return int(time.time() * 1000)
+
+def to_epoch_ms(dt):
+    """Convert a datetime to epoch milliseconds (naive datetimes are local time)"""
+    return int(dt.timestamp() * 1000)
+
+def from_epoch_ms(ts):
+    """Convert epoch milliseconds to a naive UTC datetime (the `timestamp` column format)"""
+    return datetime.fromtimestamp(ts / 1000, tz=timezone.utc).replace(tzinfo=None)
+
+def cutoff_ms(**delta):
+    """Epoch milliseconds for now minus a timedelta, e.g. cutoff_ms(hours=1)"""
+    return now_ms() - int(timedelta(**delta).total_seconds() * 1000)
+
+def create_wide_schema(cursor):
+    """Create the original wide odds table"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS odds (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            sport_key TEXT,
+            sport_title TEXT,
+            home_team TEXT,
+            away_team TEXT,
+            commence_time TEXT,
+            bookmaker TEXT,
+            market TEXT,
+            outcome_name TEXT,
+            price REAL,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            ts INTEGER
+        )
+    ''')
+
+def create_wide_indexes(cursor):
+    """Create range-scan indexes on the wide odds table"""
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_odds_ts ON odds (ts)')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_odds_event_ts
+        ON odds (home_team, away_team, commence_time, ts)
+    ''')
+
+def create_normalized_schema(cursor):
+    """Create dimension tables, the narrow fact table and the compatibility view"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS events (
+            id INTEGER PRIMARY KEY,
+            sport_key TEXT,
+            sport_title TEXT,
+            home_team TEXT,
+            away_team TEXT,
+            commence_time TEXT,
+            UNIQUE (sport_key, home_team, away_team, commence_time)
+        )
+    ''')
+    for table, column in DIMENSIONS.items():
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                id INTEGER PRIMARY KEY,
+                {column} TEXT UNIQUE NOT NULL
+            )
+        ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS odds_fact (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            event_id INTEGER NOT NULL REFERENCES events(id),
+            bookmaker_id INTEGER NOT NULL REFERENCES bookmakers(id),
+            market_id INTEGER NOT NULL REFERENCES markets(id),
+            outcome_id INTEGER NOT NULL REFERENCES outcomes(id),
+            price REAL,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            ts INTEGER
+        )
+    ''')
+    create_fact_indexes(cursor)
+    create_compat_view(cursor)
+
+def create_fact_indexes(cursor):
+    """Create covering range-scan indexes on the narrow fact table"""
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_odds_fact_ts
+        ON odds_fact (ts, event_id, bookmaker_id, market_id, outcome_id, price)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_odds_fact_event_ts
+        ON odds_fact (event_id, ts, bookmaker_id, market_id, outcome_id, price)
+    ''')
+
+def create_keyframe_table(cursor):
+    """Create the table recording when full snapshots were written (delta ingest)"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS odds_keyframes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            ts INTEGER
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_odds_keyframes_ts ON odds_keyframes (ts)')
+
+def create_compat_view(cursor):
+    """(Re)create the `odds` view exposing the wide column layout"""
+    cursor.execute('DROP VIEW IF EXISTS odds')
+    cursor.execute('''
+        CREATE VIEW odds AS
+        SELECT f.id AS id,
+               e.sport_key AS sport_key,
+               e.sport_title AS sport_title,
+               e.home_team AS home_team,
+               e.away_team AS away_team,
+               e.commence_time AS commence_time,
+               b.key AS bookmaker,
+               m.key AS market,
+               o.name AS outcome_name,
+               f.price AS price,
+               f.timestamp AS timestamp,
+               f.ts AS ts
+        FROM odds_fact f
+        JOIN events e ON e.id = f.event_id
+        JOIN bookmakers b ON b.id = f.bookmaker_id
+        JOIN markets m ON m.id = f.market_id
+        JOIN outcomes o ON o.id = f.outcome_id
+    ''')
+
+def create_event_lifecycle_table(cursor):
+    """Create the per-event lifecycle table (event polling mode)"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS event_lifecycle (
+            event_id TEXT PRIMARY KEY,
+            sport_key TEXT,
+            home_team TEXT,
+            away_team TEXT,
+            commence_time TEXT,
+            state TEXT,
+            last_polled_ms INTEGER,
+            next_due_ms INTEGER,
+            updated_ms INTEGER
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_event_lifecycle_state ON event_lifecycle (state, commence_time)')
+    create_active_odds_view(cursor)
+
+def create_active_odds_view(cursor):
+    """(Re)create the `active_odds` view: odds rows of events that are not finished"""
+    cursor.execute('DROP VIEW IF EXISTS active_odds')
+    cursor.execute('''
+        CREATE VIEW active_odds AS
+        SELECT o.*
+        FROM event_lifecycle l
+        JOIN odds o ON o.home_team = l.home_team
+                   AND o.away_team = l.away_team
+                   AND o.commence_time = l.commence_time
+        WHERE l.state != 'finished'
+    ''')
+
+def create_ingest_progress_table(cursor):
+    """Create the per-file checkpoint table used by the bulk importer"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ingest_progress (
+            path TEXT PRIMARY KEY,
+            size INTEGER,
+            mtime REAL,
+            records_done INTEGER DEFAULT 0,
+            rows_written INTEGER DEFAULT 0,
+            rows_rejected INTEGER DEFAULT 0,
+            status TEXT,
+            started_ms INTEGER,
+            updated_ms INTEGER
+        )
+    ''')
+
+def create_ingest_batches_table(cursor):
+    """Create the table recording the price row ids each bulk import chunk inserted"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ingest_batches (
+            path TEXT NOT NULL,
+            first_id INTEGER NOT NULL,
+            last_id INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_ingest_batches_path ON ingest_batches (path)')
+
+def create_spool_progress_table(cursor):
+    """Create the table recording how far each write-ahead spool segment has been stored"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS spool_progress (
+            segment TEXT PRIMARY KEY,
+            offset INTEGER NOT NULL,
+            updated_ms INTEGER
+        )
+    ''')
+
+def create_signals_table(cursor):
+    """Create the signals table with indexes for recent-window and latest-BUY queries"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS signals (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ts INTEGER NOT NULL,
+            event_id TEXT,
+            home_team TEXT,
+            away_team TEXT,
+            commence_time TEXT,
+            strategy TEXT,
+            signal TEXT NOT NULL,
+            odds REAL,
+            min_odds REAL,
+            reason TEXT
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_signals_ts ON signals (ts)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_signals_signal_ts ON signals (signal, ts)')
+
+def create_results_table(cursor):
+    """Create the match results table the P&L backtester settles against"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS results (
+            home_team TEXT NOT NULL,
+            away_team TEXT NOT NULL,
+            commence_time TEXT NOT NULL,
+            event_id TEXT,
+            sport_key TEXT,
+            home_score REAL,
+            away_score REAL,
+            winner TEXT NOT NULL,
+            source TEXT,
+            ts INTEGER,
+            PRIMARY KEY (home_team, away_team, commence_time)
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_results_event_id ON results (event_id)')
+
+def create_current_odds_table(cursor):
+    """Create the latest-price snapshot: one row per (event, bookmaker, market, outcome)
+
+    `ts` is when the price last changed, `seen_ts` when a fetch last confirmed it.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS current_odds (
+            sport_key TEXT,
+            sport_title TEXT,
+            home_team TEXT NOT NULL,
+            away_team TEXT NOT NULL,
+            commence_time TEXT NOT NULL,
+            bookmaker TEXT NOT NULL,
+            market TEXT NOT NULL,
+            outcome_name TEXT NOT NULL,
+            price REAL,
+            event_id TEXT,
+            last_update TEXT,
+            timestamp TEXT,
+            ts INTEGER,
+            seen_ts INTEGER,
+            PRIMARY KEY (home_team, away_team, commence_time, bookmaker, market, outcome_name)
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_current_odds_seen ON current_odds (seen_ts)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_current_odds_event_id ON current_odds (event_id)')
+    create_active_current_odds_view(cursor)
+
+def create_active_current_odds_view(cursor):
+    """(Re)create `active_current_odds`: the snapshot without events tracked as finished"""
+    cursor.execute('DROP VIEW IF EXISTS active_current_odds')
+    cursor.execute('''
+        CREATE VIEW active_current_odds AS
+        SELECT c.*
+        FROM event_lifecycle l
+        JOIN current_odds c ON c.home_team = l.home_team
+                           AND c.away_team = l.away_team
+                           AND c.commence_time = l.commence_time
+        WHERE l.state != 'finished'
+    ''')
+
+def drop_price_indexes(cursor):
+    """Drop the range-scan indexes of the current layout (bulk loads rebuild them)"""
+    if is_normalized(cursor):
+        cursor.execute('DROP INDEX IF EXISTS idx_odds_fact_ts')
+        cursor.execute('DROP INDEX IF EXISTS idx_odds_fact_event_ts')
+    else:
+        cursor.execute('DROP INDEX IF EXISTS idx_odds_ts')
+        cursor.execute('DROP INDEX IF EXISTS idx_odds_event_ts')
+
+def create_price_indexes(cursor):
+    """Create the range-scan indexes of the current layout"""
+    if is_normalized(cursor):
+        create_fact_indexes(cursor)
+    else:
+        create_wide_indexes(cursor)
+
+def create_bars_table(cursor):
+    """Create the compacted OHLC tier for odds older than the raw retention window"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS odds_bars (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            sport_key TEXT,
+            sport_title TEXT,
+            home_team TEXT,
+            away_team TEXT,
+            commence_time TEXT,
+            bookmaker TEXT,
+            market TEXT,
+            outcome_name TEXT,
+            bar_ts INTEGER,
+            bar_seconds INTEGER,
+            open REAL,
+            high REAL,
+            low REAL,
+            close REAL,
+            last_ts INTEGER,
+            ticks INTEGER,
+            timestamp DATETIME
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_odds_bars_ts ON odds_bars (bar_ts)')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_odds_bars_event_ts
+        ON odds_bars (home_team, away_team, commence_time, bar_ts)
+    ''')
+    create_history_view(cursor)
+
+def create_history_view(cursor):
+    """(Re)create `odds_history`: raw rows and compacted bars with the wide columns
+
+    Bars appear with price = close and ts = bar start, so queries written
+    against `odds` work unchanged; `tier` tells the two apart.
+    """
+    cursor.execute('DROP VIEW IF EXISTS odds_history')
+    cursor.execute('''
+        CREATE VIEW odds_history AS
+        SELECT id, sport_key, sport_title, home_team, away_team, commence_time,
+               bookmaker, market, outcome_name, price, timestamp, ts,
+               price AS open, price AS high, price AS low, price AS close,
+               1 AS ticks, 'raw' AS tier
+        FROM odds
+        UNION ALL
+        SELECT id, sport_key, sport_title, home_team, away_team, commence_time,
+               bookmaker, market, outcome_name, close AS price, timestamp, bar_ts AS ts,
+               open, high, low, close, ticks, 'bar' AS tier
+        FROM odds_bars
+    ''')
+
+# Views selecting from `odds`, with the table each one needs
+DEPENDENT_VIEWS = [
+    ('active_odds', 'event_lifecycle', create_active_odds_view),
+    ('odds_history', 'odds_bars', create_history_view),
+]
+
+def drop_dependent_views(cursor):
+    """Drop views over `odds` (a table RENAME would repoint them at the old name)"""
+    for view, _, _ in DEPENDENT_VIEWS:
+        cursor.execute(f'DROP VIEW IF EXISTS {view}')
+
+def create_dependent_views(cursor):
+    """Recreate views over `odds` whose tables exist"""
+    for _, table, create_view in DEPENDENT_VIEWS:
+        if get_object_type(cursor, table) == 'table':
+            create_view(cursor)
+
+def get_object_type(cursor, name):
+    """Return 'table', 'view' or None for a schema object"""
+    cursor.execute('SELECT type FROM sqlite_master WHERE name = ?', (name,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+def get_columns(cursor, table):
+    """Return the column names of a table"""
+    cursor.execute(f'PRAGMA table_info({table})')
+    return [row[1] for row in cursor.fetchall()]
+
+def is_normalized(cursor):
+    """Check whether the database uses the normalized layout"""
+    return get_object_type(cursor, 'odds') == 'view'
+
+def price_table(cursor):
+    """Name of the table physically holding price rows"""
+    return 'odds_fact' if is_normalized(cursor) else 'odds'
+
+# ---------------------------------------------------------------------------
+# Versioned migrations
+# ---------------------------------------------------------------------------
+
+def _migration_base_schema(cursor):
+    """Create the odds table"""
+    if not is_normalized(cursor):
+        create_wide_schema(cursor)
+
+def _migration_epoch_ts(cursor):
+    """Add the epoch-ms ts column, backfill it and index it"""
+    table = price_table(cursor)
+    if 'ts' not in get_columns(cursor, table):
+        cursor.execute(f'ALTER TABLE {table} ADD COLUMN ts INTEGER')
+    cursor.execute(f"UPDATE {table} SET ts = {TS_FROM_TIMESTAMP.format(column='timestamp')} WHERE ts IS NULL")
+
+    if table == 'odds_fact':
+        create_fact_indexes(cursor)
+        create_compat_view(cursor)
+    else:
+        create_wide_indexes(cursor)
+
+    if get_object_type(cursor, 'odds_keyframes') == 'table':
+        if 'ts' not in get_columns(cursor, 'odds_keyframes'):
+            cursor.execute('ALTER TABLE odds_keyframes ADD COLUMN ts INTEGER')
+        cursor.execute(f"UPDATE odds_keyframes SET ts = {TS_FROM_TIMESTAMP.format(column='timestamp')} WHERE ts IS NULL")
+
+def _migration_keyframes(cursor):
+    """Create the delta-ingest keyframe table"""
+    create_keyframe_table(cursor)
+
+def _migration_event_lifecycle(cursor):
+    """Create the event lifecycle table and the active working-set view"""
+    create_event_lifecycle_table(cursor)
+
+def _migration_bars(cursor):
+    """Create the compacted OHLC tier and the raw + compacted history view"""
+    create_bars_table(cursor)
+
+def _migration_ingest_progress(cursor):
+    """Create the bulk import checkpoint table"""
+    create_ingest_progress_table(cursor)
+
+def _migration_spool_progress(cursor):
+    """Create the write-ahead spool checkpoint table"""
+    create_spool_progress_table(cursor)
+
+def _migration_signals(cursor):
+    """Create the structured signals table"""
+    create_signals_table(cursor)
+
+def _migration_current_odds(cursor):
+    """Create the current odds snapshot, seeded with the latest price per key of the last day"""
+    create_current_odds_table(cursor)
+    key = 'home_team, away_team, commence_time, bookmaker, market, outcome_name'
+    cursor.execute(f'''
+        INSERT OR REPLACE INTO current_odds
+        (sport_key, sport_title, {key}, price, event_id, last_update, timestamp, ts, seen_ts)
+        SELECT sport_key, sport_title, {key}, price, '', '', timestamp, ts, ts
+        FROM odds
+        WHERE id IN (SELECT MAX(id) FROM odds WHERE ts >= ? GROUP BY {key})
+    ''', (cutoff_ms(days=1),))
+
+def _migration_signal_transitions(cursor):
+    """Record which state transition (new, new_buy, withdrawn, improved, heartbeat) a signal row is"""
+    if 'transition' not in get_columns(cursor, 'signals'):
+        cursor.execute('ALTER TABLE signals ADD COLUMN transition TEXT')
+
+def _migration_results(cursor):
+    """Create the match results table"""
+    create_results_table(cursor)
+
+def _migration_ingest_batches(cursor):
+    """Record the row ids of each bulk import chunk so a reimport can replace them"""
+    create_ingest_batches_table(cursor)
+
+# (version, description, function) - append only, never renumber
+MIGRATIONS = [
+    (1, 'base odds schema', _migration_base_schema),
+    (2, 'epoch-ms ts column with range indexes', _migration_epoch_ts),
+    (3, 'delta keyframe table', _migration_keyframes),
+    (4, 'event lifecycle table and active_odds view', _migration_event_lifecycle),
+    (5, 'OHLC bar tier and odds_history view', _migration_bars),
+    (6, 'bulk import checkpoints', _migration_ingest_progress),
+    (7, 'write-ahead spool checkpoints', _migration_spool_progress),
+    (8, 'signals table', _migration_signals),
+    (9, 'current odds snapshot', _migration_current_odds),
+    (10, 'signal transition column', _migration_signal_transitions),
+    (11, 'match results', _migration_results),
+    (12, 'bulk import row ranges', _migration_ingest_batches),
+]
+
+def _begin(conn):
+    """Open an explicit write transaction (DDL is not implicitly transactional)"""
+    if not conn.in_transaction:
+        conn.execute('BEGIN IMMEDIATE')
+
+def get_schema_version(cursor):
+    """Return the applied schema version"""
+    cursor.execute('PRAGMA user_version')
+    return cursor.fetchone()[0]
+
+def run_migrations(conn):
+    """Apply pending migrations in order, each in its own transaction"""
+    cursor = conn.cursor()
+    version = get_schema_version(cursor)
+
+    for target, description, migration in MIGRATIONS:
+        if target <= version:
+            continue
+        logger.info(f"Applying schema migration {target}: {description}")
+        try:
+            _begin(conn)
+            migration(cursor)
+            cursor.execute(f'PRAGMA user_version = {int(target)}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        version = target
+
+    return version
+
+def initialize(conn):
+    """Bring a database up to date: pending migrations, then the configured layout"""
+    run_migrations(conn)
+    if STORAGE_MODE == 'normalized' and not is_normalized(conn.cursor()):
+        migrate_to_normalized(conn)
+    # An interrupted bulk import can leave the range indexes dropped
+    create_price_indexes(conn.cursor())
+
+def migrate_to_normalized(conn):
+    """Move an existing wide `odds` table into the normalized layout"""
+    cursor = conn.cursor()
+    _begin(conn)
+    if get_object_type(cursor, 'odds') != 'table':
+        create_normalized_schema(cursor)
+        conn.commit()
+        return 0
+
+    cursor.execute('SELECT COUNT(*) FROM odds')
+    row_count = cursor.fetchone()[0]
+    logger.info(f"Migrating {row_count} odds rows to normalized schema...")
+
+    try:
+        # RENAME would repoint views at odds_legacy; recreate them afterwards
+        drop_dependent_views(cursor)
+        cursor.execute('ALTER TABLE odds RENAME TO odds_legacy')
+        for index in ('idx_odds_ts', 'idx_odds_event_ts'):
+            cursor.execute(f'DROP INDEX IF EXISTS {index}')
+        create_normalized_schema(cursor)
+
+        cursor.execute('''
+            INSERT OR IGNORE INTO events (sport_key, sport_title, home_team, away_team, commence_time)
+            SELECT COALESCE(sport_key, ''), MAX(sport_title), COALESCE(home_team, ''),
+                   COALESCE(away_team, ''), COALESCE(commence_time, '')
+            FROM odds_legacy
+            GROUP BY 1, 3, 4, 5
+        ''')
+        cursor.execute("INSERT OR IGNORE INTO bookmakers (key) SELECT DISTINCT COALESCE(bookmaker, '') FROM odds_legacy")
+        cursor.execute("INSERT OR IGNORE INTO markets (key) SELECT DISTINCT COALESCE(market, '') FROM odds_legacy")
+        cursor.execute("INSERT OR IGNORE INTO outcomes (name) SELECT DISTINCT COALESCE(outcome_name, '') FROM odds_legacy")
+
+        # Keep the original row ids so anything referencing them stays valid
+        cursor.execute(f'''
+            INSERT INTO odds_fact (id, event_id, bookmaker_id, market_id, outcome_id, price, timestamp, ts)
+            SELECT l.id, e.id, b.id, m.id, o.id, l.price, l.timestamp,
+                   COALESCE(l.ts, {TS_FROM_TIMESTAMP.format(column='l.timestamp')})
+            FROM odds_legacy l
+            JOIN events e ON e.sport_key = COALESCE(l.sport_key, '')
+                         AND e.home_team = COALESCE(l.home_team, '')
+                         AND e.away_team = COALESCE(l.away_team, '')
+                         AND e.commence_time = COALESCE(l.commence_time, '')
+            JOIN bookmakers b ON b.key = COALESCE(l.bookmaker, '')
+            JOIN markets m ON m.key = COALESCE(l.market, '')
+            JOIN outcomes o ON o.name = COALESCE(l.outcome_name, '')
+        ''')
+        migrated = cursor.rowcount
+        cursor.execute('DROP TABLE odds_legacy')
+        create_dependent_views(cursor)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    reset_dimension_cache()
+    logger.info(f"Migrated {migrated} odds rows to normalized schema")
+    return migrated
+
+def reset_dimension_cache():
+    """Forget cached dimension ids (call after a rolled back write)"""
+    _event_ids.clear()
+    for ids in _dimension_ids.values():
+        ids.clear()
+
+def _event_id(cursor, sport_key, sport_title, home_team, away_team, commence_time):
+    """Resolve an event to its integer id, inserting it if needed"""
+    key = (sport_key, home_team, away_team, commence_time)
+    event_id = _event_ids.get(key)
+    if event_id is None:
+        cursor.execute('''
+            INSERT OR IGNORE INTO events (sport_key, sport_title, home_team, away_team, commence_time)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (sport_key, sport_title, home_team, away_team, commence_time))
+        cursor.execute('''
+            SELECT id FROM events
+            WHERE sport_key = ? AND home_team = ? AND away_team = ? AND commence_time = ?
+        ''', key)
+        event_id = cursor.fetchone()[0]
+        _event_ids[key] = event_id
+    return event_id
+
+def _dimension_id(cursor, table, value):
+    """Resolve a dimension value to its integer id, inserting it if needed"""
+    ids = _dimension_ids[table]
+    dimension_id = ids.get(value)
+    if dimension_id is None:
+        column = DIMENSIONS[table]
+        cursor.execute(f'INSERT OR IGNORE INTO {table} ({column}) VALUES (?)', (value,))
+        cursor.execute(f'SELECT id FROM {table} WHERE {column} = ?', (value,))
+        dimension_id = cursor.fetchone()[0]
+        ids[value] = dimension_id
+    return dimension_id
+
+def insert_odds_rows(cursor, rows, ts=None):
+    """Insert wide-format odds rows into whichever layout the database uses
+
+    Rows are (sport_key, sport_title, home_team, away_team, commence_time,
+    bookmaker, market, outcome_name, price) tuples (any iterable, e.g.
+    OddsBatch.rows()), all stamped with `ts` (epoch milliseconds, default now).
+    """
+    if not rows:
+        return
+
+    ts = ts if ts is not None else now_ms()
+    timestamp = from_epoch_ms(ts).strftime('%Y-%m-%d %H:%M:%S')
+    insert_history_rows(cursor, (tuple(row) + (timestamp, ts) for row in rows))
+
+def insert_history_rows(cursor, rows):
+    """Insert odds rows that carry their own time: the nine wide columns plus (timestamp, ts)"""
+    if not is_normalized(cursor):
+        cursor.executemany('''
+            INSERT INTO odds
+            (sport_key, sport_title, home_team, away_team,
+             commence_time, bookmaker, market, outcome_name, price, timestamp, ts)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+        return
+
+    fact_rows = []
+    for (sport_key, sport_title, home_team, away_team, commence_time,
+         bookmaker, market, outcome_name, price, timestamp, ts) in rows:
+        fact_rows.append((
+            _event_id(cursor, sport_key, sport_title, home_team, away_team, commence_time),
+            _dimension_id(cursor, 'bookmakers', bookmaker),
+            _dimension_id(cursor, 'markets', market),
+            _dimension_id(cursor, 'outcomes', outcome_name),
+            price,
+            timestamp,
+            ts
+        ))
+
+    cursor.executemany('''
+        INSERT INTO odds_fact (event_id, bookmaker_id, market_id, outcome_id, price, timestamp, ts)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', fact_rows)
@@ -1,29 +1,83 @@
 """
 Signal Generator - Analyzes odds and generates BUY/IGNORE signals
+
+Scoring is vectorized: every strategy registered in app/strategies.py is
+evaluated together from one grouped pass per (event, outcome) and one
+event-level reduction, and SIGNAL_STRATEGY (default 'value') decides the
+logged signals (`score_signals`). The dashboard uses the same function.
+
+In the default 'full' mode every run scores every event from the latest
+price per bookmaker and outcome in the `current_odds` snapshot (or, with
+SIGNAL_SOURCE=history, from every price row of the last hour). In
+'incremental' mode (SIGNAL_MODE=incremental) running count / sum / sum of
+squares of price per (event, outcome) over the history window are kept in
+memory. Each run folds in rows above a row-id watermark, subtracts rows that
+slid out of the window, and re-scores only the events they touched. Those
+aggregates are the history window's statistics, so incremental mode requires
+SIGNAL_SOURCE=history; with the default 'current' source it logs a warning
+and runs in full mode instead, so both modes score the same prices.
+
+Only state transitions (new BUY, BUY withdrawn, odds improved) and periodic
+heartbeats are stored; see app/signal_state.py (SIGNAL_STATE=false stores
+every signal of every run).
 """
+import os
+import math
+import time
 import sqlite3
+import threading
 import pandas as pd
 import logging
-from datetime import datetime, timedelta
-from app.performance_tracker import track_performance
+from datetime import datetime
+from app.performance_tracker import track_performance, register_runtime_metrics
+from app.schema import cutoff_ms, now_ms
+from app.db import get_db
+from app.event_tracker import odds_source
+from app.odds_batch import OddsBatch
+from app.current_odds import get_current_odds
+from app.signal_store import store_signals
+from app.signal_state import SIGNAL_STATE, signal_state
+from app.strategies import EVENT_KEY, OUTCOME_KEY, evaluate, signals_frame
+import app.fair_price  # registers the live positive_ev strategy
 
 logger = logging.getLogger(__name__)
 
+SIGNAL_MODE = os.getenv('SIGNAL_MODE', 'full').lower()
+SIGNAL_WINDOW_HOURS = 1
+REBUILD_INTERVAL = 6 * 3600  # seconds between full rebuilds of the running aggregates
+
+SIGNAL_STRATEGY = os.getenv('SIGNAL_STRATEGY', 'value')
+SIGNAL_SOURCE = os.getenv('SIGNAL_SOURCE', 'current').lower()  # 'current' snapshot or 'history' window
+
+if SIGNAL_MODE == 'incremental' and SIGNAL_SOURCE != 'history':
+    # The running aggregates cover every history row, not the latest price per book
+    logger.warning("SIGNAL_MODE=incremental requires SIGNAL_SOURCE=history; scoring in full mode")
+    SIGNAL_MODE = 'full'
+
 def get_recent_odds(hours=1):
-    """Get recent odds from database"""
+    """Get recent odds from database
+
+    With SIGNAL_SOURCE=current (default) this is the latest price per
+    bookmaker and outcome from the current_odds snapshot, for books seen in
+    the last N hours; with SIGNAL_SOURCE=history every price row of the window.
+    History holds a row per price change, not per poll: books whose
+    last_update did not move are not rewritten (ODDS_SKIP_UNCHANGED), so a
+    quiet book contributes fewer rows to the window than a busy one.
+    """
     try:
-        conn = sqlite3.connect('data/odds.db')
-        
-        # Get odds from the last N hours
-        cutoff_time = datetime.now() - timedelta(hours=hours)
+        if SIGNAL_SOURCE == 'current':
+            return get_current_odds(cutoff_ms(hours=hours))
         
-        query = '''
-            SELECT * FROM odds 
-            WHERE timestamp >= ?
-            ORDER BY timestamp DESC
+        # Get odds from the last N hours (indexed epoch-ms range scan),
+        # limited to unfinished events when event polling is enabled
+        query = f'''
+            SELECT * FROM {odds_source()} 
+            WHERE ts >= ?
+            ORDER BY ts DESC
         '''
         
-        df = pd.read_sql_query(query, conn, params=(cutoff_time,))
+        with get_db().read() as conn:
+            df = pd.read_sql_query(query, conn, params=(cutoff_ms(hours=hours),))
         return df
     
     except sqlite3.OperationalError as e:
@@ -32,94 +86,215 @@ def get_recent_odds(hours=1):
     except Exception as e:
         logger.error(f"Error fetching recent odds: {e}")
         return pd.DataFrame()
-    finally:
-        try:
-            conn.close()
-        except:
-            pass
+
+def score_signals(df=None, stats=None, names=None):
+    """Evaluate every registered strategy (or `names`) in one pass; signals DataFrame for SIGNAL_STRATEGY"""
+    events, decisions = evaluate(df, names, stats=stats)
+    if not decisions.empty:
+        counts = ', '.join(f"{name}={int(buy.sum())}" for name, buy in decisions.items())
+        logger.info(f"Strategy BUY counts over {len(events)} events: {counts}")
+    return signals_frame(events, decisions, SIGNAL_STRATEGY)
+
+def signal_records(signals):
+    """Signal dicts (as logged and returned by analyze_odds) from a signals DataFrame"""
+    timestamp = datetime.now()
+    records = []
+    for home_team, away_team, commence_time, strategy, signal, reason, max_odds, min_odds in signals[
+            EVENT_KEY + ['strategy', 'signal', 'reason', 'max_odds', 'min_odds']].itertuples(index=False, name=None):
+        logger.info(f"Signal for {home_team} vs {away_team}: {signal} - {reason}")
+        records.append({
+            'home_team': home_team,
+            'away_team': away_team,
+            'commence_time': commence_time,
+            'strategy': strategy,
+            'signal': signal,
+            'reason': reason,
+            'max_odds': max_odds,
+            'min_odds': min_odds,
+            'timestamp': timestamp
+        })
+    return records
 
 def analyze_odds(df):
-    """Analyze odds data and generate signals"""
+    """Analyze odds data (a DataFrame or a freshly fetched OddsBatch) and generate signals"""
+    if isinstance(df, OddsBatch):
+        df = df.to_dataframe()
+    
     if df.empty:
         logger.warning("No odds data to analyze")
         return []
     
-    signals = []
-    
     try:
-        # Group by event (home_team + away_team + commence_time)
-        grouped = df.groupby(['home_team', 'away_team', 'commence_time'])
-        
-        for (home_team, away_team, commence_time), group in grouped:
-            # Calculate average odds for each outcome
-            outcome_odds = group.groupby('outcome_name')['price'].mean()
-            
-            # Simple signal logic: BUY if we find value (odds > 2.0 and consistent across bookmakers)
-            # This is a basic example - you can implement more sophisticated logic
-            
-            max_odds = outcome_odds.max()
-            min_odds = outcome_odds.min()
-            std_odds = group.groupby('outcome_name')['price'].std().max()
-            
-            # Signal: BUY if odds are high (>2.0) and relatively stable (low std)
-            if max_odds > 2.0 and (std_odds < 0.2 or pd.isna(std_odds)):
-                signal = "BUY"
-                reason = f"High odds ({max_odds:.2f}) with low variance"
-            else:
-                signal = "IGNORE"
-                reason = f"Odds {max_odds:.2f} don't meet criteria"
-            
-            signals.append({
-                'home_team': home_team,
-                'away_team': away_team,
-                'commence_time': commence_time,
-                'signal': signal,
-                'reason': reason,
-                'max_odds': max_odds,
-                'min_odds': min_odds,
-                'timestamp': datetime.now()
-            })
-            
-            logger.info(f"Signal for {home_team} vs {away_team}: {signal} - {reason}")
-    
+        return signal_records(score_signals(df))
     except Exception as e:
         logger.error(f"Error analyzing odds: {e}")
-    
-    return signals
+        return []
+
+class SignalAggregates:
+    """Running per-(event, outcome) price count, sum and sum of squares over the signal window
+
+    Counts are history rows, i.e. price changes: with ODDS_SKIP_UNCHANGED
+    (default) a book whose last_update did not move adds no row, so the
+    moments weight each book by how often it re-priced, not by polls.
+    """
+
+    def __init__(self, window_hours=SIGNAL_WINDOW_HOURS):
+        self.window_ms = int(window_hours * 3600 * 1000)
+        self.events = {}          # (home, away, commence) -> {outcome: [count, sum, sumsq]}
+        self.watermark = None     # highest odds row id folded in
+        self.cutoff = None        # window start (epoch ms) the aggregates reflect
+        self.rebuilt_at = 0.0
+        self.lock = threading.Lock()
+        self.stats = {'runs': 0, 'rebuilds': 0, 'rows_added': 0, 'rows_expired': 0,
+                      'events_rescored': 0, 'last_duration': None}
+
+    def _fold(self, df, sign, touched):
+        """Add (sign=1) or subtract (sign=-1) rows' price moments"""
+        if df.empty:
+            return
+        df = df.assign(sq=df['price'] * df['price'])
+        moments = df.groupby(OUTCOME_KEY, observed=True).agg(
+            n=('price', 'size'), total=('price', 'sum'), sq=('sq', 'sum'))
+        for (home_team, away_team, commence_time, outcome), n, total, sq in moments.itertuples(name=None):
+            key = (home_team, away_team, commence_time)
+            outcomes = self.events.setdefault(key, {})
+            m = outcomes.setdefault(outcome, [0, 0.0, 0.0])
+            m[0] += sign * n
+            m[1] += sign * total
+            m[2] += sign * sq
+            if m[0] <= 0:
+                del outcomes[outcome]
+                if not outcomes:
+                    del self.events[key]
+            touched.add(key)
+
+    def refresh(self):
+        """Bring the aggregates up to date; returns the event keys whose statistics changed"""
+        touched = set()
+        cutoff = now_ms() - self.window_ms
+        with get_db().read() as conn:
+            max_id = conn.execute('SELECT MAX(id) FROM odds').fetchone()[0] or 0
+            rebuild = (self.watermark is None or max_id < self.watermark
+                       or time.time() - self.rebuilt_at >= REBUILD_INTERVAL)
+            columns = 'home_team, away_team, commence_time, outcome_name, price'
+
+            if rebuild:
+                self.events = {}
+                added = pd.read_sql_query(f'SELECT {columns} FROM odds WHERE ts >= ? AND id <= ?', conn,
+                                          params=(cutoff, max_id))
+                self._fold(added, 1, touched)
+                self.rebuilt_at = time.time()
+                self.stats['rebuilds'] += 1
+                expired = pd.DataFrame()
+            else:
+                # Rows that slid out of the window since the last run (indexed ts range)
+                expired = pd.read_sql_query(f'SELECT {columns} FROM odds WHERE ts >= ? AND ts < ? AND id <= ?', conn,
+                                            params=(self.cutoff, cutoff, self.watermark))
+                # Rows written since the last run (rowid range)
+                added = pd.read_sql_query(f'SELECT {columns} FROM odds WHERE id > ? AND id <= ? AND ts >= ?', conn,
+                                          params=(self.watermark, max_id, cutoff))
+                self._fold(expired, -1, touched)
+                self._fold(added, 1, touched)
+
+        self.watermark = max_id
+        self.cutoff = cutoff
+        self.stats['rows_added'] += len(added)
+        self.stats['rows_expired'] += len(expired)
+        return touched
+
+    def score(self, keys):
+        """Signals for the given events from their running moments"""
+        rows = []
+        for key in keys:
+            for outcome, (n, total, sq) in self.events.get(key, {}).items():
+                mean = total / n
+                std = math.sqrt(max(0.0, (sq - total * mean) / (n - 1))) if n > 1 else float('nan')
+                rows.append((*key, outcome, mean, std, n))
+        stats = pd.DataFrame(rows, columns=OUTCOME_KEY + ['mean', 'std', 'count'])
+        return signal_records(score_signals(stats=stats.set_index(OUTCOME_KEY).sort_index()))
+
+    def generate(self):
+        """Refresh and score the events touched since the last run"""
+        start_time = time.time()
+        with self.lock:
+            touched = self.refresh()
+            if odds_source() == 'active_odds':
+                touched -= self._drop_finished()
+            signals = self.score(touched)
+            self.stats['runs'] += 1
+            self.stats['events_rescored'] += len(signals)
+            self.stats['last_duration'] = time.time() - start_time
+        logger.info(f"Incremental signal run: {len(touched)} touched events, "
+                    f"{len(self.events)} in window ({time.time() - start_time:.3f}s)")
+        return signals
+
+    def _drop_finished(self):
+        """Forget events the lifecycle tracker archived as finished (event polling mode)"""
+        with get_db().read() as conn:
+            finished = set(conn.execute(
+                "SELECT home_team, away_team, commence_time FROM event_lifecycle WHERE state = 'finished'"
+            ).fetchall())
+        finished &= set(self.events)
+        for key in finished:
+            del self.events[key]
+        return finished
+
+    def get_stats(self):
+        """Window size, watermark and work done"""
+        return dict(self.stats, mode=SIGNAL_MODE, events=len(self.events),
+                    groups=sum(len(outcomes) for outcomes in self.events.values()),
+                    watermark=self.watermark)
+
+# Global instance
+signal_aggregates = SignalAggregates()
+
+register_runtime_metrics('signal_aggregates', signal_aggregates.get_stats)
 
 def log_signals(signals):
-    """Log signals to file"""
+    """Store signals in the signals table (one batched write); returns whether they were stored"""
     if not signals:
-        return
+        return True
     
-    log_file = 'data/signals.log'
-    
-    with open(log_file, 'a') as f:
-        for signal in signals:
-            f.write(f"{signal['timestamp']} | {signal['home_team']} vs {signal['away_team']} | "
-                   f"{signal['signal']} | {signal['reason']} | "
-                   f"Odds: {signal['max_odds']:.2f}\n")
+    try:
+        stored = store_signals(signals)
+    except Exception as e:
+        logger.error(f"Error storing signals: {e}")
+        return False
     
-    logger.info(f"Logged {len(signals)} signals to {log_file}")
+    logger.info(f"Stored {stored} signals in the signals table")
+    return True
 
 @track_performance('signal_generator')
 def generate_signals():
     """Main function to generate signals"""
     logger.info("Starting signal generation...")
     
-    # Get recent odds (last hour)
-    df = get_recent_odds(hours=1)
-    
-    if df.empty:
-        logger.warning("No recent odds data available for signal generation")
-        return
-    
-    # Analyze and generate signals
-    signals = analyze_odds(df)
+    if SIGNAL_MODE == 'incremental':
+        # Only events with new or expired rows since the last run
+        try:
+            signals = signal_aggregates.generate()
+        except Exception as e:
+            logger.error(f"Error in incremental signal generation: {e}")
+            return
+    else:
+        # Get recent odds (last hour)
+        df = get_recent_odds(hours=SIGNAL_WINDOW_HOURS)
+        
+        if df.empty:
+            logger.warning("No recent odds data available for signal generation")
+            return
+        
+        # Analyze and generate signals
+        signals = analyze_odds(df)
     
-    # Log signals
+    # Log signals (with the state machine on, only transitions and heartbeats)
     if signals:
-        log_signals(signals)
+        if SIGNAL_STATE:
+            transitions = signal_state.filter(signals)
+            if log_signals(transitions):
+                signal_state.commit(transitions)
+        else:
+            log_signals(signals)
         logger.info(f"Generated {len(signals)} signals")
         logger.info("Signal generated")
     else:
@@ -0,0 +1,144 @@
+"""
+Signal State - Per-event signal state machine that stores transitions only
+
+Every generator run scores every event, but most runs repeat the previous
+decision. The state machine remembers the last stored signal and odds per
+(event, strategy) and passes on only the transitions:
+
+- new: first decision for an event (IGNORE)
+- new_buy: an event turned BUY (first seen, or from IGNORE)
+- withdrawn: a BUY turned IGNORE
+- improved: a BUY whose odds rose by SIGNAL_ODDS_STEP since it was stored
+
+An unchanged state is re-stored as a `heartbeat` every SIGNAL_HEARTBEAT
+seconds while the event is still scored, so readers of a time window still see
+every live event. Stored rows grow with decisions rather than runs x events.
+`filter` only picks the signals to store; `commit` records them once the
+write succeeded, so a failed write does not swallow a transition. State is
+rebuilt from the signals table on startup.
+"""
+import os
+import time
+import logging
+import threading
+from datetime import datetime
+from app.schema import now_ms
+from app.signal_store import latest_signals
+from app.performance_tracker import register_runtime_metrics
+
+logger = logging.getLogger(__name__)
+
+SIGNAL_STATE = os.getenv('SIGNAL_STATE', 'true').lower() == 'true'
+SIGNAL_HEARTBEAT = int(os.getenv('SIGNAL_HEARTBEAT', 3600))     # seconds between re-stores of a state
+SIGNAL_ODDS_STEP = float(os.getenv('SIGNAL_ODDS_STEP', 0.02))   # relative odds rise stored as 'improved'
+STATE_SIGNALS = ('BUY', 'IGNORE')
+
+class SignalStateMachine:
+    """Last stored signal per (event, strategy); filters a run down to its transitions"""
+
+    def __init__(self, heartbeat=SIGNAL_HEARTBEAT, odds_step=SIGNAL_ODDS_STEP, ttl_hours=1):
+        self.heartbeat_ms = heartbeat * 1000
+        self.odds_step = odds_step
+        self.ttl_ms = int(ttl_hours * 3600 * 1000)
+        self.states = {}   # (home, away, commence, strategy) -> {'signal', 'odds', 'stored', 'seen', 'record'}
+        self.warmed = False
+        self.lock = threading.Lock()
+        self.stats = {'runs': 0, 'signals_seen': 0, 'signals_stored': 0, 'transitions': {},
+                      'states_expired': 0, 'last_duration': None}
+
+    def warm(self, now):
+        """Rebuild states from the latest stored signal per (event, strategy)"""
+        since = now - max(self.ttl_ms, self.heartbeat_ms)
+        self.states = {}
+        for signal in latest_signals(since):
+            if signal['signal'] not in STATE_SIGNALS:
+                continue
+            key = (signal['home_team'], signal['away_team'], signal['commence_time'], signal['strategy'])
+            self.states[key] = {'signal': signal['signal'], 'odds': signal['odds'],
+                                'stored': signal['ts'], 'seen': signal['ts'], 'record': None}
+        self.warmed = True
+        logger.info(f"Signal state warmed with {len(self.states)} events from the signals table")
+
+    def _transition(self, state, record):
+        """Transition a scored signal makes from the stored state (None when unchanged)"""
+        buy = record['signal'] == 'BUY'
+        if state is None:
+            return 'new_buy' if buy else 'new'
+        if state['signal'] != record['signal']:
+            return 'new_buy' if buy else 'withdrawn'
+        odds = record.get('max_odds')
+        if buy and state['odds'] and odds and odds > state['odds'] * (1 + self.odds_step):
+            return 'improved'
+        return None
+
+    def filter(self, records, now=None):
+        """Signals of one run worth storing: transitions, plus heartbeats of unchanged states
+
+        The stored states are left alone; call `commit` with the returned
+        signals once they are written, so a failed write is retried next run.
+        """
+        start_time = time.time()
+        now = now or now_ms()
+        with self.lock:
+            if not self.warmed:
+                self.warm(now)
+            stored = []
+            scored = set()
+            for record in records:
+                key = (record['home_team'], record['away_team'], record['commence_time'], record.get('strategy'))
+                scored.add(key)
+                state = self.states.get(key)
+                transition = self._transition(state, record)
+                if transition is None and now - state['stored'] >= self.heartbeat_ms:
+                    transition = 'heartbeat'
+                if state is not None:
+                    state.update(seen=now, record=record)
+                if transition:
+                    stored.append(dict(record, transition=transition))
+
+            # Events not rescored this run (incremental mode) are still live while in the window
+            for key, state in list(self.states.items()):
+                if now - state['seen'] >= self.ttl_ms:
+                    del self.states[key]
+                    self.stats['states_expired'] += 1
+                elif key not in scored and state['record'] and now - state['stored'] >= self.heartbeat_ms:
+                    stored.append(dict(state['record'], transition='heartbeat', timestamp=datetime.now()))
+
+            self.stats['runs'] += 1
+            self.stats['signals_seen'] += len(records)
+            self.stats['last_duration'] = time.time() - start_time
+        logger.info(f"Signal state: storing {len(stored)} of {len(records)} signals (transitions and heartbeats)")
+        return stored
+
+    def commit(self, stored, now=None):
+        """Record signals returned by `filter` as stored (call after the write succeeded)"""
+        now = now or now_ms()
+        with self.lock:
+            for record in stored:
+                key = (record['home_team'], record['away_team'], record['commence_time'], record.get('strategy'))
+                state = self.states.get(key)
+                if state is None:
+                    state = self.states[key] = {'seen': now, 'record': record}
+                state.update(signal=record['signal'], odds=record.get('max_odds'), stored=now)
+                transitions = self.stats['transitions']
+                transitions[record['transition']] = transitions.get(record['transition'], 0) + 1
+            self.stats['signals_stored'] += len(stored)
+
+    def reset(self):
+        """Forget all states (rebuilt from the signals table on the next run)"""
+        with self.lock:
+            self.states = {}
+            self.warmed = False
+
+    def get_stats(self):
+        """States held and signals suppressed"""
+        with self.lock:
+            stats = dict(self.stats, transitions=dict(self.stats['transitions']), states=len(self.states),
+                         enabled=SIGNAL_STATE)
+        stats['store_rate'] = stats['signals_stored'] / stats['signals_seen'] if stats['signals_seen'] else None
+        return stats
+
+# Global instance
+signal_state = SignalStateMachine()
+
+register_runtime_metrics('signal_state', signal_state.get_stats)
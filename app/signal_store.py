@@ -0,0 +1,225 @@
+"""
+Signal Store - Typed signals table replacing the pipe-delimited signals.log
+
+Each generator run writes its signals in one batched transaction. Readers
+use the (ts) and (signal, ts) indexes, so "last hour" and "latest N BUYs"
+are index range scans whose cost does not grow with the table. The API event
+id is resolved from `event_lifecycle` or the `current_odds` snapshot.
+
+`import_signals_log` loads an existing text log once. Its checkpoint lives in
+`ingest_progress`, so re-running the import is a no-op, and lines appended
+since the last import are picked up on the next run.
+
+Usage:
+    python -m app.signal_store import data/signals.log
+"""
+import os
+import argparse
+import logging
+from datetime import datetime
+from app import schema
+from app.db import get_db
+
+logger = logging.getLogger(__name__)
+
+SIGNALS_LOG = 'data/signals.log'
+IMPORT_BATCH_SIZE = 10000
+LOG_TIME_FORMATS = ('%Y-%m-%d %H:%M:%S.%f', '%Y-%m-%d %H:%M:%S')
+
+COLUMNS = ['id', 'ts', 'event_id', 'home_team', 'away_team', 'commence_time',
+           'strategy', 'signal', 'odds', 'min_odds', 'reason', 'transition']
+
+def _insert_signals(conn, rows):
+    """Writer job: insert (ts, home, away, commence, strategy, signal, odds, min_odds, reason, transition) rows"""
+    conn.executemany('''
+        INSERT INTO signals
+        (ts, event_id, home_team, away_team, commence_time, strategy, signal, odds, min_odds, reason, transition)
+        SELECT ?1, COALESCE(
+                   (SELECT event_id FROM event_lifecycle
+                    WHERE home_team = ?2 AND away_team = ?3 AND commence_time = ?4),
+                   (SELECT MAX(event_id) FROM current_odds
+                    WHERE home_team = ?2 AND away_team = ?3 AND commence_time = ?4 AND event_id != '')),
+               ?2, ?3, ?4, ?5, ?6, ?7, ?8, ?9, ?10
+    ''', rows)
+    return len(rows)
+
+def _float(value):
+    """Plain float (NaN becomes NULL)"""
+    if value is None:
+        return None
+    value = float(value)
+    return None if value != value else value
+
+def store_signals(signals):
+    """Write a batch of signal dicts (as returned by analyze_odds) in one transaction"""
+    rows = []
+    for signal in signals:
+        timestamp = signal.get('timestamp')
+        ts = schema.to_epoch_ms(timestamp) if isinstance(timestamp, datetime) else schema.now_ms()
+        rows.append((ts, signal['home_team'], signal['away_team'], signal.get('commence_time'),
+                     signal.get('strategy'), signal['signal'], _float(signal.get('max_odds')),
+                     _float(signal.get('min_odds')), signal.get('reason'), signal.get('transition')))
+    if not rows:
+        return 0
+    return get_db().write(_insert_signals, rows)
+
+def _to_dict(row):
+    """Signal row as an API dict, with the local-time `timestamp` string the log used"""
+    signal = dict(zip(COLUMNS, row))
+    signal['timestamp'] = datetime.fromtimestamp(signal['ts'] / 1000).strftime('%Y-%m-%d %H:%M:%S')
+    signal['match'] = f"{signal['home_team']} vs {signal['away_team']}"
+    return signal
+
+def recent_signals(limit=100, signal=None, since_ms=None):
+    """Most recent signals first, optionally only one kind (BUY / IGNORE) or since a time"""
+    conditions = []
+    params = []
+    if signal is not None:
+        conditions.append('signal = ?')
+        params.append(signal)
+    if since_ms is not None:
+        conditions.append('ts >= ?')
+        params.append(since_ms)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    with get_db().read() as conn:
+        rows = conn.execute(f'''
+            SELECT {', '.join(COLUMNS)} FROM signals
+            {where}
+            ORDER BY ts DESC, id DESC
+            LIMIT ?
+        ''', params + [limit]).fetchall()
+    return [_to_dict(row) for row in rows]
+
+def latest_signals(since_ms, strategies=None):
+    """Latest stored signal per (event, strategy) since a time"""
+    with get_db().read() as conn:
+        rows = conn.execute(f'''
+            SELECT {', '.join(COLUMNS)} FROM signals
+            WHERE id IN (SELECT MAX(id) FROM signals WHERE ts >= ?
+                         GROUP BY home_team, away_team, commence_time, strategy)
+        ''', (since_ms,)).fetchall()
+    signals = [_to_dict(row) for row in rows]
+    if strategies is not None:
+        signals = [signal for signal in signals if signal['strategy'] in strategies]
+    return signals
+
+def signal_counts(since_ms=None):
+    """Signals per kind ({'BUY': n, 'IGNORE': m}) since a time"""
+    with get_db().read() as conn:
+        rows = conn.execute('''
+            SELECT signal, COUNT(*) FROM signals
+            WHERE ts >= ?
+            GROUP BY signal
+        ''', (since_ms or 0,)).fetchall()
+    return dict(rows)
+
+def parse_log_line(line):
+    """Row tuple for one `timestamp | home vs away | SIGNAL | reason | Odds: X.XX` line, or None"""
+    parts = [part.strip() for part in line.split(' | ')]
+    if len(parts) < 5 or parts[2] not in ('BUY', 'IGNORE'):
+        return None
+    for time_format in LOG_TIME_FORMATS:
+        try:
+            ts = schema.to_epoch_ms(datetime.strptime(parts[0], time_format))
+            break
+        except ValueError:
+            continue
+    else:
+        return None
+    home_team, _, away_team = parts[1].partition(' vs ')
+    try:
+        odds = float(parts[4].replace('Odds:', '').strip())
+    except ValueError:
+        odds = None
+    return (ts, home_team, away_team, None, None, parts[2], odds, None, parts[3], None)
+
+def _load_import_progress(conn, path, size, mtime):
+    """Writer job: lines of this file already imported (-1 when nothing changed since)
+
+    Logs are append-only, so a file that grew resumes after the imported lines;
+    a file that shrank was replaced and is imported from the start.
+    """
+    row = conn.execute('SELECT size, mtime, records_done, status FROM ingest_progress WHERE path = ?',
+                       (path,)).fetchone()
+    if row and row[0] == size and row[1] == mtime and row[3] == 'done':
+        return -1
+    skip = row[2] if row and size >= row[0] else 0
+    now = schema.now_ms()
+    conn.execute('''
+        INSERT INTO ingest_progress
+        (path, size, mtime, records_done, rows_written, rows_rejected, status, started_ms, updated_ms)
+        VALUES (?, ?, ?, 0, 0, 0, 'running', ?, ?)
+        ON CONFLICT(path) DO UPDATE SET size = excluded.size, mtime = excluded.mtime,
+            records_done = ?, status = 'running', updated_ms = excluded.updated_ms
+    ''', (path, size, mtime, now, now, skip))
+    return skip
+
+def _write_import_batch(conn, path, lines_done, rows, rejected):
+    """Writer job: insert imported signals and advance the file checkpoint atomically"""
+    _insert_signals(conn, rows)
+    conn.execute('''
+        UPDATE ingest_progress
+        SET records_done = ?, rows_written = rows_written + ?, rows_rejected = rows_rejected + ?, updated_ms = ?
+        WHERE path = ?
+    ''', (lines_done, len(rows), rejected, schema.now_ms(), path))
+
+def _finish_import(conn, path):
+    """Writer job: mark a log file as fully imported"""
+    conn.execute("UPDATE ingest_progress SET status = 'done', updated_ms = ? WHERE path = ?",
+                 (schema.now_ms(), path))
+
+def import_signals_log(path=SIGNALS_LOG):
+    """Import a pipe-delimited signals log once; returns the number of signals imported"""
+    if not os.path.exists(path):
+        return 0
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    db = get_db()
+    skip = db.write(_load_import_progress, path, stat.st_size, stat.st_mtime)
+    if skip < 0:
+        logger.info(f"Skipping {path}: already imported")
+        return 0
+
+    imported = rejected = lines_done = 0
+    rows = []
+    try:
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            for lines_done, line in enumerate(f, 1):
+                if lines_done <= skip:
+                    continue
+                row = parse_log_line(line) if line.strip() else None
+                if row is None:
+                    rejected += bool(line.strip())
+                else:
+                    rows.append(row)
+                if len(rows) >= IMPORT_BATCH_SIZE:
+                    db.write(_write_import_batch, path, lines_done, rows, rejected)
+                    imported += len(rows)
+                    rows = []
+                    rejected = 0
+        db.write(_write_import_batch, path, max(lines_done, skip), rows, rejected)
+        imported += len(rows)
+        db.write(_finish_import, path)
+    except Exception as e:
+        logger.error(f"Error importing signals log {path}: {e}")
+        return imported
+
+    logger.info(f"Imported {imported} signals from {path}")
+    return imported
+
+def main(argv=None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description='Signals table maintenance')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    import_parser = subparsers.add_parser('import', help='import a pipe-delimited signals log')
+    import_parser.add_argument('path', nargs='?', default=SIGNALS_LOG)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    from app.collector import init_database
+    init_database()
+    if args.command == 'import':
+        import_signals_log(args.path)
+
+if __name__ == "__main__":
+    main()
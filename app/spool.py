@@ -0,0 +1,344 @@
+"""
+Spool - Durable write-ahead spool between fetching and storing odds
+
+Fetched batches are appended to segment files in data/spool/ before they are
+written to SQLite, so a busy or failing database never loses data that cost
+API quota. A drain thread stores entries in order through the shared writer.
+Each entry's store commits `spool_progress` (segment, offset) in the same
+transaction, so replay after a crash neither skips nor duplicates entries.
+
+Record format: <length uint32><crc32 uint32><pickled payload>. Appends are
+fsynced at most every SPOOL_FSYNC_MS (group commit). Segments roll over at
+SPOOL_SEGMENT_MB and are deleted once fully stored. When more than
+SPOOL_MAX_PENDING_MB is waiting, appends block (backpressure) for up to
+SPOOL_BACKPRESSURE_SECONDS.
+
+One process owns a spool directory (flock on LOCK); other processes fall
+back to writing directly.
+"""
+import os
+import time
+import zlib
+import pickle
+import struct
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from app import schema
+from app.db import get_db, _is_busy_error
+from app.performance_tracker import register_runtime_metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+SPOOL_ENABLED = os.getenv('ODDS_SPOOL', 'true').lower() == 'true'
+SPOOL_DIR = Path(os.getenv('ODDS_SPOOL_DIR', 'data/spool'))
+FSYNC_INTERVAL = int(os.getenv('SPOOL_FSYNC_MS', 200)) / 1000
+SEGMENT_BYTES = int(os.getenv('SPOOL_SEGMENT_MB', 64)) * 1024 * 1024
+MAX_PENDING_BYTES = int(os.getenv('SPOOL_MAX_PENDING_MB', 256)) * 1024 * 1024
+BACKPRESSURE_SECONDS = float(os.getenv('SPOOL_BACKPRESSURE_SECONDS', 30))
+MAX_ATTEMPTS = 5            # failures (other than database contention) before an entry is dead-lettered
+RETRY_MAX_SECONDS = 30
+
+HEADER = struct.Struct('<II')
+
+def _lock(f):
+    """Non-blocking exclusive lock on an open file; False if another process holds it"""
+    try:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+def record_progress(conn, segment, offset):
+    """Checkpoint a segment inside the caller's write transaction"""
+    conn.execute('''
+        INSERT OR REPLACE INTO spool_progress (segment, offset, updated_ms) VALUES (?, ?, ?)
+    ''', (segment, offset, schema.now_ms()))
+
+def _forget_segment(conn, segment):
+    """Writer job: drop the checkpoint of a deleted segment"""
+    conn.execute('DELETE FROM spool_progress WHERE segment = ?', (segment,))
+
+class OddsSpool:
+    """Append-only segment files drained in order by a background thread"""
+
+    def __init__(self, spool_dir=SPOOL_DIR):
+        self.spool_dir = Path(spool_dir)
+        self.handler = None
+        self.cond = threading.Condition()
+        self.started = False
+        self.available = False
+        self.lock_file = None
+        self.thread = None
+
+        self.segments = []          # [segment name] in drain order; the last one is active
+        self.active = None          # append handle of the active segment
+        self.write_offset = 0
+        self.unsynced = 0
+        self.last_sync = 0.0
+        self.drain_offset = 0       # position in self.segments[0]
+        self.reader = None
+        self.pending_bytes = 0
+        self.pending_records = 0    # appended by this process and not yet stored
+        self.append_times = []      # append time of each of those entries
+        self.own_first_segment = None
+        self.recovered_offsets = {}
+
+        self.stats = {'appends': 0, 'bytes_appended': 0, 'fsyncs': 0, 'stored': 0, 'replayed': 0,
+                      'store_errors': 0, 'dead_letters': 0, 'backpressure_waits': 0,
+                      'backpressure_seconds': 0.0, 'torn_records': 0}
+
+    def start(self, handler):
+        """Take ownership of the spool directory and start draining (leftovers first)
+
+        `handler(payload, segment, offset)` must store the payload and call
+        record_progress(conn, segment, offset) in the same transaction; it
+        raises on failure. Returns False if the spool is disabled or owned by
+        another process.
+        """
+        with self.cond:
+            if self.started:
+                return self.available
+            self.started = True
+            self.handler = handler
+            if not SPOOL_ENABLED:
+                return False
+            try:
+                self.spool_dir.mkdir(parents=True, exist_ok=True)
+                self.lock_file = open(self.spool_dir / 'LOCK', 'a+')
+                if not _lock(self.lock_file):
+                    logger.info(f"Spool {self.spool_dir} is owned by another process; writing directly")
+                    self.lock_file.close()
+                    return False
+                self._recover()
+                self._open_segment()
+                self.own_first_segment = self.segments[-1]
+            except Exception as e:
+                logger.error(f"Error starting spool, writing directly: {e}")
+                return False
+            self.available = True
+
+        self.thread = threading.Thread(target=self._drain_loop, name='odds-spool', daemon=True)
+        self.thread.start()
+        return True
+
+    def _recover(self):
+        """Queue leftover segments from a previous run after their stored offsets"""
+        leftovers = sorted(p.name for p in self.spool_dir.glob('*.spool'))
+        with get_db().read() as conn:
+            offsets = dict(conn.execute('SELECT segment, offset FROM spool_progress').fetchall())
+
+        for name in set(offsets) - set(leftovers):
+            get_db().write(_forget_segment, name)
+
+        self.segments = leftovers
+        self.recovered_offsets = {name: min(offsets.get(name, 0), (self.spool_dir / name).stat().st_size)
+                                  for name in leftovers}
+        if leftovers:
+            self.drain_offset = self.recovered_offsets[leftovers[0]]
+            self.pending_bytes = sum((self.spool_dir / name).stat().st_size - self.recovered_offsets[name]
+                                     for name in leftovers)
+            logger.info(f"Replaying {len(leftovers)} spool segments ({self.pending_bytes} bytes not yet stored)")
+
+    def _open_segment(self):
+        """Start a new active segment (caller holds the condition)"""
+        if self.active:
+            self._sync()
+            self.active.close()
+        # Names are epoch ms (bumped past existing segments), so they sort in
+        # write order and a name is never reused for a different segment
+        numbers = [int(name.split('.')[0]) for name in self.segments]
+        name = f"{max(max(numbers, default=0) + 1, schema.now_ms()):015d}.spool"
+        self.active = open(self.spool_dir / name, 'ab')
+        self.segments.append(name)
+        self.write_offset = 0
+        self.unsynced = 0
+
+    def _sync(self):
+        """fsync the active segment (caller holds the condition)"""
+        if self.unsynced:
+            self.active.flush()
+            os.fsync(self.active.fileno())
+            self.unsynced = 0
+            self.stats['fsyncs'] += 1
+        self.last_sync = time.time()
+
+    def append(self, payload):
+        """Durably enqueue a payload for storing; False if the spool is not available"""
+        if not self.available:
+            return False
+        data = pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL)
+        record = HEADER.pack(len(data), zlib.crc32(data)) + data
+
+        with self.cond:
+            if self.pending_bytes > MAX_PENDING_BYTES:
+                wait_start = time.time()
+                self.stats['backpressure_waits'] += 1
+                logger.warning(f"Spool backlog at {self.pending_bytes / 1e6:.0f} MB, waiting for the writer...")
+                while self.pending_bytes > MAX_PENDING_BYTES and time.time() - wait_start < BACKPRESSURE_SECONDS:
+                    self.cond.wait(BACKPRESSURE_SECONDS - (time.time() - wait_start))
+                self.stats['backpressure_seconds'] += time.time() - wait_start
+
+            try:
+                if self.write_offset >= SEGMENT_BYTES:
+                    self._open_segment()
+                self.active.write(record)
+                self.active.flush()
+                self.write_offset += len(record)
+                self.unsynced += len(record)
+                if time.time() - self.last_sync >= FSYNC_INTERVAL:
+                    self._sync()
+            except Exception as e:
+                logger.error(f"Error appending to spool, writing directly: {e}")
+                return False
+
+            self.pending_bytes += len(record)
+            self.pending_records += 1
+            self.append_times.append(time.time())
+            self.stats['appends'] += 1
+            self.stats['bytes_appended'] += len(record)
+            self.cond.notify_all()
+        return True
+
+    def _next_record(self):
+        """Next (segment, end_offset, data) to store, or None if nothing is ready"""
+        with self.cond:
+            while self.segments:
+                segment = self.segments[0]
+                is_active = len(self.segments) == 1
+                limit = self.write_offset if is_active else None
+                if self.reader is None:
+                    self.reader = open(self.spool_dir / segment, 'rb')
+                self.reader.seek(self.drain_offset)
+                header = self.reader.read(HEADER.size)
+
+                if len(header) == HEADER.size:
+                    length, crc = HEADER.unpack(header)
+                    end = self.drain_offset + HEADER.size + length
+                    if limit is None or end <= limit:
+                        data = self.reader.read(length)
+                        if len(data) == length and zlib.crc32(data) == crc:
+                            return segment, end, data
+                if is_active:
+                    return None
+
+                # End of a sealed segment (a torn or corrupt tail is from a crash mid-append)
+                remaining = (self.spool_dir / segment).stat().st_size - self.drain_offset
+                if remaining:
+                    self.stats['torn_records'] += 1
+                    self.pending_bytes -= remaining
+                    logger.warning(f"Discarding {remaining} torn bytes at the end of spool segment {segment}")
+                self._retire(segment)
+            return None
+
+    def _retire(self, segment):
+        """Delete a fully stored sealed segment (caller holds the condition)"""
+        self.reader.close()
+        self.reader = None
+        self.segments.pop(0)
+        self.drain_offset = self.recovered_offsets.get(self.segments[0], 0) if self.segments else 0
+        os.remove(self.spool_dir / segment)
+        try:
+            get_db().submit(_forget_segment, segment)
+        except Exception as e:
+            logger.error(f"Error forgetting spool segment {segment}: {e}")
+
+    def _store(self, segment, end, data):
+        """Store one entry, retrying until it is stored or dead-lettered"""
+        attempts = 0
+        while True:
+            try:
+                self.handler(pickle.loads(data), segment, end)
+                return
+            except Exception as e:
+                attempts += 1
+                self.stats['store_errors'] += 1
+                contention = isinstance(e, sqlite3.OperationalError) and _is_busy_error(e)
+                if not contention and attempts >= MAX_ATTEMPTS:
+                    self._dead_letter(segment, end, data, e)
+                    return
+                delay = min(RETRY_MAX_SECONDS, 0.5 * 2 ** min(attempts, 6))
+                logger.error(f"Error storing spooled odds (attempt {attempts}, retrying in {delay:.0f}s): {e}")
+                time.sleep(delay)
+
+    def _dead_letter(self, segment, end, data, error):
+        """Set an entry that keeps failing aside and move past it"""
+        dead_dir = self.spool_dir / 'dead'
+        dead_dir.mkdir(exist_ok=True)
+        with open(dead_dir / f"{segment}-{end}.rec", 'wb') as f:
+            f.write(data)
+        while True:
+            try:
+                get_db().write(record_progress, segment, end)
+                break
+            except Exception as e:
+                logger.error(f"Error checkpointing spool past a dead-lettered entry: {e}")
+                time.sleep(RETRY_MAX_SECONDS)
+        self.stats['dead_letters'] += 1
+        logger.error(f"Dead-lettered spooled odds entry {segment}@{end} after {MAX_ATTEMPTS} attempts: {error}")
+
+    def _drain_loop(self):
+        """Store entries in append order; fsync the active segment when idle"""
+        while True:
+            record = self._next_record()
+            if record is None:
+                with self.cond:
+                    if self.unsynced and time.time() - self.last_sync >= FSYNC_INTERVAL:
+                        self._sync()
+                    self.cond.wait(FSYNC_INTERVAL)
+                continue
+
+            segment, end, data = record
+            self._store(segment, end, data)
+            with self.cond:
+                self.pending_bytes -= end - self.drain_offset
+                self.drain_offset = end
+                if segment >= self.own_first_segment:
+                    self.append_times.pop(0)
+                    self.pending_records -= 1
+                else:
+                    self.stats['replayed'] += 1
+                self.stats['stored'] += 1
+                self.cond.notify_all()
+
+    def wait_drained(self, timeout=None):
+        """Block until every entry appended by this process is stored"""
+        deadline = time.time() + timeout if timeout is not None else None
+        with self.cond:
+            while self.pending_records:
+                remaining = deadline - time.time() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.cond.wait(remaining)
+            if self.active and self.unsynced:
+                self._sync()
+        return True
+
+    def get_stats(self):
+        """Backlog, lag and throughput counters"""
+        with self.cond:
+            stats = dict(self.stats)
+            stats.update({
+                'enabled': SPOOL_ENABLED,
+                'active': self.available,
+                'segments': len(self.segments),
+                'pending_bytes': self.pending_bytes,
+                'pending_records': self.pending_records,
+                'lag_seconds': time.time() - self.append_times[0] if self.append_times else 0.0,
+            })
+        return stats
+
+# Global instance
+odds_spool = OddsSpool()
+
+register_runtime_metrics('spool', odds_spool.get_stats)
@@ -0,0 +1,312 @@
+"""
+Steam - Odds movement detection over per-outcome NumPy ring buffers
+
+Each (event, market, outcome, bookmaker) owns one row of fixed-size NumPy
+buffers holding its last STEAM_BUFFER price changes and their times. The
+collector feeds the rows it just stored; a batch is written into the buffers
+with one fancy-indexed assignment (O(1) per row, only when the price moved),
+and only the outcomes it touched are re-checked:
+
+- a drop: some bookmaker's price fell by STEAM_DROP or more from its peak
+  within the last STEAM_WINDOW seconds (the price in force when the window
+  opened counts as a sample);
+- a coordinated move: at least STEAM_MIN_BOOKS bookmakers fell by
+  STEAM_BOOK_DROP or more within the window.
+
+Each new move is stored as a `STEAM` signal and the open ones are served at
+`/api/steam`. Rows are recycled once an event kicks off or has not moved for
+STEAM_IDLE_HOURS, so memory is bounded by the active events, not by history.
+
+The buffers are warmed from the raw odds of the last two windows (the earlier
+one supplies the price in force when the window opened): on the first batch
+in the collector, and every WARM_INTERVAL seconds in processes no collector
+feeds (the dashboard's gunicorn workers).
+"""
+import os
+import time
+import logging
+import threading
+import numpy as np
+from datetime import datetime, timezone
+from app.db import get_db
+from app.schema import now_ms
+from app.signal_store import store_signals
+from app.performance_tracker import register_runtime_metrics
+
+logger = logging.getLogger(__name__)
+
+STEAM_MARKETS = [m.strip() for m in os.getenv('STEAM_MARKETS', 'h2h').split(',') if m.strip()]
+STEAM_BUFFER = int(os.getenv('STEAM_BUFFER', 16))                 # price changes kept per bookmaker outcome
+STEAM_WINDOW = int(os.getenv('STEAM_WINDOW', 1800))               # seconds a move is measured over
+STEAM_DROP = float(os.getenv('STEAM_DROP', 0.08))                 # single-bookmaker drop that signals
+STEAM_BOOK_DROP = float(os.getenv('STEAM_BOOK_DROP', 0.03))       # drop that counts a bookmaker as moving
+STEAM_MIN_BOOKS = int(os.getenv('STEAM_MIN_BOOKS', 3))            # bookmakers moving together that signal
+STEAM_IDLE_HOURS = float(os.getenv('STEAM_IDLE_HOURS', 24))       # recycle events without a move this long
+INITIAL_CAPACITY = 1024
+WARM_INTERVAL = 60  # seconds between reloads from history without a collector feeding the detector
+
+def _iso_now():
+    """Current UTC time in the API's commence_time format"""
+    return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+class SteamDetector:
+    """Ring buffer of recent prices per bookmaker outcome, checked for drops on every ingest"""
+
+    def __init__(self, size=STEAM_BUFFER, window=STEAM_WINDOW, drop=STEAM_DROP,
+                 book_drop=STEAM_BOOK_DROP, min_books=STEAM_MIN_BOOKS, idle_hours=STEAM_IDLE_HOURS):
+        self.size = size
+        self.window_ms = window * 1000
+        self.drop = drop
+        self.book_drop = book_drop
+        self.min_books = min_books
+        self.idle_ms = int(idle_hours * 3600 * 1000)
+        self.prices = np.zeros((0, size))
+        self.times = np.zeros((0, size), dtype=np.int64)
+        self.heads = np.zeros(0, dtype=np.int64)    # next position to write per row
+        self.counts = np.zeros(0, dtype=np.int64)   # samples held per row
+        self.free = []
+        self.slots = {}      # (home, away, commence, market, outcome) -> {bookmaker: row}
+        self.events = {}     # (home, away, commence) -> {'outcomes': set, 'moved': ts}
+        self.moves = {}      # (home, away, commence, market, outcome) -> open move dict
+        self.warmed_at = None
+        self.fed = False     # a collector in this process updates the buffers
+        self.lock = threading.Lock()
+        self.stats = {'updates': 0, 'rows_applied': 0, 'prices_pushed': 0, 'outcomes_evaluated': 0,
+                      'moves_found': 0, 'events_recycled': 0, 'last_duration': None}
+
+    def _clear(self):
+        """Drop every buffer row and open move"""
+        self.prices = np.zeros((0, self.size))
+        self.times = np.zeros((0, self.size), dtype=np.int64)
+        self.heads = np.zeros(0, dtype=np.int64)
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.free, self.slots, self.events, self.moves = [], {}, {}, {}
+
+    def warm(self):
+        """(Re)load the buffers from the raw odds of the last two windows; moves found are not re-stored"""
+        now = now_ms()
+        placeholders = ', '.join('?' for _ in STEAM_MARKETS)
+        with get_db().read() as conn:
+            rows = conn.execute(f'''
+                SELECT home_team, away_team, commence_time, market, outcome_name, bookmaker, price, ts
+                FROM odds
+                WHERE ts >= ? AND market IN ({placeholders}) AND commence_time > ?
+                ORDER BY ts
+            ''', (now - 2 * self.window_ms, *STEAM_MARKETS, _iso_now())).fetchall()
+        with self.lock:
+            self._clear()
+            touched = set()
+            for home_team, away_team, commence_time, market, outcome, bookmaker, price, ts in rows:
+                if not price or not price > 1:
+                    continue
+                key = (home_team, away_team, commence_time, market, outcome)
+                row = self._row(key, bookmaker)
+                head = self.heads[row]
+                if self.counts[row] and self.prices[row, (head - 1) % self.size] == price:
+                    continue
+                self.prices[row, head] = price
+                self.times[row, head] = ts
+                self.heads[row] = (head + 1) % self.size
+                self.counts[row] = min(self.counts[row] + 1, self.size)
+                self.events[key[:3]]['moved'] = ts
+                touched.add(key)
+            self._recycle(now)
+            self._evaluate([key for key in touched if key in self.slots], now)
+            self.warmed_at = time.time()
+        logger.info(f"Steam detector warmed with {len(self.slots)} outcomes from {len(rows)} odds rows")
+
+    def _grow(self):
+        """Double the buffers (rows are only ever added through the free list)"""
+        capacity = len(self.heads)
+        extra = max(INITIAL_CAPACITY, capacity)
+        self.prices = np.vstack([self.prices, np.zeros((extra, self.size))])
+        self.times = np.vstack([self.times, np.zeros((extra, self.size), dtype=np.int64)])
+        self.heads = np.concatenate([self.heads, np.zeros(extra, dtype=np.int64)])
+        self.counts = np.concatenate([self.counts, np.zeros(extra, dtype=np.int64)])
+        self.free.extend(range(capacity + extra - 1, capacity - 1, -1))
+
+    def _row(self, outcome_key, bookmaker):
+        """Buffer row of a bookmaker outcome, allocated on first sight"""
+        books = self.slots.get(outcome_key)
+        if books is None:
+            books = self.slots[outcome_key] = {}
+            self.events.setdefault(outcome_key[:3], {'outcomes': set(), 'moved': 0})['outcomes'].add(outcome_key)
+        row = books.get(bookmaker)
+        if row is None:
+            if not self.free:
+                self._grow()
+            row = books[bookmaker] = self.free.pop()
+            self.heads[row] = self.counts[row] = 0
+        return row
+
+    def update(self, batch, changed, ts):
+        """Push the changed rows of a stored batch; returns the moves that opened with it"""
+        start_time = time.time()
+        if self.warmed_at is None:
+            self.warm()
+        self.fed = True
+        columns = [batch.column(name)[changed] for name in
+                   ('home_team', 'away_team', 'commence_time', 'market', 'outcome_name', 'bookmaker')]
+        prices = batch.price[changed]
+
+        with self.lock:
+            rows = []
+            keys = []
+            for i, (home_team, away_team, commence_time, market, outcome, bookmaker) in enumerate(zip(*columns)):
+                if market not in STEAM_MARKETS or not prices[i] > 1:
+                    continue
+                key = (home_team, away_team, commence_time, market, outcome)
+                rows.append(self._row(key, bookmaker))
+                keys.append((key, i))
+            opened = []
+            if rows:
+                rows = np.array(rows)
+                price = prices[[i for _, i in keys]]
+                # Only price changes enter the buffer, so it spans as much time as possible
+                last = self.prices[rows, (self.heads[rows] - 1) % self.size]
+                moved = (self.counts[rows] == 0) | (last != price)
+                rows, price = rows[moved], price[moved]
+                head = self.heads[rows]
+                self.prices[rows, head] = price
+                self.times[rows, head] = ts
+                self.heads[rows] = (head + 1) % self.size
+                self.counts[rows] = np.minimum(self.counts[rows] + 1, self.size)
+
+                touched = list(dict.fromkeys(key for (key, _), m in zip(keys, moved) if m))
+                for key in touched:
+                    self.events[key[:3]]['moved'] = ts
+                opened = self._evaluate(touched, ts)
+                self.stats['prices_pushed'] += len(rows)
+            self._recycle(ts)
+            self.stats['updates'] += 1
+            self.stats['rows_applied'] += len(prices)
+            self.stats['last_duration'] = time.time() - start_time
+        return opened
+
+    def _evaluate(self, keys, ts):
+        """Check the given outcomes for drops and coordinated moves; returns newly opened moves"""
+        if not keys:
+            return []
+        books = [list(self.slots[key].items()) for key in keys]
+        rows = np.array([row for outcome in books for _, row in outcome])
+        owner = np.repeat(np.arange(len(keys)), [len(outcome) for outcome in books])
+
+        prices = self.prices[rows]
+        times = self.times[rows]
+        valid = np.arange(self.size) < self.counts[rows][:, None]
+        cutoff = ts - self.window_ms
+        recent = valid & (times >= cutoff)
+        before = valid & (times < cutoff)
+        index = np.arange(len(rows))
+        latest = prices[index, (self.heads[rows] - 1) % self.size]
+        # Peak over the window, counting the price in force when it opened
+        peak = np.where(recent, prices, -np.inf).max(axis=1)
+        prior = np.where(before, times, -1).argmax(axis=1)
+        peak = np.where(before.any(axis=1), np.maximum(peak, prices[index, prior]), peak)
+        drop = np.where(peak > 0, (peak - latest) / peak, 0.0)
+
+        moving = np.bincount(owner, drop >= self.book_drop, minlength=len(keys))
+        max_drop = np.full(len(keys), -np.inf)
+        np.maximum.at(max_drop, owner, drop)
+        steam = (max_drop >= self.drop) | (moving >= self.min_books)
+        self.stats['outcomes_evaluated'] += len(keys)
+
+        opened = []
+        for k in np.flatnonzero(~steam):
+            self.moves.pop(keys[k], None)
+        for k in np.flatnonzero(steam):
+            members = np.flatnonzero(owner == k)
+            lead = members[drop[members].argmax()]
+            move = self._move(keys[k], books[k][lead - members[0]][0], peak[lead], latest[lead],
+                              float(drop[lead]), int(moving[k]), ts)
+            if keys[k] not in self.moves:
+                opened.append(move)
+            self.moves[keys[k]] = move
+        self.stats['moves_found'] += len(opened)
+        return opened
+
+    def _move(self, key, bookmaker, peak, price, drop, books, ts):
+        """Describe a move: the outcome, its largest drop and how many bookmakers moved"""
+        home_team, away_team, commence_time, market, outcome = key
+        return {
+            'home_team': home_team,
+            'away_team': away_team,
+            'commence_time': commence_time,
+            'market': market,
+            'outcome': outcome,
+            'bookmaker': bookmaker,
+            'from_price': float(peak),
+            'to_price': float(price),
+            'drop': drop,
+            'books_moving': books,
+            'window_seconds': self.window_ms // 1000,
+            'ts': ts
+        }
+
+    def _recycle(self, ts):
+        """Return the rows of started or idle events to the free list"""
+        started = _iso_now()
+        expired = [event for event, state in self.events.items()
+                   if event[2] <= started or ts - state['moved'] > self.idle_ms]
+        for event in expired:
+            for key in self.events.pop(event)['outcomes']:
+                self.free.extend(self.slots.pop(key, {}).values())
+                self.moves.pop(key, None)
+        self.stats['events_recycled'] += len(expired)
+
+    def open_moves(self):
+        """Open moves, largest drop first (re-checked, so moves that left the window close)
+
+        In a process without a collector feeding the buffers they are reloaded
+        from history at most every WARM_INTERVAL seconds.
+        """
+        if not self.fed and (self.warmed_at is None or time.time() - self.warmed_at >= WARM_INTERVAL):
+            self.warm()
+        now = int(time.time() * 1000)
+        with self.lock:
+            self._recycle(now)
+            self._evaluate(list(self.moves), now)
+            moves = list(self.moves.values())
+        return sorted(moves, key=lambda m: m['drop'], reverse=True)
+
+    def get_stats(self):
+        """Buffer size and work done"""
+        with self.lock:
+            return dict(self.stats, events=len(self.events), outcomes=len(self.slots),
+                        rows_used=len(self.heads) - len(self.free), capacity=len(self.heads),
+                        open=len(self.moves))
+
+def move_signals(moves):
+    """Signal dicts (see signal_store.store_signals) for steam moves"""
+    return [{
+        'home_team': m['home_team'],
+        'away_team': m['away_team'],
+        'commence_time': m['commence_time'],
+        'strategy': 'steam',
+        'signal': 'STEAM',
+        'reason': (f"{m['outcome']} ({m['market']}) {m['from_price']:.2f} -> {m['to_price']:.2f} "
+                   f"({-m['drop']:.1%}) at {m['bookmaker']}, {m['books_moving']} bookmakers moving "
+                   f"within {m['window_seconds'] // 60} min"),
+        'max_odds': m['from_price'],
+        'min_odds': m['to_price'],
+        'timestamp': datetime.now()
+    } for m in moves]
+
+def record_steam(batch, changed, ts):
+    """Feed a stored batch to the detector and store newly opened moves as STEAM signals"""
+    try:
+        opened = steam_detector.update(batch, changed, ts)
+        if opened:
+            store_signals(move_signals(opened))
+            for m in opened:
+                logger.info(f"Steam: {m['home_team']} vs {m['away_team']} {m['outcome']} "
+                            f"{m['from_price']:.2f} -> {m['to_price']:.2f} ({m['books_moving']} bookmakers)")
+        return opened
+    except Exception as e:
+        logger.error(f"Error updating steam detector: {e}")
+        return []
+
+# Global instance
+steam_detector = SteamDetector()
+
+register_runtime_metrics('steam', steam_detector.get_stats)
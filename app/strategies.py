@@ -0,0 +1,160 @@
+"""
+Strategies - Registry of vectorized signal rules evaluated in one pass
+
+A strategy declares the event-level features it reads (FEATURES, or live
+features registered by other modules with `register_feature`) and a
+decision function mapping a features DataFrame (one row per event) to a
+boolean BUY Series. `evaluate` computes the union of the features every
+requested strategy needs with one grouped pass over (event, outcome) and one
+event-level reduction, then applies each decision function to the shared
+frame, so adding strategies costs one vectorized comparison each.
+"""
+import logging
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+EVENT_KEY = ['home_team', 'away_team', 'commence_time']
+OUTCOME_KEY = EVENT_KEY + ['outcome_name']
+
+# Event-level feature -> (per-outcome price statistic, reduction across outcomes)
+FEATURES = {
+    'max_mean': ('mean', 'max'),    # best outcome mean price
+    'min_mean': ('mean', 'min'),    # worst outcome mean price
+    'max_std': ('std', 'max'),      # largest outcome price std (NaN for single quotes)
+    'max_price': ('max', 'max'),    # best single quote
+    'min_price': ('min', 'min'),    # worst single quote
+    'quotes': ('count', 'sum'),     # price rows behind the event
+    'outcomes': ('mean', 'count'),  # outcomes quoted
+}
+BASE_FEATURES = ['max_mean', 'min_mean', 'max_std']  # always computed, reported with every signal
+
+_strategies = {}
+_live_features = {}  # name -> provider(events) returning a Series aligned with the events frame
+
+def register_feature(name, provider):
+    """Register a live event-level feature computed outside the price statistics
+
+    Live features (e.g. expected value against the current fair price) describe
+    the market now, so strategies that read them are left out of backtests.
+    """
+    _live_features[name] = provider
+
+def register_strategy(name, features, decide, describe=None):
+    """Register a strategy under a name
+
+    `decide(features)` returns a boolean BUY Series aligned with the features
+    frame; `describe(features, buy)` optionally returns the reason strings.
+    """
+    unknown = set(features) - set(FEATURES) - set(_live_features)
+    if unknown:
+        raise ValueError(f"Strategy {name} needs unknown features: {sorted(unknown)}")
+    _strategies[name] = {'features': list(features), 'decide': decide, 'describe': describe}
+
+def list_strategies():
+    """Registered strategy names and the features each reads"""
+    return {name: strategy['features'] for name, strategy in _strategies.items()}
+
+def historical_strategies():
+    """Strategies that only read price statistics (and so can be backtested)"""
+    return [name for name, strategy in _strategies.items()
+            if all(f in FEATURES for f in strategy['features'])]
+
+def _strategy(name):
+    """Look up a registered strategy"""
+    if name not in _strategies:
+        raise KeyError(f"Unknown strategy: {name} (registered: {', '.join(_strategies)})")
+    return _strategies[name]
+
+def required_features(names):
+    """Union of the features the given strategies read, plus BASE_FEATURES"""
+    features = list(BASE_FEATURES)
+    for name in names:
+        features += [f for f in _strategy(name)['features'] if f not in features]
+    return features
+
+def outcome_stats(df, features=None):
+    """Per-(event, outcome) price statistics the features need, in one grouped pass"""
+    features = features or BASE_FEATURES
+    stats = list(dict.fromkeys(FEATURES[f][0] for f in features if f in FEATURES))
+    return df.groupby(OUTCOME_KEY, observed=True)['price'].agg(stats)
+
+def event_features(stats, features, key=EVENT_KEY):
+    """Reduce per-(event, outcome) stats to one row of features per event
+
+    Features whose statistic is missing from `stats` (e.g. min/max from the
+    incremental aggregates) come out as NaN. Live features are added by their
+    providers afterwards. `key` names the index levels that identify a row of
+    the result (the P&L backtester adds a time step to the event).
+    """
+    available = {f: spec for f, spec in FEATURES.items() if f in features and spec[0] in stats}
+    if stats.empty:
+        return pd.DataFrame(columns=key + list(features))
+    events = stats.groupby(level=key, observed=True).agg(**available).reset_index()
+    for f in features:
+        if f in _live_features:
+            events[f] = _live_features[f](events)
+        elif f not in events:
+            events[f] = np.nan
+    return events
+
+def evaluate(df=None, names=None, stats=None):
+    """Features and decisions for all `names` (default: every registered strategy)
+
+    Pass raw odds rows as `df`, or precomputed per-outcome `stats` indexed by
+    OUTCOME_KEY. Returns (features, decisions): one row per event, with a
+    boolean BUY column per strategy in `decisions`.
+    """
+    names = list(_strategies) if names is None else list(names)
+    features = required_features(names)
+    if stats is None:
+        stats = outcome_stats(df, features)
+    events = event_features(stats, features)
+    return events, decide(events, names)
+
+def decide(events, names):
+    """Boolean BUY column per strategy for a features frame"""
+    return pd.DataFrame({name: _strategy(name)['decide'](events).fillna(False).astype(bool)
+                         for name in names}, index=events.index)
+
+def signals_frame(events, decisions, name):
+    """Signals DataFrame (one BUY/IGNORE row per event) for one evaluated strategy"""
+    columns = EVENT_KEY + ['strategy', 'signal', 'reason', 'max_odds', 'min_odds', 'std_odds']
+    if events.empty:
+        return pd.DataFrame(columns=columns)
+
+    buy = decisions[name]
+    describe = _strategy(name)['describe']
+    if describe is not None:
+        reason = describe(events, buy)
+    else:
+        odds = events['max_mean'].map('{:.2f}'.format)
+        reason = np.where(buy, f'{name}: odds ' + odds, 'Odds ' + odds + " don't meet criteria")
+    return pd.DataFrame({
+        **{key: events[key] for key in EVENT_KEY},
+        'strategy': name,
+        'signal': np.where(buy, 'BUY', 'IGNORE'),
+        'reason': reason,
+        'max_odds': events['max_mean'],
+        'min_odds': events['min_mean'],
+        'std_odds': events['max_std']
+    })[columns]
+
+def score(df=None, name='value', stats=None):
+    """Signals DataFrame for a single strategy"""
+    events, decisions = evaluate(df, [name], stats=stats)
+    return signals_frame(events, decisions, name)
+
+def _describe_value(events, buy):
+    """Reasons of the default strategy"""
+    odds = events['max_mean'].map('{:.2f}'.format)
+    return np.where(buy, 'High odds (' + odds + ') with low variance', 'Odds ' + odds + " don't meet criteria")
+
+# Default strategies
+# value: best outcome mean above 2.0 and every outcome's std below 0.2 (a missing std counts as stable)
+register_strategy('value', ['max_mean', 'max_std'],
+                  lambda f: (f['max_mean'] > 2.0) & ~(f['max_std'] >= 0.2),
+                  describe=_describe_value)
+# high_mean: the backtester's rule, best outcome mean above 2.0 regardless of spread
+register_strategy('high_mean', ['max_mean'], lambda f: f['max_mean'] > 2.0)
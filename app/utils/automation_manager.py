@@ -8,6 +8,9 @@ from pathlib import Path
 from datetime import datetime, timezone
 from typing import Dict, List, Optional
 import logging
+from app.current_odds import event_prices
+from app.fair_price import fair_price_engine
+from app.utils.betting_engine import BettingEngine
 
 logger = logging.getLogger(__name__)
 
@@ -23,6 +26,7 @@ class AutomationManager:
         self.total_spent = 0.0
         self.lock = threading.Lock()
         self.rules = self.load_rules()
+        self.engine = BettingEngine()
         self.logs: List[Dict] = []
         self.load_logs()
     
@@ -40,6 +44,7 @@ class AutomationManager:
             "daily_cap": 1000.0,
             "whitelist": [],
             "blacklist": [],
+            "min_ev": 0.0,
             "enabled": False
         }
     
@@ -89,8 +94,12 @@ class AutomationManager:
             self.save_logs()
             logger.info(f"[AUTOMATION] {event_type}: {message}")
     
-    def evaluate_event(self, match: str, odds: Dict) -> Optional[Dict]:
-        """Evaluate if a bet should be placed on this event"""
+    def evaluate_event(self, match: str, odds: Dict, probabilities: Optional[Dict] = None) -> Optional[Dict]:
+        """Evaluate if a bet should be placed on this event
+        
+        `probabilities` are the fair probabilities per side; without them
+        there is no expected value to act on and no bet is placed.
+        """
         if not self.rules.get("enabled", False):
             return None
         
@@ -101,21 +110,26 @@ class AutomationManager:
         if match in self.rules.get("blacklist", []):
             return None
         
-        # Simple evaluation: bet on highest odds outcome
-        max_odds_key = max(odds.keys(), key=lambda k: odds[k])
-        max_odds = odds[max_odds_key]
+        # Bet on the outcome with the highest expected value against the fair price
+        self.engine.rules = self.rules
+        decision = self.engine.evaluate_bet({"match": match}, odds, probabilities or {})
+        if decision is None or decision["recommendation"] != "BUY":
+            return None
         
         # Only bet if odds are reasonable (between 1.5 and 5.0)
-        if 1.5 <= max_odds <= 5.0:
+        best_odds = decision["odds"]
+        if 1.5 <= best_odds <= 5.0:
             bet_amount = min(
                 self.rules.get("max_bet", 100.0),
-                max(self.rules.get("min_bet", 10.0), max_odds * 10)
+                max(self.rules.get("min_bet", 10.0), best_odds * 10)
             )
             
             return {
                 "match": match,
-                "outcome": max_odds_key,
-                "odds": max_odds,
+                "outcome": decision["outcome"],
+                "odds": best_odds,
+                "probability": decision["probability"],
+                "expected_value": decision["expected_value"],
                 "amount": bet_amount
             }
         
@@ -167,17 +181,16 @@ class AutomationManager:
                 if not self.running:
                     break
                 
-                # Mock event data (in real implementation, fetch from API)
-                mock_events = [
-                    {"match": "Liverpool vs Arsenal", "odds": {"home": 1.8, "draw": 3.4, "away": 4.2}},
-                    {"match": "Chelsea vs Man City", "odds": {"home": 3.2, "draw": 3.1, "away": 2.1}},
-                ]
+                # Best current price per side from the current_odds snapshot
+                events = event_prices()
+                probabilities = fair_price_engine.event_probabilities()
                 
-                for event in mock_events:
+                for event in events:
                     if not self.running:
                         break
                     
-                    bet_decision = self.evaluate_event(event["match"], event["odds"])
+                    key = (event["home_team"], event["away_team"], event["commence_time"])
+                    bet_decision = self.evaluate_event(event["match"], event["odds"], probabilities.get(key))
                     if bet_decision:
                         self.place_bet(bet_decision)
                     
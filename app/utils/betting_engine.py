@@ -1,8 +1,12 @@
 """
 Betting Engine - Core logic for betting decisions
+
+Probabilities come from the fair price engine (app/fair_price.py): the
+margin-removed consensus across bookmakers in the current odds snapshot.
 """
 from typing import Dict, List, Optional
 import logging
+from app.fair_price import fair_price_engine
 
 logger = logging.getLogger(__name__)
 
@@ -17,14 +21,31 @@ class BettingEngine:
         self.rules = rules
         logger.info(f"Loaded {len(rules)} betting rules")
     
-    def evaluate_bet(self, match_data: Dict, odds: Dict) -> Optional[Dict]:
-        """Evaluate if a bet should be placed"""
-        # Placeholder for betting logic
+    def fair_probabilities(self, match_data: Dict) -> Dict:
+        """Consensus fair probability per side ('home' / 'draw' / 'away') of an event"""
+        key = (match_data.get("home_team"), match_data.get("away_team"), match_data.get("commence_time"))
+        return fair_price_engine.event_probabilities().get(key, {})
+    
+    def evaluate_bet(self, match_data: Dict, odds: Dict, probabilities: Optional[Dict] = None) -> Optional[Dict]:
+        """Evaluate if a bet should be placed: the side with the highest expected value at `odds`"""
+        if probabilities is None:
+            probabilities = self.fair_probabilities(match_data)
+        values = {side: self.calculate_value(price, probabilities[side])
+                  for side, price in odds.items() if side in probabilities}
+        if not values:
+            return None
+        
+        side = max(values, key=values.get)
+        value = values[side]
         return {
             "match": match_data.get("match"),
-            "recommendation": "BUY",
-            "confidence": 0.75,
-            "reason": "Meets criteria"
+            "outcome": side,
+            "odds": odds[side],
+            "probability": probabilities[side],
+            "expected_value": value,
+            "recommendation": "BUY" if value > self.rules.get("min_ev", 0.0) else "IGNORE",
+            "confidence": probabilities[side],
+            "reason": f"Expected value {value:+.1%} at {odds[side]:.2f}"
         }
     
     def calculate_value(self, odds: float, probability: float) -> float:
@@ -1,3 +1,2 @@
-from cachetools import TTLCache
-cache = TTLCache(maxsize=100, ttl=30)
-
+from app.cache import response_cache
+cache = response_cache.namespace("utils", ttl=30)
@@ -0,0 +1,117 @@
+"""
+Benchmark analyze_odds - per-event loop vs the vectorized signal engine
+
+Generates synthetic odds (10 bookmakers x 3 outcomes per snapshot) at
+1k to 1M rows and times the previous per-event groupby loop against
+`score_signals`, checking both produce the same BUY/IGNORE decisions, then
+times one strategy against --strategies registered strategies.
+
+Usage: python benchmark_analyze.py [--sizes 1000,10000,100000,1000000] [--legacy-max 1000000] [--strategies 20]
+"""
+import sys
+import time
+import logging
+import argparse
+import numpy as np
+import pandas as pd
+from app.signal_generator import EVENT_KEY, score_signals
+from app.strategies import register_strategy, evaluate, historical_strategies
+
+BOOKMAKERS = 10
+OUTCOMES = ['home', 'draw', 'away']
+SNAPSHOTS = 4  # quotes per (event, bookmaker, outcome)
+
+def make_odds(rows, seed=0):
+    """Synthetic odds frame with roughly `rows` rows"""
+    rng = np.random.default_rng(seed)
+    per_event = BOOKMAKERS * len(OUTCOMES) * SNAPSHOTS
+    events = max(1, rows // per_event)
+    event = np.repeat(np.arange(events), per_event)[:rows]
+    if len(event) < rows:
+        event = np.resize(event, rows)
+    outcome = np.tile(np.repeat(np.arange(len(OUTCOMES)), SNAPSHOTS), events * BOOKMAKERS)
+    outcome = np.resize(outcome, rows)
+    base = rng.uniform(1.2, 4.0, size=(events, len(OUTCOMES)))
+    spread = rng.choice([0.02, 0.5], size=events, p=[0.7, 0.3])
+    price = base[event, outcome] + rng.normal(0, 1, rows) * spread[event]
+    return pd.DataFrame({
+        'home_team': pd.Series(event).map('Home {}'.format),
+        'away_team': pd.Series(event).map('Away {}'.format),
+        'commence_time': '2026-01-01T00:00:00Z',
+        'bookmaker': pd.Series(rng.integers(0, BOOKMAKERS, rows)).map('book{}'.format),
+        'outcome_name': np.array(OUTCOMES)[outcome],
+        'price': np.maximum(price, 1.01)
+    })
+
+def legacy_analyze(df):
+    """The previous implementation: one Python iteration and two groupbys per event"""
+    signals = []
+    for (home_team, away_team, commence_time), group in df.groupby(EVENT_KEY, observed=True):
+        outcome_odds = group.groupby('outcome_name', observed=True)['price'].mean()
+        max_odds = outcome_odds.max()
+        std_odds = group.groupby('outcome_name', observed=True)['price'].std().max()
+        buy = max_odds > 2.0 and (std_odds < 0.2 or pd.isna(std_odds))
+        signals.append((home_team, away_team, commence_time, 'BUY' if buy else 'IGNORE'))
+    return signals
+
+def timed(fn, *args, **kwargs):
+    """(result, seconds) of one call"""
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+def register_threshold_strategies(count):
+    """Register `count` synthetic strategies over varied features; returns their names"""
+    names = []
+    for i in range(count):
+        name = f'bench_{i}'
+        odds = 1.5 + 0.1 * i
+        if i % 3 == 0:
+            register_strategy(name, ['max_mean', 'max_std'],
+                              lambda f, odds=odds, std=0.1 + 0.02 * i: (f['max_mean'] > odds) & (f['max_std'] < std))
+        elif i % 3 == 1:
+            register_strategy(name, ['max_price', 'min_price'],
+                              lambda f, odds=odds: (f['max_price'] > odds) & (f['min_price'] > 1.1))
+        else:
+            register_strategy(name, ['max_mean', 'quotes', 'outcomes'],
+                              lambda f, odds=odds: (f['max_mean'] > odds) & (f['quotes'] > 10) & (f['outcomes'] >= 2))
+        names.append(name)
+    return names
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark signal scoring')
+    parser.add_argument('--sizes', default='1000,10000,100000,1000000',
+                        help='comma-separated row counts')
+    parser.add_argument('--legacy-max', type=int, default=1000000,
+                        help='skip the legacy loop above this many rows')
+    parser.add_argument('--strategies', type=int, default=20,
+                        help='strategies evaluated together in the second table')
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+    sizes = [int(size) for size in args.sizes.split(',')]
+
+    print(f"{'rows':>10} {'events':>8} {'legacy (s)':>11} {'vectorized (s)':>15} {'speedup':>8}")
+    for rows in sizes:
+        df = make_odds(rows)
+        signals, fast = timed(score_signals, df, names=historical_strategies())
+
+        if rows <= args.legacy_max:
+            legacy, slow = timed(legacy_analyze, df)
+            expected = pd.DataFrame(legacy, columns=EVENT_KEY + ['signal'])
+            if not expected['signal'].equals(signals['signal'].reset_index(drop=True)):
+                print(f"Mismatch between legacy and vectorized signals at {rows} rows")
+                sys.exit(1)
+            print(f"{rows:>10} {len(signals):>8} {slow:>11.3f} {fast:>15.3f} {slow / fast:>7.1f}x")
+        else:
+            print(f"{rows:>10} {len(signals):>8} {'-':>11} {fast:>15.3f} {'-':>8}")
+
+    names = register_threshold_strategies(args.strategies)
+    print(f"\n{'rows':>10} {'1 strategy (s)':>15} {f'{len(names)} strategies (s)':>18} {'ratio':>7}")
+    for rows in sizes:
+        df = make_odds(rows)
+        _, one = timed(evaluate, df, names[:1])
+        _, many = timed(evaluate, df, names)
+        print(f"{rows:>10} {one:>15.3f} {many:>18.3f} {many / one:>6.2f}x")
+
+if __name__ == "__main__":
+    main()
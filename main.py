@@ -12,10 +12,15 @@ from datetime import datetime, timezone
 import json
 from pathlib import Path
 
-from app.collector import collect_odds
+from app.collector import collect_odds, collect_due_odds, collect_event_odds, init_database, start_spool
+from app.spool import odds_spool
+from app.poll_scheduler import POLL_MODE, POLL_TICK_SECONDS
 from app.signal_generator import generate_signals
+from app.signal_store import import_signals_log
 from app.backtester import run_backtest
+from app.results import collect_results
 from app.reporter import generate_daily_report
+from app.retention import run_retention
 from app.dashboard import create_app
 
 # Configure logging
@@ -61,18 +66,27 @@ def update_status_file():
 
 def run_scheduler():
     """Run scheduled jobs"""
-    # Schedule collector to run every 60 seconds
-    schedule.every(60).seconds.do(collect_odds)
+    # Schedule collector: every 60 seconds, or quota-aware per-sport / per-event cadence
+    if POLL_MODE == 'event':
+        schedule.every(POLL_TICK_SECONDS).seconds.do(collect_event_odds)
+    elif POLL_MODE == 'adaptive':
+        schedule.every(POLL_TICK_SECONDS).seconds.do(collect_due_odds)
+    else:
+        schedule.every(60).seconds.do(collect_odds)
     
     # Schedule signal generator to run every 5 minutes
     schedule.every(5).minutes.do(generate_signals)
     
-    # Schedule backtester to run every hour
+    # Schedule backtester to run every hour, after fetching the latest match results
+    schedule.every().hour.do(collect_results)
     schedule.every().hour.do(run_backtest)
     
     # Schedule reporter to run daily at midnight
     schedule.every().day.at("00:00").do(generate_daily_report)
     
+    # Compact old raw odds into bars daily, after the report
+    schedule.every().day.at("03:00").do(run_retention)
+    
     # Schedule status update every 2 minutes to keep it fresh
     schedule.every(2).minutes.do(update_status_file)
     
@@ -81,9 +95,21 @@ def run_scheduler():
     # Update status file on startup
     update_status_file()
     
+    # Store odds spooled but not written before the last shutdown
+    init_database()
+    start_spool()
+    
+    # Move a signals.log left by older versions into the signals table (no-op once imported)
+    import_signals_log()
+    
     # Run initial jobs
     logger.info("Running initial jobs...")
-    collect_odds()
+    if POLL_MODE == 'event':
+        collect_event_odds()
+    elif POLL_MODE == 'adaptive':
+        collect_due_odds()
+    else:
+        collect_odds()
     generate_signals()
     
     # Keep scheduler running
@@ -120,6 +146,8 @@ def main():
         run_scheduler()
     except KeyboardInterrupt:
         logger.info("Shutting down BetSentinel...")
+        # Whatever is still spooled is replayed on the next start
+        odds_spool.wait_drained(timeout=10)
         raise
 
 if __name__ == "__main__":
@@ -0,0 +1,288 @@
+"""
+Mock Odds API - Local stand-in for The Odds API (v4) for load tests and benchmarks
+
+Serves recorded fixtures (see app/api_fixtures.py) and synthetic leagues at
+configurable scale, with simulated quota headers, latency, 429s and timeouts.
+
+Usage:
+    python mock_odds_api.py --leagues 2 --events 10000 --bookmakers 40 --latency 0.2
+
+    ODDS_API_BASE_URL=http://127.0.0.1:8765/v4 ODDS_API_KEY=mock \\
+    ODDS_SPORTS=synthetic_league_1,synthetic_league_2 python main.py
+
+Record real responses for replay with ODDS_RECORD_DIR=data/fixtures, then
+serve them with --fixtures data/fixtures.
+"""
+import json
+import random
+import asyncio
+import hashlib
+import argparse
+import logging
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from aiohttp import web
+from app.api_fixtures import load_fixtures, fixture_key
+
+logger = logging.getLogger(__name__)
+
+EVENTS_PER_CHUNK = 200  # events serialized per streamed write
+MATCH_DURATION = timedelta(minutes=105)  # kickoff to final whistle for /scores
+
+def _iso(dt):
+    """Odds API timestamp format"""
+    return dt.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+class SyntheticLeague:
+    """Deterministic events and bookmakers whose prices drift between requests"""
+
+    def __init__(self, sport_key, n_events, n_bookmakers, drift, seed):
+        self.sport_key = sport_key
+        self.sport_title = sport_key.replace('_', ' ').title()
+        self.rng = np.random.default_rng(seed)
+        self.drift = drift
+        self.bookmakers = [f"book_{i:02d}" for i in range(n_bookmakers)]
+
+        # Kickoffs spread from two hours ago to two weeks ahead so every
+        # lifecycle state is represented
+        start = datetime.now(timezone.utc).replace(second=0, microsecond=0) - timedelta(hours=2)
+        spacing = timedelta(hours=14 * 24 / max(n_events, 1))
+        self.events = []
+        for i in range(n_events):
+            home, away = f"{self.sport_title} Team {2 * i}", f"{self.sport_title} Team {2 * i + 1}"
+            self.events.append({
+                'id': hashlib.md5(f"{sport_key}:{i}".encode()).hexdigest(),
+                'sport_key': sport_key,
+                'sport_title': self.sport_title,
+                'commence_time': _iso(start + spacing * i),
+                'home_team': home,
+                'away_team': away,
+            })
+        self.index = {event['id']: i for i, event in enumerate(self.events)}
+
+        # Fair probabilities per event with a per-bookmaker margin
+        probabilities = self.rng.dirichlet([4, 2.5, 3], size=n_events)
+        self.probabilities = probabilities
+        margins = 1 + self.rng.uniform(0.02, 0.08, size=(1, n_bookmakers, 1))
+        self.prices = np.round(1 / (probabilities[:, None, :] * margins), 2)
+
+    def tick(self):
+        """Move a fraction of prices, as a live market would between polls"""
+        if self.drift <= 0:
+            return
+        moved = self.rng.random(self.prices.shape) < self.drift
+        steps = self.rng.choice([-0.05, 0.05], size=self.prices.shape)
+        self.prices = np.where(moved, np.clip(np.round(self.prices + steps, 2), 1.01, 1000.0), self.prices)
+
+    def event_odds(self, i, markets, last_update):
+        """One event with bookmaker prices in the API shape"""
+        event = dict(self.events[i])
+        names = (event['home_team'], 'Draw', event['away_team'])
+        prices = self.prices[i].tolist()
+        event['bookmakers'] = [{
+            'key': bookmaker,
+            'title': bookmaker.replace('_', ' ').title(),
+            'last_update': last_update,
+            'markets': [{
+                'key': market,
+                'last_update': last_update,
+                'outcomes': [{'name': name, 'price': price} for name, price in zip(names, prices[b])]
+            } for market in markets]
+        } for b, bookmaker in enumerate(self.bookmakers)]
+        return event
+
+    def event_scores(self, i, now):
+        """One event in the /scores shape; the result is drawn from its fair probabilities"""
+        event = dict(self.events[i])
+        commence = datetime.strptime(event['commence_time'], '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=timezone.utc)
+        event.update(completed=now - commence >= MATCH_DURATION, scores=None, last_update=None)
+        if commence <= now:
+            rng = np.random.default_rng(int(event['id'][:8], 16))
+            result = rng.choice(3, p=self.probabilities[i] / self.probabilities[i].sum())
+            goals = int(rng.poisson(1.2))
+            home, away = goals + (result == 0), goals + (result == 2)
+            event['scores'] = [{'name': event['home_team'], 'score': str(home)},
+                               {'name': event['away_team'], 'score': str(away)}]
+            event['last_update'] = _iso(min(now, commence + MATCH_DURATION))
+        return event
+
+class MockOddsAPI:
+    """Request handlers plus simulated quota, latency and failures"""
+
+    def __init__(self, args):
+        self.args = args
+        self.fixtures = load_fixtures(args.fixtures) if args.fixtures else {}
+        self.leagues = {}
+        for n in range(1, args.leagues + 1):
+            sport_key = f"synthetic_league_{n}"
+            self.leagues[sport_key] = SyntheticLeague(sport_key, args.events, args.bookmakers, args.drift, args.seed + n)
+        self.quota = args.quota
+        self.used = 0
+        self.stats = {'requests': 0, 'rate_limited': 0, 'timeouts': 0, 'fixture_hits': 0, 'synthetic': 0}
+        logger.info(f"Loaded {len({id(f) for f in self.fixtures.values()})} fixtures, {len(self.leagues)} synthetic leagues "
+                    f"({args.events} events x {args.bookmakers} bookmakers)")
+
+    def quota_headers(self, cost):
+        """Quota headers as the real API sends them"""
+        return {
+            'x-requests-remaining': str(max(self.quota - self.used, 0)),
+            'x-requests-used': str(self.used),
+            'x-requests-last': str(cost),
+        }
+
+    @web.middleware
+    async def simulate(self, request, handler):
+        """Apply API key check, failures, latency and quota accounting"""
+        self.stats['requests'] += 1
+        if request.path.startswith('/__'):
+            return await handler(request)
+        if not request.query.get('apiKey'):
+            return web.json_response({'message': 'API key is missing', 'error_code': 'MISSING_KEY'}, status=401)
+
+        if random.random() < self.args.timeout_rate:
+            self.stats['timeouts'] += 1
+            await asyncio.sleep(self.args.hang)
+        if random.random() < self.args.rate_limit_rate:
+            self.stats['rate_limited'] += 1
+            return web.json_response(
+                {'message': 'Too many requests', 'error_code': 'EXCEEDED_FREQ_LIMIT'},
+                status=429, headers={'Retry-After': str(self.args.retry_after)})
+
+        await asyncio.sleep(max(0.0, random.gauss(self.args.latency, self.args.latency * 0.25)))
+
+        cost = 0
+        if request.path.endswith('/odds'):
+            cost = len(request.query.get('regions', 'uk').split(',')) * len(request.query.get('markets', 'h2h').split(','))
+            if self.used + cost > self.quota:
+                return web.json_response(
+                    {'message': 'Usage quota has been reached', 'error_code': 'OUT_OF_USAGE_CREDITS'},
+                    status=401, headers=self.quota_headers(0))
+            self.used += cost
+        elif request.path.endswith('/scores'):
+            cost = 2 if request.query.get('daysFrom') else 1
+            self.used += cost
+        request['cost'] = cost
+        response = await handler(request)
+        if not response.prepared:  # streamed responses set their own headers
+            response.headers.update(self.quota_headers(cost))
+        return response
+
+    def fixture_for(self, request):
+        """Recorded response for a request, if any"""
+        fixture = (self.fixtures.get(fixture_key(request.path, request.query))
+                   or self.fixtures.get(fixture_key(request.path, {})))
+        if fixture:
+            self.stats['fixture_hits'] += 1
+        return fixture
+
+    def league(self, sport_key):
+        """Synthetic league for a sport key or a 404 like the real API"""
+        league = self.leagues.get(sport_key)
+        if league is None:
+            raise web.HTTPNotFound(text=json.dumps({'message': 'Unknown sport', 'error_code': 'UNKNOWN_SPORT'}),
+                                   content_type='application/json')
+        self.stats['synthetic'] += 1
+        return league
+
+    async def sports(self, request):
+        """GET /v4/sports"""
+        fixture = self.fixture_for(request)
+        if fixture:
+            return web.json_response(fixture['body'], status=fixture.get('status', 200))
+        return web.json_response([{
+            'key': league.sport_key, 'group': 'Soccer', 'title': league.sport_title,
+            'description': 'Synthetic league', 'active': True, 'has_outrights': False
+        } for league in self.leagues.values()])
+
+    async def events(self, request):
+        """GET /v4/sports/{sport}/events"""
+        fixture = self.fixture_for(request)
+        if fixture:
+            return web.json_response(fixture['body'], status=fixture.get('status', 200))
+        return web.json_response(self.league(request.match_info['sport']).events)
+
+    async def odds(self, request):
+        """GET /v4/sports/{sport}/odds - streamed, like a large real response"""
+        fixture = self.fixture_for(request)
+        if fixture:
+            return web.json_response(fixture['body'], status=fixture.get('status', 200))
+
+        league = self.league(request.match_info['sport'])
+        league.tick()
+        markets = request.query.get('markets', 'h2h').split(',')
+        last_update = _iso(datetime.now(timezone.utc))
+
+        response = web.StreamResponse(headers={'Content-Type': 'application/json'})
+        response.headers.update(self.quota_headers(request['cost']))
+        await response.prepare(request)
+        await response.write(b'[')
+        for start in range(0, len(league.events), EVENTS_PER_CHUNK):
+            stop = min(start + EVENTS_PER_CHUNK, len(league.events))
+            chunk = ','.join(json.dumps(league.event_odds(i, markets, last_update)) for i in range(start, stop))
+            await response.write(((',' if start else '') + chunk).encode())
+        await response.write(b']')
+        await response.write_eof()
+        return response
+
+    async def event_odds(self, request):
+        """GET /v4/sports/{sport}/events/{event_id}/odds"""
+        fixture = self.fixture_for(request)
+        if fixture:
+            return web.json_response(fixture['body'], status=fixture.get('status', 200))
+
+        league = self.league(request.match_info['sport'])
+        i = league.index.get(request.match_info['event_id'])
+        if i is None:
+            return web.json_response({'message': 'Event not found', 'error_code': 'EVENT_NOT_FOUND'}, status=404)
+        league.tick()
+        markets = request.query.get('markets', 'h2h').split(',')
+        return web.json_response(league.event_odds(i, markets, _iso(datetime.now(timezone.utc))))
+
+    async def scores(self, request):
+        """GET /v4/sports/{sport}/scores"""
+        fixture = self.fixture_for(request)
+        if fixture:
+            return web.json_response(fixture['body'], status=fixture.get('status', 200))
+
+        league = self.league(request.match_info['sport'])
+        now = datetime.now(timezone.utc)
+        return web.json_response([league.event_scores(i, now) for i in range(len(league.events))])
+
+    async def get_stats(self, request):
+        """GET /__stats - counters for load tests"""
+        return web.json_response(dict(self.stats, quota=self.quota, used=self.used))
+
+    def create_app(self):
+        """Build the aiohttp application"""
+        app = web.Application(middlewares=[self.simulate])
+        app.router.add_get('/v4/sports', self.sports)
+        app.router.add_get('/v4/sports/{sport}/events', self.events)
+        app.router.add_get('/v4/sports/{sport}/odds', self.odds)
+        app.router.add_get('/v4/sports/{sport}/events/{event_id}/odds', self.event_odds)
+        app.router.add_get('/v4/sports/{sport}/scores', self.scores)
+        app.router.add_get('/__stats', self.get_stats)
+        return app
+
+def parse_args(argv=None):
+    """Command line options"""
+    parser = argparse.ArgumentParser(description='Local mock of The Odds API v4')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--fixtures', help='directory of recorded fixtures to replay')
+    parser.add_argument('--leagues', type=int, default=1, help='synthetic leagues (synthetic_league_N)')
+    parser.add_argument('--events', type=int, default=100, help='events per synthetic league')
+    parser.add_argument('--bookmakers', type=int, default=10, help='bookmakers per event')
+    parser.add_argument('--drift', type=float, default=0.05, help='fraction of prices moving per request')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--quota', type=int, default=500, help='monthly request quota')
+    parser.add_argument('--latency', type=float, default=0.1, help='mean response latency in seconds')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='probability of a 429')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After seconds on 429')
+    parser.add_argument('--timeout-rate', type=float, default=0.0, help='probability of hanging')
+    parser.add_argument('--hang', type=float, default=30.0, help='seconds to hang on a simulated timeout')
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    args = parse_args()
+    web.run_app(MockOddsAPI(args).create_app(), host=args.host, port=args.port)